@@ -5,11 +5,19 @@ nanj-baseball プロジェクト - AI コーディング原則 第1～4条準拠
 """
 
 import os
+import sys
 import json
-import subprocess
 import time
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "python"))
+
+from video_composer import VideoComposer
+from job_queue import RenderJobQueue
+
+BATCH_NAME = "full-batch-videos-67"
+JOB_TIMEOUT_SECONDS = 300  # 1動画の制限時間（超えたら強制終了して失敗として記録）
+
 def main():
     print("=== 全量バッチ字幕付き動画生成（全67個） ===")
     
@@ -17,7 +25,7 @@ def main():
     subtitle_dir = root_dir / "subtitles" / "nanj-2025-09-12-skia"
     audio_dir = root_dir / "audio" / "nanj-2025-09-12"
     output_dir = root_dir / "output" / "full-batch-videos-67"
-    python_script = root_dir / "python" / "video_composer.py"
+    queue_path = output_dir / "render_queue.sqlite3"
     
     # 出力ディレクトリ作成
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -39,16 +47,11 @@ def main():
     max_files = min(len(subtitle_files), len(audio_files))
     print("処理対象:", max_files, "個（全コメント）")
     
-    success_count = 0
-    error_count = 0
-    start_time = time.time()
-    
-    # 結果記録用
-    results = []
-    
+    # 設定一覧を作成してジョブキューへ登録（登録済みのジョブは追加されない）
+    configs = []
+    entries = {}
+
     for i in range(max_files):
-        print(f"\n[{i+1}/{max_files}] 生成中...")
-        
         subtitle_file = subtitle_dir / subtitle_files[i]
         audio_file = audio_dir / audio_files[i]
         
@@ -63,12 +66,8 @@ def main():
         
         output_file = output_dir / f"video_{str(i+1).zfill(3)}_{text_content[:10]}.mp4"
         
-        print("字幕:", subtitle_files[i][:60])
-        print("音声:", audio_files[i][:60])
-        print("出力:", output_file.name)
-        
         # 設定作成
-        config = {
+        configs.append({
             "text": text_content,
             "audio_file": str(audio_file),
             "subtitle_image": str(subtitle_file),
@@ -90,75 +89,68 @@ def main():
                     "volume": 0.05
                 }
             }
-        }
-        
-        # Python実行
-        video_start_time = time.time()
-        try:
-            config_json = json.dumps(config, ensure_ascii=False)
-            
-            result = subprocess.run([
-                'python', str(python_script), config_json
-            ], capture_output=True, text=True, cwd=root_dir, timeout=300)
-            
-            video_end_time = time.time()
-            video_duration = video_end_time - video_start_time
-            
-            if result.returncode == 0 and output_file.exists():
-                file_size = output_file.stat().st_size / (1024 * 1024)
-                print(f"成功 ({file_size:.2f}MB, {video_duration:.1f}秒)")
-                success_count += 1
-                
-                results.append({
-                    "index": i + 1,
-                    "status": "success",
-                    "subtitle_file": subtitle_files[i],
-                    "audio_file": audio_files[i],
-                    "output_file": output_file.name,
-                    "file_size_mb": round(file_size, 2),
-                    "generation_time_sec": round(video_duration, 1),
-                    "text_content": text_content
-                })
-            else:
-                print("失敗:", result.stderr[:100])
-                error_count += 1
-                
-                results.append({
-                    "index": i + 1,
-                    "status": "failed",
-                    "subtitle_file": subtitle_files[i],
-                    "audio_file": audio_files[i],
-                    "error": result.stderr[:200],
-                    "text_content": text_content
-                })
-                
-        except Exception as e:
-            video_end_time = time.time()
-            print("エラー:", str(e)[:100])
-            error_count += 1
-            
+        })
+        entries[str(output_file)] = (i, subtitle_files[i], audio_files[i], text_content)
+    
+    # キューを処理（中断しても再実行すれば未完了の動画から再開する）
+    # --retry-failed で失敗した動画を再投入、--workers N で並列数を指定
+    # 各動画は専用プロセスで実行し、制限時間を超えたら強制終了する
+    start_time = time.time()
+    max_workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else 1
+    processed = []
+
+    def print_progress(job, state, counts):
+        processed.append(job["id"])
+        status = {"succeeded": "成功", "queued": "失敗（再試行します）", "failed": "失敗"}.get(state, state)
+        print(f"\n[{counts['succeeded'] + counts['failed']}/{counts['total']}] {Path(job['output_path']).name}: {status}")
+        elapsed_time = time.time() - start_time
+        remaining = counts["queued"] + counts["running"]
+        remaining_time = elapsed_time / len(processed) * remaining / max_workers
+        progress = (counts["succeeded"] + counts["failed"]) / counts["total"] * 100
+        print(f"進捗: {progress:.1f}% | 経過: {elapsed_time:.0f}秒 | 残り推定: {remaining_time:.0f}秒")
+
+    with RenderJobQueue(str(queue_path)) as queue:
+        queue.enqueue(configs, batch=BATCH_NAME)
+        if "--retry-failed" in sys.argv:
+            print("失敗した動画を再投入:", queue.retry_failed(BATCH_NAME), "個")
+        print("キュー状態:", queue.summary(BATCH_NAME))
+        VideoComposer().consume_job_queue(queue, batch=BATCH_NAME, max_workers=max_workers,
+                                          job_timeout=JOB_TIMEOUT_SECONDS, on_progress=print_progress)
+        jobs = queue.jobs(BATCH_NAME)
+    
+    # 結果記録用（キューの記録から作成）
+    results = []
+    for job in jobs:
+        i, subtitle_name, audio_name, text_content = entries.get(job["output_path"], (None,) * 4)
+        if i is None:
+            continue
+        output_file = Path(job["output_path"])
+        if job["state"] == "succeeded" and output_file.exists():
+            file_size = output_file.stat().st_size / (1024 * 1024)
             results.append({
                 "index": i + 1,
-                "status": "error",
-                "subtitle_file": subtitle_files[i],
-                "audio_file": audio_files[i],
-                "error": str(e)[:200],
+                "status": "success",
+                "subtitle_file": subtitle_name,
+                "audio_file": audio_name,
+                "output_file": output_file.name,
+                "file_size_mb": round(file_size, 2),
+                "generation_time_sec": round(job["duration"] or 0, 1),
+                "attempts": job["attempts"],
                 "text_content": text_content
             })
-        
-        # 進捗表示
-        progress = (i + 1) / max_files * 100
-        elapsed_time = time.time() - start_time
-        estimated_total_time = elapsed_time / (i + 1) * max_files
-        remaining_time = estimated_total_time - elapsed_time
-        
-        print(f"進捗: {progress:.1f}% | 経過: {elapsed_time:.0f}秒 | 残り推定: {remaining_time:.0f}秒")
-        
-        # 10個ごとに中間結果表示
-        if (i + 1) % 10 == 0:
-            print(f"\n=== 中間結果 ({i + 1}/{max_files}) ===")
-            print(f"成功: {success_count} | 失敗: {error_count}")
-            print("=" * 40)
+        else:
+            results.append({
+                "index": i + 1,
+                "status": job["state"],
+                "subtitle_file": subtitle_name,
+                "audio_file": audio_name,
+                "error": (job["error"] or "")[:200],
+                "attempts": job["attempts"],
+                "text_content": text_content
+            })
+    results.sort(key=lambda r: r["index"])
+    success_count = sum(1 for r in results if r["status"] == "success")
+    error_count = len(results) - success_count
     
     # 最終結果
     total_time = time.time() - start_time
@@ -181,6 +173,7 @@ def main():
         "total_time_minutes": round(total_time / 60, 1),
         "average_time_per_video_seconds": round(total_time / max_files, 1),
         "output_directory": str(output_dir),
+        "queue": str(queue_path),
         "results": results
     }
     
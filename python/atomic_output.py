@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+出力ファイルのアトミックな書き出し
+
+出力は同じディレクトリの途中ファイル（.<名前>.<ホスト>-<pid>.partial.<拡張子>）へ書き、完成後に
+fsync してから os.replace で確定する。中断したレンダリングが途中までのMP4を
+出力パスに残すことはなく、出力パスにファイルがあれば完成品である。
+途中ファイル名は書き込むプロセスごとに異なるため、共有ストレージ上で複数ノードが
+同じ出力パスへ書いても途中ファイルは衝突しない。
+"""
+
+import os
+import glob
+import socket
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .output_fanout import parse_outputs
+except ImportError:
+    from output_fanout import parse_outputs
+
+logger = logging.getLogger(__name__)
+
+
+def _writer_id() -> str:
+    """書き込むプロセスの識別子（共有ストレージ上で別ホスト・別プロセスの途中ファイルと衝突させない）"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def partial_path(path: str) -> str:
+    """確定前の途中ファイルのパス（同じディレクトリの隠しファイル、書き込むプロセスごとに別名、拡張子は維持）"""
+    directory, name = os.path.split(path)
+    root, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{root}.{_writer_id()}.partial{ext}")
+
+
+def stale_partials(path: str) -> List[str]:
+    """path に対する他のプロセスの途中ファイル（異常終了したプロセスの残骸）"""
+    directory, name = os.path.split(path)
+    root, ext = os.path.splitext(name)
+    own = partial_path(path)
+    pattern = os.path.join(glob.escape(directory), f".{glob.escape(root)}.*.partial{glob.escape(ext)}")
+    return [partial for partial in glob.glob(pattern) if partial != own]
+
+
+def partial_writer(path: str, partial: str) -> Optional[Tuple[str, int]]:
+    """
+    途中ファイル名から書き込んだプロセスを取得
+
+    Args:
+        path: 出力パス
+        partial: path に対する途中ファイル（stale_partials の要素）
+
+    Returns:
+        Optional[Tuple[str, int]]: (ホスト名, pid)（名前の形式が異なればNone）
+    """
+    root, ext = os.path.splitext(os.path.basename(path))
+    prefix, suffix = f".{root}.", f".partial{ext}"
+    name = os.path.basename(partial)
+    if not (name.startswith(prefix) and name.endswith(suffix)):
+        return None
+    host, _, pid = name[len(prefix):len(name) - len(suffix)].rpartition("-")
+    if not host or not pid.isdigit():
+        return None
+    return host, int(pid)
+
+
+def fsync_directory(directory: str) -> None:
+    """リネームを永続化するためディレクトリをfsync（非対応の環境では何もしない）"""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def commit_output(partial: str, path: str) -> None:
+    """
+    途中ファイルをfsyncして出力パスへアトミックに置き換える
+
+    Args:
+        partial: 書き終えた途中ファイル
+        path: 出力パス
+    """
+    with open(partial, "rb") as output_file:
+        os.fsync(output_file.fileno())
+    os.replace(partial, path)
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def discard_partial(partial: str) -> None:
+    """失敗時に途中ファイルを削除"""
+    try:
+        os.remove(partial)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"途中ファイル削除失敗: {partial} ({str(e)})")
+
+
+@contextmanager
+def atomic_outputs(output_path: str, video_settings: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    主出力と追加出力（video_settings.outputs）を途中ファイルへ書き、成功時にまとめて確定する
+
+    例外時は途中ファイルを削除し、出力パスには何も書かない。
+
+    Args:
+        output_path: 主出力パス
+        video_settings: 動画設定
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: (主出力の途中ファイル, 追加出力を途中ファイルへ差し替えた動画設定)
+    """
+    outputs = parse_outputs(video_settings.get("outputs"), video_settings)
+    paths = [output_path] + [output["output_path"] for output in outputs]
+    partials = [partial_path(path) for path in paths]
+    partial_settings = video_settings
+    if outputs:
+        partial_settings = {
+            **video_settings,
+            "outputs": [{**output, "output_path": partial} for output, partial in zip(outputs, partials[1:])]
+        }
+
+    try:
+        yield partials[0], partial_settings
+    except BaseException:
+        for partial in partials:
+            discard_partial(partial)
+        raise
+
+    for partial, path in zip(partials, paths):
+        commit_output(partial, path)
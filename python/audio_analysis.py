@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+音声解析（前処理）
+
+VoiceVox出力WAVを1ファイル1回だけ解析し、結果をファイル内容のハッシュを
+キーとしてJSONキャッシュに保存する。解析はPCM全体に対するNumPyの一括演算で行い、
+WAV自体は書き換えない（結果は合成時のサブクリップ範囲・ゲインとして適用する）。
+"""
+
+import os
+import json
+import wave
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from moviepy.editor import AudioFileClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+try:
+    import fcntl
+except ImportError:  # Windows（プロセス間の排他なし）
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 無音トリミングの既定値
+DEFAULT_TRIM_SETTINGS = {
+    "threshold_db": -45.0,  # これ未満のRMS窓を無音とみなす（dBFS）
+    "window": 0.02,         # RMS窓の長さ（秒）
+    "padding": 0.05         # 有音区間の前後に残す余白（秒）
+}
+
+# 入力のサンプリングレートが不明な場合の内部レート
+DEFAULT_SAMPLE_RATE = 44100
+
+# ラウドネス正規化の既定値
+DEFAULT_NORMALIZE_SETTINGS = {
+    "target_lufs": -16.0,      # 音声の目標ラウドネス（LUFS）
+    "background_lufs": -34.0,  # 背景音の目標ラウドネス（LUFS）
+    "max_peak_dbfs": -1.0      # ゲイン適用後のピーク上限（dBFS）
+}
+
+# ITU-R BS.1770 のKウェイティング（高域シェルフ + ハイパス）パラメータ
+# 48kHzの規格係数を任意のサンプリングレートで再現できる形（libebur128と同じ導出）
+_K_WEIGHTING_SHELF = {"gain_db": 3.999843853973347, "q": 0.7071752369554196, "fc": 1681.974450955533}
+_K_WEIGHTING_HIGHPASS = {"q": 0.5003270373238773, "fc": 38.13547087602444}
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    """ファイル内容のSHA-1ハッシュ"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as media_file:
+        for block in iter(lambda: media_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def probe_sample_rate(media_path: str) -> Optional[int]:
+    """
+    音声のネイティブなサンプリングレートを取得（WAVはヘッダのみ読む）
+
+    Returns:
+        Optional[int]: サンプリングレート（音声がなければNone）
+    """
+    try:
+        with wave.open(media_path, "rb") as wav_file:
+            return wav_file.getframerate()
+    except (wave.Error, EOFError):
+        pass
+    infos = ffmpeg_parse_infos(media_path)
+    return infos.get("audio_fps") if infos.get("audio_found") else None
+
+
+def negotiate_sample_rate(input_rates: List[Optional[int]], requested: Optional[int] = None) -> int:
+    """
+    ジョブ内部のサンプリングレートを決定
+
+    明示指定（optimizerの推奨値など）があればそれを使い、なければ入力の最大レートを
+    使う（VoiceVoxの24kHzのみなら再サンプリング不要、劣化する方向の変換もしない）。
+
+    Args:
+        input_rates: 入力音声のサンプリングレート
+        requested: 明示指定のレート
+
+    Returns:
+        int: 内部サンプリングレート
+    """
+    if requested:
+        return int(requested)
+    rates = [rate for rate in input_rates if rate]
+    return max(rates) if rates else DEFAULT_SAMPLE_RATE
+
+
+def resample_pcm(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    PCMを帯域制限付きで再サンプリング（FFTによる一括処理）
+
+    Args:
+        samples: PCM配列（サンプル数 x チャンネル数）
+        source_rate: 元のサンプリングレート
+        target_rate: 変換後のサンプリングレート
+
+    Returns:
+        np.ndarray: 再サンプリング後のPCM配列（float32）
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    source_length = len(samples)
+    target_length = int(round(source_length * target_rate / float(source_rate)))
+    spectrum = np.fft.rfft(samples, axis=0)
+    # 周波数ビンを切り詰め/ゼロ詰めしてナイキスト周波数を合わせる
+    bins = target_length // 2 + 1
+    if bins <= spectrum.shape[0]:
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.concatenate([spectrum, np.zeros((bins - spectrum.shape[0],) + spectrum.shape[1:], spectrum.dtype)])
+    resampled = np.fft.irfft(spectrum, n=target_length, axis=0) * (target_length / float(source_length))
+    return resampled.astype(np.float32)
+
+
+def read_pcm(audio_path: str) -> Tuple[np.ndarray, int]:
+    """
+    音声をfloat32 PCM（サンプル数 x チャンネル数、-1.0〜1.0）として読み込む
+
+    16bit PCM WAVはwaveモジュールで直接読み、それ以外はffmpeg経由で
+    ネイティブのサンプリングレートのまま読む。
+
+    Returns:
+        Tuple[np.ndarray, int]: PCM配列とサンプリングレート
+    """
+    try:
+        with wave.open(audio_path, "rb") as wav_file:
+            if wav_file.getsampwidth() == 2:
+                channels = wav_file.getnchannels()
+                raw = wav_file.readframes(wav_file.getnframes())
+                samples = np.frombuffer(raw, dtype="<i2").reshape(-1, channels)
+                return samples.astype(np.float32) / 32768.0, wav_file.getframerate()
+    except (wave.Error, EOFError):
+        pass
+
+    clip = AudioFileClip(audio_path, fps=probe_sample_rate(audio_path) or DEFAULT_SAMPLE_RATE)
+    try:
+        return clip.to_soundarray(nbytes=2, quantize=False).astype(np.float32), clip.fps
+    finally:
+        clip.close()
+
+
+def detect_silence_bounds(
+    samples: np.ndarray,
+    sample_rate: int,
+    threshold_db: float = DEFAULT_TRIM_SETTINGS["threshold_db"],
+    window: float = DEFAULT_TRIM_SETTINGS["window"],
+    padding: float = DEFAULT_TRIM_SETTINGS["padding"]
+) -> Tuple[float, float]:
+    """
+    先頭・末尾の無音を除いた有音区間を求める
+
+    RMS窓ごとのレベルを一括計算し、閾値を超える最初と最後の窓を境界とする。
+    全体が無音の場合は元の長さをそのまま返す。
+
+    Args:
+        samples: PCM配列（サンプル数 x チャンネル数）
+        sample_rate: サンプリングレート
+        threshold_db: 無音判定の閾値（dBFS）
+        window: RMS窓の長さ（秒）
+        padding: 有音区間の前後に残す余白（秒）
+
+    Returns:
+        Tuple[float, float]: 有音区間の開始・終了（秒）
+    """
+    duration = len(samples) / float(sample_rate)
+    window_size = max(1, int(window * sample_rate))
+    window_count = len(samples) // window_size
+    if window_count == 0:
+        return 0.0, duration
+
+    mono = samples.mean(axis=1) if samples.ndim > 1 else samples
+    frames = mono[:window_count * window_size].reshape(window_count, window_size)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    voiced = np.flatnonzero(rms > 10 ** (threshold_db / 20.0))
+    if len(voiced) == 0:
+        return 0.0, duration
+
+    start = max(0.0, voiced[0] * window_size / sample_rate - padding)
+    end = min(duration, (voiced[-1] + 1) * window_size / sample_rate + padding)
+    return start, end
+
+
+def _k_weighting_response(sample_rate: int, frequencies: np.ndarray) -> np.ndarray:
+    """Kウェイティングフィルタ（双2次 x 2段）の複素周波数応答"""
+    k = np.tan(np.pi * _K_WEIGHTING_SHELF["fc"] / sample_rate)
+    q = _K_WEIGHTING_SHELF["q"]
+    vh = 10 ** (_K_WEIGHTING_SHELF["gain_db"] / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf_b = np.array([vh + vb * k / q + k * k, 2.0 * (k * k - vh), vh - vb * k / q + k * k]) / a0
+    shelf_a = np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+
+    k = np.tan(np.pi * _K_WEIGHTING_HIGHPASS["fc"] / sample_rate)
+    q = _K_WEIGHTING_HIGHPASS["q"]
+    a0 = 1.0 + k / q + k * k
+    highpass_b = np.array([1.0, -2.0, 1.0])
+    highpass_a = np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+
+    z = np.exp(-1j * 2 * np.pi * frequencies / sample_rate)
+    powers = np.stack([np.ones_like(z), z, z * z])
+    return ((shelf_b @ powers) / (shelf_a @ powers)) * ((highpass_b @ powers) / (highpass_a @ powers))
+
+
+def measure_loudness(samples: np.ndarray, sample_rate: int) -> Dict[str, float]:
+    """
+    統合ラウドネス（ITU-R BS.1770、ゲーティングあり）とサンプルピークを測定
+
+    Kウェイティングは周波数領域で一括適用し、400msブロック（75%重複）の
+    エネルギーは累積和から一度に求める。
+
+    Args:
+        samples: PCM配列（サンプル数 x チャンネル数）
+        sample_rate: サンプリングレート
+
+    Returns:
+        Dict[str, float]: integrated_lufs（無音は-inf）, peak_dbfs
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    peak_dbfs = 20 * np.log10(peak) if peak > 0 else float("-inf")
+
+    # フィルタの過渡応答が循環しないよう0.5秒のゼロ詰めをしてから周波数領域で適用
+    padded_length = len(samples) + sample_rate // 2
+    spectrum = np.fft.rfft(samples, n=padded_length, axis=0)
+    response = _k_weighting_response(sample_rate, np.fft.rfftfreq(padded_length, 1.0 / sample_rate))
+    weighted = np.fft.irfft(spectrum * response[:, np.newaxis], n=padded_length, axis=0)[:len(samples)]
+
+    block = int(0.4 * sample_rate)
+    step = int(0.1 * sample_rate)
+    energy = np.concatenate([np.zeros(1), np.cumsum(np.sum(np.square(weighted), axis=1))])
+    if len(samples) <= block:
+        block_energy = np.array([energy[-1] / max(1, len(samples))])
+    else:
+        starts = np.arange(0, len(samples) - block + 1, step)
+        block_energy = (energy[starts + block] - energy[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(block_energy)
+    gated = block_energy[block_loudness > -70.0]
+    if len(gated) == 0:
+        return {"integrated_lufs": float("-inf"), "peak_dbfs": peak_dbfs}
+
+    relative_gate = -0.691 + 10 * np.log10(np.mean(gated)) - 10.0
+    gated = block_energy[(block_loudness > -70.0) & (block_loudness > relative_gate)]
+    integrated = -0.691 + 10 * np.log10(np.mean(gated))
+    return {"integrated_lufs": float(integrated), "peak_dbfs": float(peak_dbfs)}
+
+
+def normalization_gain(loudness: Dict[str, float], target_lufs: float, max_peak_dbfs: float) -> float:
+    """
+    目標ラウドネスへの線形ゲイン（ピーク上限で制限、無音は1.0）
+
+    Args:
+        loudness: measure_loudness の結果
+        target_lufs: 目標ラウドネス（LUFS）
+        max_peak_dbfs: ゲイン適用後のピーク上限（dBFS）
+
+    Returns:
+        float: 線形ゲイン
+    """
+    if not np.isfinite(loudness["integrated_lufs"]):
+        return 1.0
+    gain_db = target_lufs - loudness["integrated_lufs"]
+    if np.isfinite(loudness["peak_dbfs"]):
+        gain_db = min(gain_db, max_peak_dbfs - loudness["peak_dbfs"])
+    return float(10 ** (gain_db / 20.0))
+
+
+class AudioAnalysisCache:
+    """ファイルハッシュをキーとする解析結果のJSONキャッシュ"""
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        # パス→（サイズ, 更新時刻, ハッシュ）：同一プロセス内の再ハッシュを避ける
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def digest(self, file_path: str) -> str:
+        """ファイルハッシュ（サイズ・更新時刻が同じなら再計算しない）"""
+        stat = os.stat(file_path)
+        cached = self._digests.get(file_path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        value = file_digest(file_path)
+        self._digests[file_path] = (stat.st_size, stat.st_mtime_ns, value)
+        return value
+
+    def get(self, digest: str, key: str) -> Optional[Any]:
+        """解析結果を取得"""
+        with self._lock:
+            return self._load().get(digest, {}).get(key)
+
+    def put(self, digest: str, key: str, value: Any) -> None:
+        """
+        解析結果を保存
+
+        読み込み・統合・置換の間はロックファイル（<キャッシュ>.lock）を排他ロックするため、
+        複数プロセスが同時に保存しても他プロセスの結果は失われない。
+        """
+        with self._lock:
+            directory = os.path.dirname(self.cache_path)
+            try:
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with self._file_lock():
+                    self._entries = None
+                    entries = self._load()
+                    entries.setdefault(digest, {})[key] = value
+                    temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+                    with open(temp_path, "w", encoding="utf-8") as cache_file:
+                        json.dump(entries, cache_file, ensure_ascii=False)
+                    os.replace(temp_path, self.cache_path)
+            except OSError as e:
+                logger.warning(f"音声解析キャッシュ保存失敗: {str(e)}")
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """キャッシュファイルのプロセス間排他ロック（fcntl が使えない環境ではプロセス内のみ）"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.cache_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as cache_file:
+                    self._entries = json.load(cache_file)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+
+class AudioAnalyzer:
+    """音声ファイルの前処理解析（結果はキャッシュ）"""
+
+    def __init__(self, cache_path: str):
+        self.cache = AudioAnalysisCache(cache_path)
+
+    def trim_bounds(self, audio_path: str, trim_settings: Optional[Dict[str, Any]] = None) -> Tuple[float, float]:
+        """
+        先頭・末尾の無音を除いた有音区間を取得
+
+        Args:
+            audio_path: 音声ファイルパス
+            trim_settings: DEFAULT_TRIM_SETTINGS の上書き
+
+        Returns:
+            Tuple[float, float]: サブクリップ範囲（開始・終了秒）
+        """
+        params = {**DEFAULT_TRIM_SETTINGS, **(trim_settings or {})}
+        digest = self.cache.digest(audio_path)
+        key = "trim:{threshold_db}:{window}:{padding}".format(**params)
+
+        cached = self.cache.get(digest, key)
+        if cached is not None:
+            return tuple(cached)
+
+        samples, sample_rate = read_pcm(audio_path)
+        bounds = detect_silence_bounds(samples, sample_rate, **params)
+        self.cache.put(digest, key, list(bounds))
+
+        trimmed = len(samples) / float(sample_rate) - (bounds[1] - bounds[0])
+        logger.info(f"無音トリミング: {os.path.basename(audio_path)} "
+                    f"({bounds[0]:.2f}s-{bounds[1]:.2f}s, {trimmed:.2f}秒削減)")
+        return bounds
+
+    def loudness(self, media_path: str) -> Dict[str, float]:
+        """
+        統合ラウドネスとピークを取得（音声ファイル・背景動画の音声）
+
+        Returns:
+            Dict[str, float]: integrated_lufs, peak_dbfs
+        """
+        digest = self.cache.digest(media_path)
+        cached = self.cache.get(digest, "loudness")
+        if cached is not None:
+            return {key: float(value) for key, value in cached.items()}
+
+        samples, sample_rate = read_pcm(media_path)
+        result = measure_loudness(samples, sample_rate)
+        # JSONは-infを表現できないため文字列で保存（float("-inf")で復元可能）
+        self.cache.put(digest, "loudness", {key: str(value) for key, value in result.items()})
+
+        logger.info(f"ラウドネス解析: {os.path.basename(media_path)} "
+                    f"({result['integrated_lufs']:.1f} LUFS, ピーク {result['peak_dbfs']:.1f} dBFS)")
+        return result
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+日付別音声ディレクトリのマニフェスト
+
+audio/nanj-YYYY-MM-DD/ のファイル名（theme{N}_comment{M}_{speaker}-{style}_{date}.wav、
+title_*.wav）を1回だけ走査し、テーマ → タイトル音声・コメント音声（番号順）と
+話者メタデータの索引を作る。索引はディレクトリの更新時刻が変わるまで再利用する。
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# テーマごとのタイトル音声ファイル名（scripts/generate-all-theme-titles.mjs の出力）
+THEME_TITLE_FILES = {
+    1: "title_gekiteki.wav",
+    2: "title_shushin_fail.wav",
+    3: "title_shinjin_katsuyaku.wav"
+}
+
+COMMENT_PATTERN = re.compile(
+    r"^(?:theme|topic)(?P<theme>\d+)_comment(?P<comment>\d+)_"
+    r"(?P<speaker>[^-_]+)-(?P<style>[^_]+)_(?P<date>[^.]+)\.wav$"
+)
+TITLE_PATTERN = re.compile(r"^title_.*\.wav$")
+
+
+def parse_comment_filename(filename: str) -> Optional[Dict[str, Any]]:
+    """
+    コメント音声のファイル名を解析
+
+    Returns:
+        Optional[Dict]: theme, comment, speaker, style, date（形式外はNone）
+    """
+    match = COMMENT_PATTERN.match(filename)
+    if match is None:
+        return None
+    info = match.groupdict()
+    info["theme"] = int(info["theme"])
+    info["comment"] = int(info["comment"])
+    return info
+
+
+class AudioManifest:
+    """1ディレクトリ分の音声索引"""
+
+    def __init__(self, directory: str, mtime_ns: int):
+        self.directory = directory
+        self.mtime_ns = mtime_ns
+        self.comments: Dict[int, List[Dict[str, Any]]] = {}
+        self.titles: List[str] = []
+        self._by_path: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def build(cls, directory: str) -> "AudioManifest":
+        """ディレクトリを1回走査して索引を作成"""
+        manifest = cls(directory, os.stat(directory).st_mtime_ns)
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            info = parse_comment_filename(filename)
+            if info is not None:
+                entry = {"path": path, **info}
+                manifest.comments.setdefault(info["theme"], []).append(entry)
+                manifest._by_path[os.path.normcase(os.path.abspath(path))] = entry
+            elif TITLE_PATTERN.match(filename):
+                manifest.titles.append(path)
+
+        for entries in manifest.comments.values():
+            entries.sort(key=lambda entry: entry["comment"])
+
+        logger.info(f"音声マニフェスト作成: {directory} "
+                    f"(テーマ{len(manifest.comments)}個, タイトル{len(manifest.titles)}個)")
+        return manifest
+
+    def entry_for(self, audio_path: str) -> Optional[Dict[str, Any]]:
+        """音声ファイルの索引項目（テーマ・コメント番号・話者・スタイル）"""
+        return self._by_path.get(os.path.normcase(os.path.abspath(audio_path)))
+
+    def theme_of(self, audio_path: str) -> Optional[int]:
+        """音声ファイルのテーマ番号"""
+        entry = self.entry_for(audio_path)
+        if entry is not None:
+            return entry["theme"]
+        info = parse_comment_filename(os.path.basename(audio_path))
+        return info["theme"] if info else None
+
+    def comment_files(self, theme: int) -> List[str]:
+        """テーマのコメント音声（コメント番号順）"""
+        return [entry["path"] for entry in self.comments.get(theme, [])]
+
+    def title_for(self, theme: int) -> Optional[str]:
+        """
+        テーマのタイトル音声
+
+        テーマ固有のファイルを優先し、なければディレクトリ内の最初の title_*.wav。
+        """
+        specific = THEME_TITLE_FILES.get(theme)
+        for path in self.titles:
+            if os.path.basename(path) == specific:
+                return path
+        return self.titles[0] if self.titles else None
+
+
+_manifests: Dict[str, AudioManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_audio_manifest(directory: str) -> AudioManifest:
+    """
+    ディレクトリの音声マニフェストを取得（更新時刻が変わっていなければキャッシュを返す）
+
+    Args:
+        directory: 音声ディレクトリ
+
+    Returns:
+        AudioManifest: 音声索引
+    """
+    key = os.path.abspath(directory)
+    mtime_ns = os.stat(key).st_mtime_ns
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None or manifest.mtime_ns != mtime_ns:
+            manifest = AudioManifest.build(key)
+            _manifests[key] = manifest
+        return manifest
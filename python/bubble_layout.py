@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+コメント吹き出しのレイアウト表
+
+テンプレート（画面を割合で分割した格子）と実際の吹き出し画像サイズから、
+テーマ内の全吹き出しの左上座標を1回だけ計算する。直前に配置した吹き出しと
+（直近 window 個）と重ならない格子位置を優先し、画面外にはみ出さないよう補正する。
+結果は (解像度, 吹き出しサイズ列, テンプレート) ごとにプロセス内でキャッシュし、
+合成時は表を参照するだけにする。
+"""
+
+import os
+import logging
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 解像度非依存のテンプレート（格子の列数・行数、セル内の基準点と画面端の余白は割合、
+# window は重なりを避ける直前の吹き出し数）
+LAYOUT_TEMPLATES = {
+    "comment_grid": {"cols": 4, "rows": 5, "anchor": (0.25, 0.25), "margin": 0.02, "window": 3},
+    "grid": {"cols": 3, "rows": 7, "anchor": (0.25, 0.25), "margin": 0.02, "window": 3}
+}
+
+# 画像サイズが取得できない吹き出しの仮サイズ（セルに対する割合）
+FALLBACK_CELL_FRACTION = 0.5
+
+
+def probe_image_size(image_path: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    画像サイズを取得（ヘッダのみ読む）
+
+    Returns:
+        Optional[Tuple[int, int]]: (幅, 高さ)（ファイルがなければNone）
+    """
+    if not image_path or not os.path.exists(image_path):
+        return None
+    try:
+        with Image.open(image_path) as image:
+            return image.size
+    except Exception as e:
+        logger.warning(f"吹き出し画像サイズ取得失敗: {image_path} ({str(e)})")
+        return None
+
+
+def _clamp(value: int, size: int, limit: int, margin: int) -> int:
+    """吹き出しが画面内（余白込み）に収まるよう座標を補正"""
+    if size + 2 * margin > limit:
+        return (limit - size) // 2
+    return min(max(value, margin), limit - size - margin)
+
+
+@lru_cache(maxsize=64)
+def _compute_layout(
+    resolution: Tuple[int, int],
+    sizes: Tuple[Optional[Tuple[int, int]], ...],
+    template: str
+) -> Tuple[Tuple[int, int], ...]:
+    """レイアウト表の計算本体（引数はすべてハッシュ可能な値）"""
+    spec = LAYOUT_TEMPLATES[template]
+    cols, rows = spec["cols"], spec["rows"]
+    screen_width, screen_height = resolution
+    cell_width, cell_height = screen_width / cols, screen_height / rows
+    margin_x = int(round(screen_width * spec["margin"]))
+    margin_y = int(round(screen_height * spec["margin"]))
+    cell_count = cols * rows
+    window = spec["window"]
+
+    anchors = [
+        (int(round((index % cols + spec["anchor"][0]) * cell_width)),
+         int(round((index // cols + spec["anchor"][1]) * cell_height)))
+        for index in range(cell_count)
+    ]
+    fallback_size = (int(cell_width * FALLBACK_CELL_FRACTION), int(cell_height * FALLBACK_CELL_FRACTION))
+
+    positions: List[Tuple[int, int]] = []
+    placed = np.empty((0, 4), dtype=np.int64)  # 直近に配置した吹き出しの (x0, y0, x1, y1)
+    collisions = 0
+    for index, size in enumerate(sizes):
+        width, height = size or fallback_size
+
+        best = None
+        best_overlap = None
+        # 本来のセルから順に候補を試し、重なりのない最初の位置を採用（なければ重なり最小）
+        for offset in range(cell_count):
+            anchor_x, anchor_y = anchors[(index + offset) % cell_count]
+            x = _clamp(anchor_x, width, screen_width, margin_x)
+            y = _clamp(anchor_y, height, screen_height, margin_y)
+            if len(placed):
+                overlap_w = np.minimum(placed[:, 2], x + width) - np.maximum(placed[:, 0], x)
+                overlap_h = np.minimum(placed[:, 3], y + height) - np.maximum(placed[:, 1], y)
+                overlap = int(np.sum(np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)))
+            else:
+                overlap = 0
+            if best_overlap is None or overlap < best_overlap:
+                best, best_overlap = (x, y), overlap
+            if overlap == 0:
+                break
+
+        if best_overlap:
+            collisions += 1
+        positions.append(best)
+        # 衝突判定の対象は直近 window 個だけ
+        box = np.array([[best[0], best[1], best[0] + width, best[1] + height]], dtype=np.int64)
+        placed = np.concatenate([placed, box])[-window:] if window > 0 else placed
+
+    logger.info(f"吹き出しレイアウト計算: {len(sizes)}個 {screen_width}x{screen_height} "
+                f"テンプレート={template} (重なり回避不能{collisions}個)")
+    return tuple(positions)
+
+
+def compute_bubble_layout(
+    resolution: Sequence[int],
+    image_paths: Sequence[Optional[str]],
+    count: Optional[int] = None,
+    template: str = "comment_grid"
+) -> Tuple[Tuple[int, int], ...]:
+    """
+    吹き出しの配置表を取得（同じ条件の2回目以降はキャッシュを返す）
+
+    Args:
+        resolution: 出力解像度 (幅, 高さ)
+        image_paths: 吹き出し画像パスのリスト（Noneや存在しないパスは仮サイズで配置）
+        count: 吹き出し数（省略時は画像数、画像が足りない分は仮サイズ）
+        template: LAYOUT_TEMPLATES のテンプレート名
+
+    Returns:
+        Tuple[Tuple[int, int], ...]: 各吹き出しの左上座標
+    """
+    if template not in LAYOUT_TEMPLATES:
+        raise ValueError(f"未知のレイアウトテンプレート: {template}")
+    if count is None:
+        count = len(image_paths)
+    sizes = tuple(
+        probe_image_size(image_paths[i]) if i < len(image_paths) else None
+        for i in range(count)
+    )
+    return _compute_layout((int(resolution[0]), int(resolution[1])), sizes, template)
+
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+レンダリング中のサムネイル・コンタクトシート書き出し
+
+合成済みフレームのうち、タイトル区間と各コメントの表示開始のフレームを
+書き出し処理の途中でそのまま静止画（JPEG/WebP）として保存し、最後に
+縮小画像を並べたコンタクトシートを作る。出力動画を開き直してデコードする必要はない。
+進捗の通知（render_progress.RenderProgress）はフレームの書き出し側が直接行う。
+
+settings.capture を true（または設定の辞書）にすると有効になる:
+    {"title": true, "comments": true, "contact_sheet": true,
+     "format": "jpeg", "quality": 85, "width": 640, "sheet_columns": 5, "sheet_tile_width": 320}
+"""
+
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+try:
+    from .yuv_compositing import YuvFrame, yuv_frame_to_rgb
+    from .atomic_output import commit_output, partial_path
+except ImportError:
+    from yuv_compositing import YuvFrame, yuv_frame_to_rgb
+    from atomic_output import commit_output, partial_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPTURE_SETTINGS = {
+    "title": True,             # タイトル区間（中央のフレーム）
+    "comments": True,          # 各コメントの表示開始（フェードイン完了時点）
+    "contact_sheet": True,     # 保存した静止画を並べた一覧画像
+    "format": "jpeg",          # "jpeg" または "webp"
+    "quality": 85,
+    "width": None,             # 静止画の幅（Noneなら合成解像度のまま）
+    "sheet_columns": 5,
+    "sheet_tile_width": 320,
+    "dir": None                # 保存先（Noneなら出力動画と同じディレクトリ）
+}
+
+# コンタクトシートの余白・背景色
+SHEET_PADDING = 4
+SHEET_BACKGROUND = (16, 16, 16)
+
+_EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+
+
+def capture_settings(settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """settings.capture を既定値と合わせる（無効ならNone）"""
+    capture = settings.get("capture")
+    if not capture:
+        return None
+    merged = {**DEFAULT_CAPTURE_SETTINGS, **(capture if isinstance(capture, dict) else {})}
+    if merged["format"] not in _EXTENSIONS:
+        raise ValueError(f"未対応の静止画形式: {merged['format']}（jpeg または webp）")
+    return merged
+
+
+def capture_targets(
+    segments: Sequence[Any],
+    fps: int,
+    fade_duration: float,
+    has_title: bool = True,
+    title: bool = True,
+    comments: bool = True
+) -> Dict[int, str]:
+    """
+    保存するフレーム番号とラベル
+
+    コメントは字幕が見えるフェードイン完了時点（区間の中央を超えない）のフレームを使う。
+
+    Args:
+        segments: タイムライン（フレーム範囲確定済み）
+        fps: フレームレート
+        fade_duration: 字幕のフェード時間
+        has_title: 先頭区間がタイトルか（単一動画ではFalse）
+        title / comments: それぞれ保存するか
+
+    Returns:
+        Dict[int, str]: フレーム番号 → ラベル（"title", "comment_001", ...）
+    """
+    targets: Dict[int, str] = {}
+    segments = list(segments)
+    if has_title and segments:
+        title_segment, segments = segments[0], segments[1:]
+        if title:
+            targets[(title_segment.first_frame + title_segment.last_frame - 1) // 2] = "title"
+    if comments:
+        for number, segment in enumerate(segments, 1):
+            if segment.frame_count <= 0:
+                continue
+            offset = min(int(round(fade_duration * fps)), (segment.frame_count - 1) // 2)
+            targets[segment.first_frame + offset] = f"comment_{number:03d}"
+    return targets
+
+
+class FrameCapture:
+    """書き出し中のフレームから指定フレームだけを静止画として保存する"""
+
+    def __init__(
+        self,
+        output_path: str,
+        targets: Dict[int, str],
+        settings: Dict[str, Any]
+    ):
+        """
+        Args:
+            output_path: 出力動画パス（静止画のファイル名の元）
+            targets: capture_targets の結果
+            settings: capture_settings で既定値と合わせた設定
+        """
+        self.targets = dict(targets)
+        self.settings = settings
+        directory = settings.get("dir") or os.path.dirname(os.path.abspath(output_path))
+        self.prefix = os.path.join(directory, os.path.splitext(os.path.basename(output_path))[0])
+        self.saved: Dict[int, str] = {}
+        self._tiles: Dict[int, Image.Image] = {}
+
+    def path_for(self, label: str) -> str:
+        return f"{self.prefix}_{label}.{_EXTENSIONS[self.settings['format']]}"
+
+    def wants(self, frame_number: int) -> bool:
+        return frame_number in self.targets
+
+    def capture(self, frame_number: int, frame: np.ndarray) -> None:
+        """
+        対象フレームなら静止画として保存（対象外は何もしない）
+
+        Args:
+            frame_number: タイムライン上のフレーム番号
+            frame: 合成済みフレーム（uint8、H x W x 3）
+        """
+        label = self.targets.get(frame_number)
+        if label is None:
+            return
+        image = Image.fromarray(np.ascontiguousarray(frame))
+        width = self.settings.get("width")
+        if width and width < image.width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+        path = self.path_for(label)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._save(image, path)
+        self.saved[frame_number] = path
+        if self.settings.get("contact_sheet"):
+            self._tiles[frame_number] = self._tile(image)
+
+    def capture_yuv(self, frame_number: int, frame: YuvFrame) -> None:
+        """yuv420p フレーム版（対象フレームだけRGBへ変換）"""
+        if frame_number in self.targets:
+            self.capture(frame_number, yuv_frame_to_rgb(frame))
+
+    def record(self, saved: Dict[Any, str]) -> None:
+        """
+        別プロセス（チャンク並列）で保存された静止画を登録
+
+        Args:
+            saved: フレーム番号 → 静止画パス（ジャーナル経由のため番号は文字列でもよい）
+        """
+        for frame_number, path in saved.items():
+            if os.path.exists(path):
+                self.saved[int(frame_number)] = path
+
+    def _tile(self, image: Image.Image) -> Image.Image:
+        tile_width = self.settings["sheet_tile_width"]
+        return image.resize((tile_width, max(1, round(image.height * tile_width / image.width))), Image.LANCZOS)
+
+    def finish(self) -> List[str]:
+        """
+        コンタクトシートを作成し、保存した静止画のパス一覧を返す
+
+        対象はこのレンダリングで保存した静止画（record で登録したものを含む）だけで、
+        保存先に以前の静止画が残っていても含めない。別プロセスで保存された静止画は、
+        ファイルから縮小画像を作る。
+
+        Returns:
+            List[str]: 静止画のパス（フレーム順、コンタクトシートは末尾）
+        """
+        if not self.targets:
+            return []
+        paths = [self.saved[frame_number] for frame_number in sorted(self.saved)]
+
+        if self.settings.get("contact_sheet") and self.saved:
+            tiles = []
+            for frame_number in sorted(self.saved):
+                tile = self._tiles.get(frame_number)
+                if tile is None:
+                    with Image.open(self.saved[frame_number]) as image:
+                        tile = self._tile(image.convert("RGB"))
+                tiles.append(tile)
+            sheet_path = self.path_for("contact")
+            self._save(self._contact_sheet(tiles), sheet_path)
+            paths.append(sheet_path)
+
+        logger.info(f"静止画保存: {len(paths)}枚 ({self.prefix}_*)")
+        return paths
+
+    def _save(self, image: Image.Image, path: str) -> None:
+        """途中ファイルへ保存してからアトミックに置き換える"""
+        partial = partial_path(path)
+        image.save(partial, format=self.settings["format"].upper(), quality=self.settings["quality"])
+        commit_output(partial, path)
+
+    def _contact_sheet(self, tiles: List[Image.Image]) -> Image.Image:
+        columns = max(1, min(self.settings["sheet_columns"], len(tiles)))
+        rows = (len(tiles) + columns - 1) // columns
+        tile_w = self.settings["sheet_tile_width"]
+        tile_h = max(tile.height for tile in tiles)
+        sheet = Image.new("RGB", (columns * (tile_w + SHEET_PADDING) + SHEET_PADDING,
+                                  rows * (tile_h + SHEET_PADDING) + SHEET_PADDING), SHEET_BACKGROUND)
+        for index, tile in enumerate(tiles):
+            row, column = divmod(index, columns)
+            sheet.paste(tile, (SHEET_PADDING + column * (tile_w + SHEET_PADDING),
+                               SHEET_PADDING + row * (tile_h + SHEET_PADDING)))
+        return sheet
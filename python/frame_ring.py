@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+共有メモリのフレームリングバッファ
+
+multiprocessing.shared_memory 上に固定数のフレームスロットを事前確保し、
+合成ワーカープロセスはスロットへ直接書き込み、エンコーダへ送るプロセスは
+スロットをそのままffmpegの標準入力へ書き出す。フレームはプロセス間で
+pickleされず、ホットループ内でフレーム単位のメモリ確保も発生しない。
+"""
+
+import logging
+from multiprocessing import shared_memory
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRing:
+    """共有メモリ上のフレームスロット列（ワーカーへは名前で受け渡して再接続する）"""
+
+    def __init__(
+        self,
+        slot_count: int,
+        frame_shape: Tuple[int, ...],
+        name: Optional[str] = None,
+        dtype: Any = np.uint8
+    ):
+        """
+        Args:
+            slot_count: スロット数
+            frame_shape: 1フレームの形状（高さ, 幅, チャンネル）
+            name: 既存の共有メモリ名（Noneなら新規作成）
+            dtype: 要素型
+        """
+        self.slot_count = slot_count
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slot_count)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self._frames = np.ndarray((slot_count,) + self.frame_shape, dtype=self.dtype, buffer=self.memory.buf)
+        self._slots: List[np.ndarray] = [self._frames[i] for i in range(slot_count)]
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def spec(self) -> Tuple[int, Tuple[int, ...], str, str]:
+        """ワーカーで再接続するための引数（スロット数, 形状, 共有メモリ名, 要素型）"""
+        return self.slot_count, self.frame_shape, self.name, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec: Tuple[int, Tuple[int, ...], str, str]) -> "FrameRing":
+        """spec() の値から既存のリングへ接続"""
+        slot_count, frame_shape, name, dtype = spec
+        return cls(slot_count, frame_shape, name=name, dtype=np.dtype(dtype))
+
+    def slot(self, index: int) -> np.ndarray:
+        """スロットのビュー（共有メモリを直接参照）"""
+        return self._slots[index]
+
+    def close(self) -> None:
+        """共有メモリを切り離す（作成側は削除も行う）"""
+        self._slots = []
+        self._frames = None
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def write_frame_view(writer, frame: np.ndarray) -> None:
+    """
+    フレームを複製せずにffmpegへ書き出す（C連続配列のバッファをそのまま渡す）
+
+    Args:
+        writer: MoviePyの FFMPEG_VideoWriter（または同じ形の output_fanout.FanoutFrameWriter）
+        frame: uint8のフレーム（C連続）
+    """
+    try:
+        writer.proc.stdin.write(memoryview(frame))
+    except IOError:
+        # ffmpegのエラー内容付きの例外はMoviePy側の処理で組み立てる
+        writer.write_frame(frame)
+        raise
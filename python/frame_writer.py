@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+事前確保バッファへの合成とffmpegへのゼロコピー書き出し
+
+MoviePyの write_videofile はフレームごとに新しい配列を作り（合成クリップ1枚ごとに
+フレーム全体を複製）、uint8へ変換し、tobytes() でさらに複製してからffmpegへ渡す。
+ここでは1本の uint8 フレームバッファと合成用の作業バッファを使い回し、
+CompositeVideoClip の各クリップをバッファ上で直接重ねて memoryview のまま書き出す。
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+try:
+    from .frame_ring import write_frame_view
+    from .output_fanout import FanoutFrameWriter
+except ImportError:
+    from frame_ring import write_frame_view
+    from output_fanout import FanoutFrameWriter
+
+logger = logging.getLogger(__name__)
+
+POSITION_ALIASES = {
+    "center": ["center", "center"],
+    "left": ["left", "center"],
+    "right": ["right", "center"],
+    "top": ["center", "top"],
+    "bottom": ["center", "bottom"]
+}
+
+
+def clip_position(clip, clip_time: float, frame_size: Tuple[int, int], image_size: Tuple[int, int]) -> Tuple[int, int]:
+    """MoviePyの blit_on と同じ規則でクリップの左上座標を求める"""
+    frame_w, frame_h = frame_size
+    image_w, image_h = image_size
+
+    position = clip.pos(clip_time)
+    position = list(POSITION_ALIASES[position]) if isinstance(position, str) else list(position)
+    if clip.relative_pos:
+        for i, dim in enumerate((frame_w, frame_h)):
+            if not isinstance(position[i], str):
+                position[i] = dim * position[i]
+    if isinstance(position[0], str):
+        position[0] = {"left": 0, "center": (frame_w - image_w) / 2, "right": frame_w - image_w}[position[0]]
+    if isinstance(position[1], str):
+        position[1] = {"top": 0, "center": (frame_h - image_h) / 2, "bottom": frame_h - image_h}[position[1]]
+    return int(position[0]), int(position[1])
+
+
+class BlendScratch:
+    """合成用の作業バッファ（演算の型ごとに、重ねる範囲の最大サイズで確保して使い回す）"""
+
+    def __init__(self):
+        self._buffers: Dict[Tuple[np.dtype, np.dtype], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def get(
+        self,
+        foreground_dtype: np.dtype,
+        background_dtype: np.dtype,
+        height: int,
+        width: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(前景項, 背景項, 1 - マスク) の作業配列（height x width のビュー）"""
+        key = (np.dtype(foreground_dtype), np.dtype(background_dtype))
+        buffers = self._buffers.get(key)
+        if buffers is None or buffers[0].shape[0] < height or buffers[0].shape[1] < width:
+            alloc_h, alloc_w = height, width
+            if buffers is not None:
+                alloc_h, alloc_w = max(height, buffers[0].shape[0]), max(width, buffers[0].shape[1])
+            buffers = (
+                np.empty((alloc_h, alloc_w, 3), dtype=key[0]),
+                np.empty((alloc_h, alloc_w, 3), dtype=key[1]),
+                np.empty((alloc_h, alloc_w, 1), dtype=key[1])
+            )
+            self._buffers[key] = buffers
+        return tuple(buffer[:height, :width] for buffer in buffers)
+
+
+def blit_into(
+    buffer: np.ndarray,
+    scratch: BlendScratch,
+    image: np.ndarray,
+    mask: Optional[np.ndarray],
+    position: Tuple[int, int]
+) -> None:
+    """
+    画像をバッファ上の該当範囲へ直接重ねる（画面外ははみ出し分を切り捨て）
+
+    マスク付きは MoviePy の blit と同じ式・同じ演算型（mask * image + (1 - mask) * region）を
+    作業バッファ上で計算し、切り捨てでuint8へ戻すため、結果はMoviePyと一致する。
+
+    Args:
+        buffer: 出力フレーム（uint8、H x W x 3）
+        scratch: 作業バッファ
+        image: 重ねる画像
+        mask: 不透明度（0-1、H x W）またはNone
+        position: 左上座標
+    """
+    x, y = position
+    image_h, image_w = image.shape[:2]
+    frame_h, frame_w = buffer.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + image_w, frame_w), min(y + image_h, frame_h)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    source = image[y0 - y:y1 - y, x0 - x:x1 - x]
+    region = buffer[y0:y1, x0:x1]
+    if mask is None:
+        np.copyto(region, source, casting="unsafe")
+        return
+
+    alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x, np.newaxis]
+    # 前景項・背景項はそれぞれ MoviePy と同じ型で計算する（フェード中の画像はfloat64になる）
+    foreground, background, inverse = scratch.get(
+        np.result_type(mask.dtype, source.dtype, np.float32),
+        np.result_type(mask.dtype, region.dtype, np.float32),
+        y1 - y0, x1 - x0
+    )
+    np.multiply(alpha, source, out=foreground)
+    np.subtract(1.0, alpha, out=inverse)
+    np.multiply(inverse, region, out=background)
+    np.add(foreground, background, out=foreground)
+    np.copyto(region, foreground, casting="unsafe")
+
+
+def composite_into(buffer: np.ndarray, scratch: BlendScratch, clip, t: float) -> None:
+    """
+    時刻tのフレームをバッファへ合成
+
+    CompositeVideoClip は背景と再生中の各クリップをバッファ上で直接重ね、
+    それ以外のクリップは get_frame の結果をバッファへ複製する。
+    """
+    if not isinstance(clip, CompositeVideoClip) or clip.ismask:
+        np.copyto(buffer, clip.get_frame(t), casting="unsafe")
+        return
+
+    np.copyto(buffer, clip.bg.get_frame(t), casting="unsafe")
+    frame_size = (buffer.shape[1], buffer.shape[0])
+    for sub_clip in clip.playing_clips(t):
+        clip_time = t - sub_clip.start
+        image = sub_clip.get_frame(clip_time)
+        mask = sub_clip.mask.get_frame(clip_time) if sub_clip.mask is not None else None
+        if sub_clip.ismask or (mask is not None and mask.shape[:2] != image.shape[:2]):
+            # 特殊なクリップはMoviePyの合成処理に任せる
+            np.copyto(buffer, sub_clip.blit_on(buffer, t), casting="unsafe")
+            continue
+        position = clip_position(sub_clip, clip_time, frame_size, (image.shape[1], image.shape[0]))
+        blit_into(buffer, scratch, image, mask, position)
+
+
+class BufferedFrameWriter:
+    """事前確保したフレームバッファへ合成し、複製せずにffmpegへ書き出す"""
+
+    def __init__(
+        self,
+        output_path: str,
+        size: Tuple[int, int],
+        fps: float,
+        codec: str = "libx264",
+        bitrate: Optional[str] = None,
+        audiofile: Optional[str] = None,
+        preset: str = "medium",
+        threads: Optional[int] = None,
+        ffmpeg_params: Optional[List[str]] = None,
+        outputs: Optional[List[Dict[str, Any]]] = None
+    ):
+        """
+        Args:
+            outputs: 追加出力（output_fanout.parse_outputs で正規化済み、指定時は同時エンコード）
+        """
+        self.size = tuple(size)
+        self.fps = fps
+        self.buffer = np.zeros((self.size[1], self.size[0], 3), dtype=np.uint8)
+        self.scratch = BlendScratch()
+        if outputs:
+            self.writer = FanoutFrameWriter(
+                output_path, self.size, fps, codec=codec, audiofile=audiofile,
+                preset=preset, bitrate=bitrate, threads=threads, outputs=outputs
+            )
+        else:
+            self.writer = FFMPEG_VideoWriter(
+                output_path, self.size, fps, codec=codec, audiofile=audiofile,
+                preset=preset, bitrate=bitrate, threads=threads, ffmpeg_params=ffmpeg_params
+            )
+
+    def write_clip(self, clip, capture=None, progress=None) -> int:
+        """
+        クリップ全体を書き出す
+
+        Args:
+            clip: 出力するクリップ（duration必須）
+            capture: 指定フレームを書き出し時に静止画として保存する frame_capture.FrameCapture
+            progress: 書き出したフレーム数の通知先（render_progress.RenderProgress）
+
+        Returns:
+            int: 書き出したフレーム数
+        """
+        # フレーム時刻は MoviePy の iter_frames と同じ列を使う
+        frame_count = 0
+        for t in np.arange(0, clip.duration, 1.0 / self.fps):
+            composite_into(self.buffer, self.scratch, clip, t)
+            if capture is not None:
+                capture.capture(frame_count, self.buffer)
+            write_frame_view(self.writer, self.buffer)
+            frame_count += 1
+            if progress is not None:
+                progress.advance()
+        return frame_count
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def __enter__(self) -> "BufferedFrameWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+時間制限付きのジョブ単位プロセス実行
+
+ジョブごとに専用のワーカープロセスを spawn で起動し、制限時間内に終わらなければ
+そのプロセスだけを強制終了する。ffmpegが応答しなくなった1ジョブがバッチ全体を
+止めることはなく、他のジョブにも影響しない。ProcessPoolExecutor と同じ
+submit / shutdown を持ち、結果は concurrent.futures.Future で受け取る
+（時間切れは TimeoutError、ワーカーの異常終了は RuntimeError）。
+"""
+
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+def _run_isolated(sender: Any, fn: Callable[..., Any], args: tuple) -> None:
+    """ワーカープロセスでジョブを実行し、結果（または例外メッセージ）を送る"""
+    try:
+        result = (True, fn(*args))
+    except Exception as e:
+        result = (False, f"{type(e).__name__}: {str(e)}")
+    sender.send(result)
+    sender.close()
+
+
+class IsolatedProcessExecutor:
+    """ジョブごとに専用プロセスで実行し、制限時間を超えたプロセスを強制終了する"""
+
+    def __init__(self, timeout: float):
+        """
+        Args:
+            timeout: 1ジョブの制限時間（秒）
+        """
+        self.timeout = timeout
+        # 呼び出し側のスレッド（ハートビート等）を引き継がないよう spawn で起動する
+        self._context = multiprocessing.get_context("spawn")
+        self._watchers: List[threading.Thread] = []
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        ジョブを専用プロセスで開始
+
+        Args:
+            fn: pickle可能なモジュール関数
+            args: fn の引数
+
+        Returns:
+            Future: ジョブの結果
+        """
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_run_isolated, args=(sender, fn, args), daemon=True)
+        process.start()
+        sender.close()
+        watcher = threading.Thread(target=self._watch, args=(future, process, receiver),
+                                   name=f"isolated-job-{process.pid}", daemon=True)
+        watcher.start()
+        self._watchers.append(watcher)
+        return future
+
+    def _watch(self, future: Future, process: Any, receiver: Any) -> None:
+        """結果を待ち、制限時間を超えたらプロセスを強制終了する"""
+        ok, value = False, None
+        try:
+            if receiver.poll(self.timeout):
+                try:
+                    ok, value = receiver.recv()
+                except EOFError:
+                    value = None
+            else:
+                logger.error(f"ジョブが制限時間（{self.timeout:.0f}秒）を超えたため強制終了: pid {process.pid}")
+                process.kill()
+                value = TimeoutError(f"制限時間（{self.timeout:.0f}秒）を超えたため中止しました")
+        finally:
+            receiver.close()
+            process.join()
+
+        if ok:
+            future.set_result(value)
+        elif isinstance(value, Exception):
+            future.set_exception(value)
+        elif value is not None:
+            future.set_exception(RuntimeError(value))
+        else:
+            future.set_exception(RuntimeError(f"ワーカープロセスが異常終了しました（終了コード {process.exitcode}）"))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """実行中のジョブの終了を待つ（wait=False なら待たない）"""
+        if wait:
+            for watcher in self._watchers:
+                watcher.join()
+        self._watchers = [watcher for watcher in self._watchers if watcher.is_alive()]
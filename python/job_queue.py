@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+SQLiteによる永続レンダリングジョブキュー
+
+ジョブ（単一動画・テーマ動画の設定）と状態・試行回数・所要時間・出力パスを
+ローカルのSQLiteファイルに保持する。バッチが途中で落ちても記録は残り、
+同じバッチを再実行すると未完了のジョブだけを処理する。
+
+ジョブの取得は BEGIN IMMEDIATE（SQLiteのファイルロック）で行うため、同じホストの
+複数のコンシューマープロセスが同じキューを同時に処理しても1ジョブは1回だけ実行される。
+実行中のまま止まったジョブ（コンシューマーのプロセスが存在しない）は回収して再実行する。
+
+状態: queued → running → succeeded / failed（試行回数が上限未満なら queued へ戻して再試行）
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_SUCCEEDED = "succeeded"
+STATE_FAILED = "failed"
+
+DEFAULT_BATCH = "default"
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    config TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker_host TEXT,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration REAL,
+    output_paths TEXT,
+    captures TEXT,
+    report TEXT,
+    error TEXT,
+    UNIQUE (batch, output_path)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (batch, state, id);
+"""
+
+_JSON_COLUMNS = ("config", "output_paths", "captures", "report")
+
+
+def pid_alive(pid: Optional[int]) -> bool:
+    """同じホストのプロセスが生存しているか"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RenderJobQueue:
+    """SQLiteファイル上のレンダリングジョブキュー（プロセスごとに1インスタンス）"""
+
+    def __init__(self, db_path: str, timeout: float = 30.0, poll_interval: float = 1.0):
+        """
+        Args:
+            db_path: キューのSQLiteファイル
+            timeout: ロック待ちの上限秒数
+            poll_interval: 他のコンシューマーの実行中ジョブを待つ間の確認間隔（秒）
+        """
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.host = socket.gethostname()
+        self._conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "RenderJobQueue":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _transaction(self):
+        """書き込みロックを取ってから読むトランザクション（取得の競合を防ぐ）"""
+        return _ImmediateTransaction(self._conn)
+
+    def enqueue(
+        self,
+        configs: Sequence[Dict[str, Any]],
+        batch: str = DEFAULT_BATCH,
+        kind: str = "single",
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> List[int]:
+        """
+        ジョブを登録（同じバッチ・同じ出力パスのジョブが登録済みなら追加しない）
+
+        Args:
+            configs: compose_single_video / compose_theme_video の設定
+            batch: バッチ名
+            kind: "single" または "theme"
+            max_attempts: 失敗時の最大試行回数
+
+        Returns:
+            List[int]: 各設定に対応するジョブID（登録済みなら既存のID）
+        """
+        if kind not in ("single", "theme"):
+            raise ValueError(f"未対応のジョブ種別: {kind}")
+        job_ids = []
+        now = time.time()
+        with self._transaction():
+            for config in configs:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO jobs (batch, kind, output_path, config, state, max_attempts, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (batch, kind, config["output_path"], json.dumps(config, ensure_ascii=False),
+                     STATE_QUEUED, max_attempts, now)
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE batch = ? AND output_path = ?", (batch, config["output_path"])
+                ).fetchone()
+                job_ids.append(row["id"])
+        return job_ids
+
+    def claim(self, batch: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        待機中のジョブを1件取得して実行中にする
+
+        Args:
+            batch: 対象バッチ（Noneなら全バッチ）
+
+        Returns:
+            Optional[Dict[str, Any]]: ジョブ（待機中のジョブがなければNone）
+        """
+        with self._transaction():
+            query = "SELECT * FROM jobs WHERE state = ?"
+            params: List[Any] = [STATE_QUEUED]
+            if batch is not None:
+                query += " AND batch = ?"
+                params.append(batch)
+            row = self._conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            started_at = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, worker_host = ?, worker_pid = ?, "
+                "started_at = ?, finished_at = NULL, duration = NULL, error = NULL WHERE id = ?",
+                (STATE_RUNNING, self.host, os.getpid(), started_at, row["id"])
+            )
+        job = self._row_to_job(row)
+        job.update(state=STATE_RUNNING, attempts=job["attempts"] + 1, worker_host=self.host,
+                   worker_pid=os.getpid(), started_at=started_at)
+        return job
+
+    def complete(
+        self,
+        job_id: int,
+        output_paths: List[str],
+        captures: Optional[List[str]] = None,
+        report: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """ジョブを成功として記録"""
+        finished_at = time.time()
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, duration = ? - started_at, "
+            "output_paths = ?, captures = ?, report = ?, error = NULL WHERE id = ?",
+            (STATE_SUCCEEDED, finished_at, finished_at, json.dumps(output_paths, ensure_ascii=False),
+             json.dumps(captures or [], ensure_ascii=False), json.dumps(report or {}, default=str), job_id)
+        )
+
+    def fail(self, job_id: int, error: str, report: Optional[Dict[str, Any]] = None) -> str:
+        """
+        ジョブの失敗を記録（試行回数が上限未満なら再試行のため待機中へ戻す）
+
+        Returns:
+            str: 記録後の状態
+        """
+        finished_at = time.time()
+        with self._transaction():
+            row = self._conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            state = STATE_QUEUED if row["attempts"] < row["max_attempts"] else STATE_FAILED
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, duration = ? - started_at, report = ?, error = ? "
+                "WHERE id = ?",
+                (state, finished_at, finished_at, json.dumps(report or {}, default=str), error, job_id)
+            )
+        return state
+
+    def release(self, job_id: int) -> None:
+        """取得したが実行しなかったジョブを試行回数を消費せず待機中へ戻す"""
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, attempts = attempts - 1, started_at = NULL WHERE id = ? AND state = ?",
+            (STATE_QUEUED, job_id, STATE_RUNNING)
+        )
+
+    def recover_stale(self) -> int:
+        """
+        コンシューマーが異常終了して実行中のまま残ったジョブを回収（このホストのジョブのみ）
+
+        Returns:
+            int: 回収したジョブ数
+        """
+        recovered = 0
+        with self._transaction():
+            rows = self._conn.execute(
+                "SELECT id, worker_pid, attempts, max_attempts FROM jobs WHERE state = ? AND worker_host = ?",
+                (STATE_RUNNING, self.host)
+            ).fetchall()
+            for row in rows:
+                if pid_alive(row["worker_pid"]):
+                    continue
+                state = STATE_QUEUED if row["attempts"] < row["max_attempts"] else STATE_FAILED
+                finished_at = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, finished_at = ?, duration = ? - started_at, error = ? WHERE id = ?",
+                    (state, finished_at, finished_at, f"コンシューマー異常終了（pid {row['worker_pid']}）", row["id"])
+                )
+                recovered += 1
+        if recovered:
+            logger.warning(f"実行中のまま停止したジョブを回収: {recovered}件")
+        return recovered
+
+    def retry_failed(self, batch: Optional[str] = None) -> int:
+        """
+        失敗したジョブを試行回数をリセットして待機中へ戻す
+
+        Returns:
+            int: 再投入したジョブ数
+        """
+        query = "UPDATE jobs SET state = ?, attempts = 0, error = NULL WHERE state = ?"
+        params: List[Any] = [STATE_QUEUED, STATE_FAILED]
+        if batch is not None:
+            query += " AND batch = ?"
+            params.append(batch)
+        return self._conn.execute(query, params).rowcount
+
+    def jobs(self, batch: Optional[str] = None) -> List[Dict[str, Any]]:
+        """ジョブ一覧（登録順）"""
+        query = "SELECT * FROM jobs"
+        params: List[Any] = []
+        if batch is not None:
+            query += " WHERE batch = ?"
+            params.append(batch)
+        return [self._row_to_job(row) for row in self._conn.execute(query + " ORDER BY id", params)]
+
+    def summary(self, batch: Optional[str] = None) -> Dict[str, int]:
+        """状態ごとのジョブ数"""
+        counts = {state: 0 for state in (STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, STATE_FAILED)}
+        query = "SELECT state, COUNT(*) AS count FROM jobs"
+        params: List[Any] = []
+        if batch is not None:
+            query += " WHERE batch = ?"
+            params.append(batch)
+        for row in self._conn.execute(query + " GROUP BY state", params):
+            counts[row["state"]] = row["count"]
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for column in _JSON_COLUMNS:
+            if job.get(column) is not None:
+                job[column] = json.loads(job[column])
+        return job
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT（例外時はROLLBACK）"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc_info: Any) -> None:
+        self.conn.execute("ROLLBACK" if exc_type is not None else "COMMIT")
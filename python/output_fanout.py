@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+1回の合成から複数の成果物を出力（マルチ出力）
+
+合成済みフレームを1本のffmpegへ1回だけ渡し、filter_complex の split で分岐して
+出力ごとに中央クロップ・拡縮・エンコードする。背景・音声のデコードと字幕の合成は
+出力数に関係なく1回で済み、エンコード済み音声も全出力へストリームコピーする。
+
+settings.video.outputs に追加の出力を並べる（主出力は従来どおり output_path）:
+    [{"output_path": "clip_720p.mp4", "resolution": [1280, 720]},
+     {"output_path": "clip_shorts.mp4", "resolution": [1080, 1920], "bitrate": "4000k"}]
+主出力と縦横比が異なる出力は、主出力の中央を出力の縦横比で切り出してから拡縮する。
+"""
+
+import os
+import logging
+import subprocess
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from moviepy.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+def _even(value: float) -> int:
+    """yuv420pでエンコードできるよう偶数へ丸める（最小2）"""
+    return max(2, int(round(value / 2.0)) * 2)
+
+
+def parse_outputs(outputs: Optional[Sequence[Dict[str, Any]]], video_settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    追加出力の指定を検証し、省略された項目を主出力の設定で補う
+
+    Args:
+        outputs: settings.video.outputs（output_path必須、resolution, codec, bitrate, preset は任意）
+        video_settings: 主出力の動画設定
+
+    Returns:
+        List[Dict[str, Any]]: 正規化済みの出力指定（resolution未指定はNone = 合成解像度のまま）
+    """
+    parsed = []
+    for index, output in enumerate(outputs or []):
+        if not output.get("output_path"):
+            raise ValueError(f"outputs[{index}] に output_path がありません")
+        resolution = output.get("resolution")
+        if resolution is not None:
+            resolution = (int(resolution[0]), int(resolution[1]))
+            if resolution[0] % 2 or resolution[1] % 2:
+                raise ValueError(f"outputs[{index}] の解像度は偶数である必要があります: {resolution[0]}x{resolution[1]}")
+        parsed.append({
+            "output_path": output["output_path"],
+            "resolution": resolution,
+            "codec": output.get("codec", video_settings.get("codec", "libx264")),
+            "bitrate": output.get("bitrate", video_settings.get("bitrate", "5000k")),
+            "preset": output.get("preset", video_settings.get("preset", "medium"))
+        })
+    return parsed
+
+
+def output_filter(source_size: Tuple[int, int], resolution: Optional[Tuple[int, int]]) -> str:
+    """
+    合成フレームから1出力分を作るフィルタ（中央クロップ → 拡縮）
+
+    Args:
+        source_size: 合成フレームの解像度
+        resolution: 出力解像度（Noneなら合成解像度のまま）
+
+    Returns:
+        str: ffmpegのフィルタ文字列
+    """
+    source_w, source_h = source_size
+    if resolution is None or tuple(resolution) == (source_w, source_h):
+        return "null"
+
+    target_w, target_h = resolution
+    filters = []
+    # 縦横比が異なれば、はみ出す側を中央で切り落とす（引き伸ばさない）
+    if source_w * target_h > target_w * source_h:
+        crop_w, crop_h = min(source_w, _even(source_h * target_w / target_h)), source_h
+    else:
+        crop_w, crop_h = source_w, min(source_h, _even(source_w * target_h / target_w))
+    if (crop_w, crop_h) != (source_w, source_h):
+        filters.append(f"crop={crop_w}:{crop_h}:{(source_w - crop_w) // 4 * 2}:{(source_h - crop_h) // 4 * 2}")
+    if (crop_w, crop_h) != (target_w, target_h):
+        filters.append(f"scale={target_w}:{target_h}")
+    return ",".join(filters) or "null"
+
+
+def derived_output_path(path: str, index: int) -> str:
+    """中間ファイル（チャンク等）の追加出力用パス（元パス + .outN）"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.out{index}{ext}"
+
+
+class FanoutFrameWriter:
+    """
+    生フレームを1本のffmpegへ渡し、主出力と追加出力を同時にエンコードする
+
+    FFMPEG_VideoWriter と同じ引数・write_frame/close を持ち、そのまま置き換えられる。
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        size: Tuple[int, int],
+        fps: float,
+        codec: str = "libx264",
+        audiofile: Optional[str] = None,
+        preset: str = "medium",
+        bitrate: Optional[str] = None,
+        threads: Optional[int] = None,
+        outputs: Optional[Sequence[Dict[str, Any]]] = None,
+        pix_fmt: str = "rgb24"
+    ):
+        """
+        Args:
+            output_path: 主出力パス（合成解像度のまま）
+            size: 合成フレームの解像度
+            fps: フレームレート
+            codec / preset / bitrate: 主出力のエンコード設定
+            audiofile: エンコード済み音声（全出力へストリームコピー）
+            threads: ffmpegのスレッド数
+            outputs: parse_outputs で正規化した追加出力
+            pix_fmt: 入力フレームの画素形式（"rgb24" または "yuv420p"）
+        """
+        self.size = tuple(size)
+        targets = [{"output_path": output_path, "resolution": None,
+                    "codec": codec, "bitrate": bitrate, "preset": preset}] + list(outputs or [])
+        self.output_paths = [target["output_path"] for target in targets]
+
+        cmd: List[str] = [
+            get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo",
+            "-s", f"{self.size[0]}x{self.size[1]}", "-pix_fmt", pix_fmt, "-r", f"{fps:.02f}",
+            "-an", "-i", "-"
+        ]
+        if audiofile is not None:
+            cmd.extend(["-i", audiofile])
+
+        labels = [f"[s{i}]" for i in range(len(targets))]
+        graph = [f"[0:v]split={len(targets)}{''.join(labels)}"]
+        for i, target in enumerate(targets):
+            graph.append(f"{labels[i]}{output_filter(self.size, target['resolution'])}[v{i}]")
+        cmd.extend(["-filter_complex", ";".join(graph)])
+
+        for i, target in enumerate(targets):
+            cmd.extend(["-map", f"[v{i}]"])
+            if audiofile is not None:
+                cmd.extend(["-map", "1:a", "-acodec", "copy"])
+            cmd.extend(["-vcodec", target["codec"], "-preset", target["preset"]])
+            if target["bitrate"] is not None:
+                cmd.extend(["-b:v", target["bitrate"]])
+            if threads is not None:
+                cmd.extend(["-threads", str(threads)])
+            cmd.extend(["-pix_fmt", "yuv420p", target["output_path"]])
+
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        logger.info(f"マルチ出力: {len(targets)}本を同時エンコード ({', '.join(self.output_paths)})")
+
+    def write_frame(self, frame: np.ndarray) -> None:
+        """フレーム（C連続の配列）を複製せずに書き出す"""
+        try:
+            self.proc.stdin.write(memoryview(frame))
+        except IOError as e:
+            _, ffmpeg_error = self.proc.communicate()
+            raise IOError(f"{str(e)}\nffmpegエラー（{self.output_paths[0]} ほか）: "
+                          f"{ffmpeg_error.decode(errors='replace')}")
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        ffmpeg_error = self.proc.stderr.read()
+        self.proc.wait()
+        if self.proc.returncode:
+            raise IOError(f"ffmpegエラー（{self.output_paths[0]} ほか）: {ffmpeg_error.decode(errors='replace')}")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+入力の指紋による出力ストア（コンテンツアドレス型の重複排除）
+
+レンダリング結果を入力（素材ファイルの内容ハッシュ・テキスト・設定）の指紋ごとに
+ストアへハードリンクで登録し、同じ入力のジョブは再エンコードせずストアの
+ファイルを出力パスへハードリンクする。日付フォルダ間で同じ動画が何本あっても
+ディスク上の実体は1つになる。ハードリンクできない場合（別ファイルシステム等）は
+コピーで出力し、ストアへの登録は行わない。
+
+ストアの構成:
+    <root>/<指紋の先頭2文字>/<指紋>/manifest.json   ... 登録完了の印（最後に作成）
+    <root>/<指紋の先頭2文字>/<指紋>/<役割名>        ... 出力ファイル（video.mp4, output_0.mp4, capture_title.jpg 等）
+"""
+
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+try:
+    from .atomic_output import commit_output, discard_partial, fsync_directory, partial_path
+except ImportError:
+    from atomic_output import commit_output, discard_partial, fsync_directory, partial_path
+
+logger = logging.getLogger(__name__)
+
+# 出力の内容に影響する変更を入れたら上げる（古い登録を使わないため）
+OUTPUT_STORE_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+
+def render_fingerprint(description: Dict[str, Any]) -> str:
+    """
+    レンダリング入力の指紋
+
+    Args:
+        description: 素材のハッシュ・テキスト・設定をまとめた辞書（JSON化できる値）
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    encoded = json.dumps({"version": OUTPUT_STORE_VERSION, **description},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _same_file(path_a: str, path_b: str) -> bool:
+    try:
+        return os.path.samefile(path_a, path_b)
+    except OSError:
+        return False
+
+
+def place_file(source: str, path: str) -> bool:
+    """
+    source を path へハードリンクで配置（できなければコピー）し、アトミックに置き換える
+
+    Returns:
+        bool: ハードリンクで配置できたか
+    """
+    if _same_file(source, path):
+        return True
+    partial = partial_path(path)
+    discard_partial(partial)
+    try:
+        os.link(source, partial)
+        linked = True
+    except OSError:
+        shutil.copyfile(source, partial)
+        linked = False
+    try:
+        commit_output(partial, path)
+    except BaseException:
+        discard_partial(partial)
+        raise
+    return linked
+
+
+class OutputStore:
+    """指紋ごとに完成した出力ファイル一式を保持するストア"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def entry_dir(self, fingerprint: str) -> str:
+        return os.path.join(self.root, fingerprint[:2], fingerprint)
+
+    def lookup(self, fingerprint: str) -> Optional[Dict[str, str]]:
+        """
+        登録済みの出力一式を取得
+
+        Returns:
+            Optional[Dict[str, str]]: 役割名 → ストア内のパス（未登録・不完全ならNone）
+        """
+        entry = self.entry_dir(fingerprint)
+        try:
+            with open(os.path.join(entry, MANIFEST_NAME), "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        files = {role: os.path.join(entry, role) for role in manifest.get("files", [])}
+        if not all(os.path.exists(path) for path in files.values()):
+            logger.warning(f"出力ストアの登録が不完全なため使用しません: {entry}")
+            return None
+        return files
+
+    def restore(self, fingerprint: str, destinations: Dict[str, str]) -> bool:
+        """
+        登録済みの出力を出力先へハードリンクする
+
+        Args:
+            fingerprint: 入力の指紋
+            destinations: 役割名 → 出力先パス（登録された役割をすべて含むこと）
+
+        Returns:
+            bool: 復元したか（未登録・役割の不一致ならFalse、何も書かない）
+        """
+        files = self.lookup(fingerprint)
+        if files is None or set(files) != set(destinations):
+            return False
+        for role, path in destinations.items():
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            place_file(files[role], path)
+        logger.info(f"出力ストアから復元（再エンコードなし）: {fingerprint[:12]} → {len(destinations)}ファイル")
+        return True
+
+    def save(self, fingerprint: str, files: Dict[str, str]) -> None:
+        """
+        出力一式をストアへハードリンクで登録
+
+        同じ指紋が登録済みなら、出力側をストアのファイルへのハードリンクに置き換えて実体を共有する。
+        ストアが別ファイルシステムでハードリンクできない場合は登録しない（コピーで容量を増やさない）。
+
+        Args:
+            fingerprint: 入力の指紋
+            files: 役割名 → 完成した出力ファイルのパス
+        """
+        stored = self.lookup(fingerprint)
+        if stored is not None and set(stored) == set(files):
+            for role, path in files.items():
+                place_file(stored[role], path)
+            return
+
+        entry = self.entry_dir(fingerprint)
+        parent = os.path.dirname(entry)
+        os.makedirs(parent, exist_ok=True)
+        staging = os.path.join(parent, f".{fingerprint}.{os.getpid()}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            for role, path in files.items():
+                try:
+                    os.link(path, os.path.join(staging, role))
+                except OSError as e:
+                    if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        logger.warning(f"出力ストアへハードリンクできないため登録しません: {str(e)}")
+                        return
+                    raise
+            with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as manifest_file:
+                json.dump({"files": list(files), "created": time.time()}, manifest_file)
+                manifest_file.flush()
+                os.fsync(manifest_file.fileno())
+
+            if stored is not None:
+                # 役割の異なる古い登録は置き換える
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # 他のプロセスが先に登録した（内容は同じ入力から作られたもの）
+                logger.info(f"出力ストアは登録済み: {fingerprint[:12]}")
+                return
+            fsync_directory(parent)
+            logger.info(f"出力ストアへ登録: {fingerprint[:12]} ({len(files)}ファイル)")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+字幕画像のデコード済みキャッシュ
+
+字幕PNGをデコードした結果（乗算済みRGB・アルファ・MoviePy用のRGB）を
+ファイル内容のハッシュをキーにプロセス内で保持し、合計バイト数の上限を
+超えたら最も古く使われたものから破棄する（LRU）。バッチやテーマ動画で
+同じ字幕画像を何度使っても、デコードはプロセスごとに1回で済む。
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    from .audio_analysis import file_digest
+    from .yuv_compositing import YuvOverlay
+except ImportError:
+    from audio_analysis import file_digest
+    from yuv_compositing import YuvOverlay
+
+logger = logging.getLogger(__name__)
+
+# キャッシュ全体の上限（1920x200の字幕1枚で約5MB）
+DEFAULT_OVERLAY_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class SubtitleOverlay:
+    """デコード済みの字幕画像（配列はすべて読み取り専用で共有する）"""
+
+    __slots__ = ("premultiplied", "alpha", "rgb", "size", "nbytes", "yuv")
+
+    def __init__(self, rgba: np.ndarray):
+        rgba = np.asarray(rgba, dtype=np.uint8)
+        alpha = rgba[:, :, 3:4].astype(np.float32) / 255.0
+        self.premultiplied = rgba[:, :, :3].astype(np.float32) * alpha   # 乗算済みRGB（0-255）
+        self.alpha = alpha                                                # 不透明度（0-1、H x W x 1）
+        self.rgb = np.ascontiguousarray(rgba[:, :, :3])                  # MoviePy用のストレートRGB
+        for array in (self.premultiplied, self.alpha, self.rgb):
+            array.flags.writeable = False
+        height, width = alpha.shape[:2]
+        self.size = (width, height)
+        self.nbytes = self.premultiplied.nbytes + self.alpha.nbytes + self.rgb.nbytes
+        self.yuv = None                                                   # YUV420p用（必要になった時点で変換）
+
+    @classmethod
+    def decode(cls, image_path: str) -> "SubtitleOverlay":
+        """字幕画像をデコード"""
+        with Image.open(image_path) as image:
+            return cls(np.asarray(image.convert("RGBA")))
+
+    def to_clip(self, duration: float):
+        """MoviePyのImageClip（マスク付き）を作成"""
+        from moviepy.editor import ImageClip
+        mask = ImageClip(self.alpha[:, :, 0], ismask=True, duration=duration)
+        return ImageClip(self.rgb, duration=duration).set_mask(mask)
+
+
+class OverlayCache:
+    """ファイルハッシュをキーとする、合計バイト数上限付きLRUキャッシュ"""
+
+    def __init__(self, max_bytes: int = DEFAULT_OVERLAY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, SubtitleOverlay]" = OrderedDict()
+        # パス→（サイズ, 更新時刻, ハッシュ）：同一プロセス内の再ハッシュを避ける
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, image_path: str) -> str:
+        stat = os.stat(image_path)
+        cached = self._digests.get(image_path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        value = file_digest(image_path)
+        self._digests[image_path] = (stat.st_size, stat.st_mtime_ns, value)
+        return value
+
+    def get(self, image_path: Optional[str]) -> Optional[SubtitleOverlay]:
+        """
+        字幕画像を取得（未キャッシュならデコードして登録）
+
+        Args:
+            image_path: 字幕画像パス
+
+        Returns:
+            Optional[SubtitleOverlay]: デコード済み字幕（ファイルがない・読めない場合はNone）
+        """
+        if not image_path or not os.path.exists(image_path):
+            return None
+
+        digest = self._digest(image_path)
+        with self._lock:
+            overlay = self._entries.get(digest)
+            if overlay is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return overlay
+
+        try:
+            overlay = SubtitleOverlay.decode(image_path)
+        except Exception as e:
+            logger.warning(f"字幕画像読み込み失敗（スキップ）: {str(e)}")
+            return None
+
+        with self._lock:
+            self.misses += 1
+            if digest not in self._entries:
+                self._entries[digest] = overlay
+                self.current_bytes += overlay.nbytes
+                self._evict()
+            return overlay
+
+    def get_yuv(self, image_path: Optional[str]):
+        """
+        YUV420p合成用に変換済みの字幕画像を取得（変換は字幕ごとに1回）
+
+        Returns:
+            Optional[YuvOverlay]: 変換済み字幕（ファイルがない・読めない場合はNone）
+        """
+        overlay = self.get(image_path)
+        if overlay is None:
+            return None
+        if overlay.yuv is None:
+            yuv = YuvOverlay(overlay.premultiplied, overlay.alpha)
+            with self._lock:
+                if overlay.yuv is None:
+                    overlay.yuv = yuv
+                    overlay.nbytes += yuv.nbytes
+                    if any(entry is overlay for entry in self._entries.values()):
+                        self.current_bytes += yuv.nbytes
+                        self._evict()
+        return overlay.yuv
+
+    def _evict(self) -> None:
+        """上限を超えた分を古い順に破棄（直前に追加した1件は残す）"""
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット数・ミス数・保持件数・保持バイト数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes
+            }
+
+
+_overlay_cache: Optional[OverlayCache] = None
+_overlay_cache_lock = threading.Lock()
+
+
+def get_overlay_cache() -> OverlayCache:
+    """プロセス共通の字幕画像キャッシュ"""
+    global _overlay_cache
+    with _overlay_cache_lock:
+        if _overlay_cache is None:
+            _overlay_cache = OverlayCache()
+        return _overlay_cache
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+セグメント並列エンコード
+
+テーマ動画のタイムラインをセグメント境界（フレーム境界）で複数チャンクに分割し、
+各チャンクを別プロセスで映像のみエンコードする。各チャンクは独立した
+エンコードのため先頭がキーフレームになり、ffmpegのconcat demuxerで
+ストリームコピー（再エンコードなし）により結合できる。音声はタイムライン全体を
+1回だけミックス・エンコードして結合時に多重化する。
+
+完了したチャンクと進捗ジャーナルはジョブのスクラッチディレクトリに保存され、
+同じジョブを再実行すると未完了のチャンクだけをエンコードして再開する。
+"""
+
+import os
+import json
+import hashlib
+import logging
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+
+from moviepy.config import get_setting
+
+try:
+    from .streaming_composer import StreamingRenderer
+    from .audio_analysis import DEFAULT_SAMPLE_RATE
+    from .theme_timeline import TimelineSegment
+    from .output_fanout import derived_output_path, parse_outputs
+    from .frame_capture import FrameCapture
+    from .render_progress import RenderProgress
+    from .atomic_output import atomic_outputs
+except ImportError:
+    from streaming_composer import StreamingRenderer
+    from audio_analysis import DEFAULT_SAMPLE_RATE
+    from theme_timeline import TimelineSegment
+    from output_fanout import derived_output_path, parse_outputs
+    from frame_capture import FrameCapture
+    from render_progress import RenderProgress
+    from atomic_output import atomic_outputs
+
+logger = logging.getLogger(__name__)
+
+
+def plan_chunks(segments: Sequence[TimelineSegment], chunk_count: int) -> List[List[TimelineSegment]]:
+    """
+    セグメント列をフレーム数がほぼ均等な連続チャンクへ分割
+
+    チャンク境界は必ずセグメント境界（= フレーム境界）に置く。
+
+    Args:
+        segments: タイムライン（フレーム範囲確定済み）
+        chunk_count: 目標チャンク数
+
+    Returns:
+        List[List[TimelineSegment]]: チャンクごとのセグメントリスト
+    """
+    chunk_count = max(1, min(chunk_count, len(segments)))
+    first_frame = segments[0].first_frame
+    total_frames = segments[-1].last_frame - first_frame
+    target_frames = total_frames / chunk_count
+
+    chunks: List[List[TimelineSegment]] = []
+    current: List[TimelineSegment] = []
+    for index, segment in enumerate(segments):
+        current.append(segment)
+        remaining_segments = len(segments) - index - 1
+        remaining_chunks = chunk_count - len(chunks) - 1
+        if remaining_chunks == 0:
+            continue
+
+        elapsed_frames = segment.last_frame - first_frame
+        if elapsed_frames >= target_frames * (len(chunks) + 1) or remaining_segments == remaining_chunks:
+            chunks.append(current)
+            current = []
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _encode_chunk(
+    chunk_segments: List[TimelineSegment],
+    background_path: Optional[str],
+    chunk_path: str,
+    video_settings: Dict[str, Any],
+    subtitle_settings: Dict[str, Any],
+    threads: int,
+    capture: Optional[FrameCapture] = None,
+    progress: Optional[RenderProgress] = None
+) -> Tuple[int, Dict[str, str]]:
+    """
+    ワーカープロセスで1チャンクを映像のみエンコード（pickle可能なモジュール関数）
+
+    Returns:
+        Tuple[int, Dict[str, str]]: フレーム数と、保存した静止画（フレーム番号の文字列 → パス）
+    """
+    renderer = StreamingRenderer(os.path.dirname(chunk_path))
+    background = renderer.open_background(background_path)
+    try:
+        frames = renderer.write_frames(
+            chunk_segments, background, None, chunk_path,
+            video_settings, subtitle_settings, video_settings.get("fps", 30),
+            threads=threads, composite_workers=threads, capture=capture, progress=progress
+        )
+        if progress is not None:
+            progress.flush()
+        saved = {str(n): path for n, path in capture.saved.items()} if capture is not None else {}
+        return frames, saved
+    finally:
+        if background is not None:
+            background.close()
+
+
+class RenderJournal:
+    """
+    チャンク単位の進捗ジャーナル（ジョブのスクラッチディレクトリ内のJSON）
+
+    削除するのはジャーナル自身と、ジャーナルに記録した成果物だけ（ディレクトリごと削除しない）。
+    """
+
+    FILE_NAME = "journal.json"
+
+    def __init__(self, scratch_dir: str, job_key: str):
+        self.scratch_dir = scratch_dir
+        self.job_key = job_key
+        self.path = os.path.join(scratch_dir, self.FILE_NAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.meta: Dict[str, Any] = {}
+
+    def load(self) -> bool:
+        """
+        既存ジャーナルを読み込む
+
+        Returns:
+            bool: 同一ジョブの続きから再開できるか（別ジョブ・破損時は記録済みの成果物を削除して初期化）
+        """
+        stale_entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as journal_file:
+                    data = json.load(journal_file)
+                if data.get("job_key") == self.job_key:
+                    self.entries = data.get("entries", {})
+                    self.meta = data.get("meta", {})
+                    return True
+                logger.info("ジョブ内容が変更されたためチェックポイントを破棄")
+                stale_entries = data.get("entries", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"ジャーナル読み込み失敗、最初から処理: {str(e)}")
+
+        self._remove_files(stale_entries)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self.entries = {}
+        self.meta = {}
+        self.save()
+        return False
+
+    def discard(self) -> None:
+        """記録した成果物とジャーナルを削除（空になったジョブのディレクトリも削除）"""
+        self._remove_files(self.entries)
+        self.entries = {}
+        for path in (self.path, self.path + ".tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(self.scratch_dir)
+        except OSError:
+            pass
+
+    def _remove_files(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        for entry in entries.values():
+            for file_name in [entry.get("file")] + list(entry.get("files", [])):
+                if not file_name or os.path.basename(file_name) != file_name:
+                    continue
+                try:
+                    os.remove(os.path.join(self.scratch_dir, file_name))
+                except FileNotFoundError:
+                    pass
+
+    def is_done(self, name: str) -> bool:
+        """完了済みかつ成果物が記録どおり残っているか"""
+        entry = self.entries.get(name)
+        if not entry:
+            return False
+        path = os.path.join(self.scratch_dir, entry["file"])
+        return os.path.exists(path) and os.path.getsize(path) == entry["size"]
+
+    def mark_done(self, name: str, file_name: str, files: Sequence[str] = (), **info) -> None:
+        """
+        成果物を完了として記録
+
+        Args:
+            name: 成果物名（チャンク名など）
+            file_name: 完了判定に使う成果物のファイル名（スクラッチディレクトリ内）
+            files: 同時に作成した付随ファイル名（追加出力のチャンク等、破棄時に一緒に削除する）
+        """
+        size = os.path.getsize(os.path.join(self.scratch_dir, file_name))
+        self.entries[name] = {"file": file_name, "size": size, **info}
+        if files:
+            self.entries[name]["files"] = list(files)
+        self.save()
+
+    def save(self) -> None:
+        """ジャーナルをアトミックに書き込み"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as journal_file:
+            json.dump({"job_key": self.job_key, "meta": self.meta, "entries": self.entries},
+                      journal_file, ensure_ascii=False)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.path)
+
+
+class ParallelSegmentEncoder:
+    """テーマ動画をチャンク並列エンコードしてストリームコピーで結合するクラス"""
+
+    def __init__(
+        self,
+        temp_dir: str,
+        optimizer=None,
+        max_workers: Optional[int] = None,
+        chunk_count: Optional[int] = None,
+        scratch_dir: Optional[str] = None
+    ):
+        self.temp_dir = temp_dir
+        self.optimizer = optimizer
+        self.max_workers = max_workers or min(os.cpu_count() or 1, 4)
+        self.chunk_count = chunk_count or self.max_workers
+        self.scratch_dir = scratch_dir
+
+    def render(
+        self,
+        segments: Sequence[TimelineSegment],
+        background_path: Optional[str],
+        output_path: str,
+        video_settings: Dict[str, Any],
+        background_settings: Dict[str, Any],
+        subtitle_settings: Dict[str, Any],
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> str:
+        """
+        セグメント列をチャンク並列でエンコードして出力
+
+        Args:
+            segments: タイムライン（StreamingRenderer.render と同じ形式）
+            background_path: 背景動画パス
+            output_path: 出力パス
+            video_settings: 動画設定
+            background_settings: 背景設定
+            subtitle_settings: 字幕設定
+            capture: 静止画の保存（各チャンクが担当範囲の静止画を保存してジャーナルに記録し、コンタクトシートは結合後に作成）
+            progress: 書き出したフレーム数の通知先（各チャンクプロセスへ渡す。音声ミックス後・結合前にも中止要求を確認）
+
+        Returns:
+            str: 出力動画のパス
+        """
+        chunks = plan_chunks(segments, self.chunk_count)
+        job_key = self._job_key(chunks, background_path, output_path,
+                                video_settings, background_settings, subtitle_settings)
+        scratch_dir = self._job_scratch_dir(output_path)
+        journal = RenderJournal(scratch_dir, job_key)
+        # x264のスレッド数を同時実行チャンク数で分け合い過剰なスレッド競合を避ける
+        workers = min(self.max_workers, len(chunks))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+        if not journal.load():
+            journal.meta["background_path"] = background_path
+            journal.save()
+        else:
+            finished = sum(1 for i in range(len(chunks)) if journal.is_done(self._chunk_name(i)))
+            logger.info(f"チェックポイントから再開: 完了チャンク {finished}/{len(chunks)}")
+
+        audio_path = os.path.join(scratch_dir, "audio.m4a")
+        with self._stage("load_audio"):
+            if not journal.is_done("audio"):
+                partial_path = os.path.join(scratch_dir, "audio.partial.m4a")
+                self._render_audio(segments, background_path, scratch_dir, partial_path,
+                                   video_settings, background_settings)
+                os.replace(partial_path, audio_path)
+                journal.mark_done("audio", "audio.m4a")
+        if progress is not None:
+            progress.check_cancelled()
+
+        with self._stage("export_video") as stage:
+            chunk_paths = [os.path.join(scratch_dir, f"{self._chunk_name(i)}.mp4") for i in range(len(chunks))]
+            pending = [i for i in range(len(chunks)) if not journal.is_done(self._chunk_name(i))]
+            stage["resumed_chunks"] = len(chunks) - len(pending)
+            logger.info(f"チャンク並列エンコード開始: 残り{len(pending)}/{len(chunks)}チャンク / {workers}ワーカー")
+
+            # マルチ出力では各チャンクが全出力分を同時にエンコードし、出力ごとに結合する
+            outputs = parse_outputs(video_settings.get("outputs"), video_settings)
+
+            if pending:
+                # 計測スレッド（ProcessMemorySampler）やファームのハートビートスレッドが動いているプロセスから
+                # fork しないよう、ワーカーは spawn で起動する（引数はすべて pickle 可能な値）
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=context) as executor:
+                    futures = {
+                        executor.submit(_encode_chunk, chunks[i], background_path,
+                                        self._partial_path(chunk_paths[i]),
+                                        self._chunk_video_settings(video_settings, outputs, chunk_paths[i]),
+                                        subtitle_settings, threads, capture, progress): i
+                        for i in pending
+                    }
+                    for future in as_completed(futures):
+                        i = futures[future]
+                        frames, captured = future.result()
+                        # 書き込み完了後にリネームし、途中のファイルを完了扱いしない
+                        for k in range(len(outputs)):
+                            os.replace(derived_output_path(self._partial_path(chunk_paths[i]), k),
+                                       derived_output_path(chunk_paths[i], k))
+                        os.replace(self._partial_path(chunk_paths[i]), chunk_paths[i])
+                        journal.mark_done(self._chunk_name(i), os.path.basename(chunk_paths[i]),
+                                          files=[os.path.basename(derived_output_path(chunk_paths[i], k))
+                                                 for k in range(len(outputs))],
+                                          frames=frames, captures=captured)
+
+            stage["frames"] = sum(journal.entries[self._chunk_name(i)]["frames"] for i in range(len(chunks)))
+            if capture is not None:
+                # 再開したチャンクの静止画も含め、このジョブで保存したものだけを登録する
+                for i in range(len(chunks)):
+                    capture.record(journal.entries[self._chunk_name(i)].get("captures", {}))
+            with atomic_outputs(output_path, video_settings) as (partial_output, partial_settings):
+                # 完了したチャンクはジャーナルに残るため、結合前に中止しても再実行時に続きから再開できる
+                if progress is not None:
+                    progress.check_cancelled()
+                self._concat(chunk_paths, audio_path, partial_output, scratch_dir)
+                for k, output in enumerate(partial_settings.get("outputs") or []):
+                    if progress is not None:
+                        progress.check_cancelled()
+                    self._concat([derived_output_path(path, k) for path in chunk_paths],
+                                 audio_path, output["output_path"], scratch_dir, f"chunks.out{k}.txt")
+
+        # 完成したらチェックポイントは不要（失敗時は再開用に残す）
+        journal.discard()
+        logger.info(f"チャンク並列エンコード完了: {output_path}")
+        return output_path
+
+    def checkpointed_background(self, output_path: str) -> Optional[str]:
+        """
+        中断したジョブが使用していた背景動画を取得
+
+        ランダム選択の背景を再実行時も同じにして、チェックポイントを再利用するため。
+
+        Returns:
+            Optional[str]: 背景動画パス（チェックポイントがなければNone）
+        """
+        scratch_dir = self._job_scratch_dir(output_path)
+        try:
+            with open(os.path.join(scratch_dir, RenderJournal.FILE_NAME), "r", encoding="utf-8") as journal_file:
+                return json.load(journal_file).get("meta", {}).get("background_path")
+        except (OSError, ValueError):
+            return None
+
+    def _chunk_video_settings(
+        self,
+        video_settings: Dict[str, Any],
+        outputs: List[Dict[str, Any]],
+        chunk_path: str
+    ) -> Dict[str, Any]:
+        """チャンク用の動画設定（追加出力の書き出し先をチャンクの途中ファイルに置き換える）"""
+        if not outputs:
+            return video_settings
+        partial_path = self._partial_path(chunk_path)
+        return {
+            **video_settings,
+            "outputs": [{**output, "output_path": derived_output_path(partial_path, k)}
+                        for k, output in enumerate(outputs)]
+        }
+
+    def _chunk_name(self, index: int) -> str:
+        return f"chunk_{index:03d}"
+
+    def _partial_path(self, chunk_path: str) -> str:
+        root, ext = os.path.splitext(chunk_path)
+        return f"{root}.partial{ext}"
+
+    def _job_scratch_dir(self, output_path: str) -> str:
+        """
+        ジョブのスクラッチディレクトリ（再起動後も残る）
+
+        既定は出力先の隣の専用ディレクトリ。scratch_dir 指定時は他のジョブ・ファイルと共有され得るため、
+        出力パスごとのサブディレクトリに分ける（中断したジョブの再実行で同じ場所を見つけられるよう、
+        入力で変わるジョブキーではなく出力パスで決める）。
+        """
+        output_path = os.path.abspath(output_path)
+        name = os.path.basename(output_path)
+        if self.scratch_dir is None:
+            return os.path.join(os.path.dirname(output_path), f".{name}.render")
+        digest = hashlib.sha1(output_path.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.scratch_dir, f"{name}.{digest}")
+
+    def _job_key(
+        self,
+        chunks: List[List[TimelineSegment]],
+        background_path: Optional[str],
+        output_path: str,
+        video_settings: Dict[str, Any],
+        background_settings: Dict[str, Any],
+        subtitle_settings: Dict[str, Any]
+    ) -> str:
+        """入力ファイル（パス・サイズ・更新時刻）とチャンク構成からジョブを識別"""
+        def file_signature(path: Optional[str]) -> Any:
+            if not path or not os.path.exists(path):
+                return path
+            stat = os.stat(path)
+            return [path, stat.st_size, stat.st_mtime_ns]
+
+        description = {
+            "chunks": [
+                [{**segment.to_dict(),
+                  "audio_file": file_signature(segment.audio_file),
+                  "subtitle_image": file_signature(segment.subtitle_image)}
+                 for segment in chunk]
+                for chunk in chunks
+            ],
+            "background": file_signature(background_path),
+            "output_path": os.path.abspath(output_path),
+            "video": video_settings,
+            "background_settings": background_settings,
+            "subtitle": subtitle_settings
+        }
+        encoded = json.dumps(description, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _stage(self, stage_name: str):
+        """計測ステージ（optimizer未指定時は何もしない）"""
+        if self.optimizer is not None:
+            return self.optimizer.measure_stage(stage_name)
+        return nullcontext({})
+
+    def _render_audio(
+        self,
+        segments: Sequence[TimelineSegment],
+        background_path: Optional[str],
+        scratch_dir: str,
+        audio_path: str,
+        video_settings: Dict[str, Any],
+        background_settings: Dict[str, Any]
+    ) -> None:
+        """タイムライン全体の音声を1回だけミックス・エンコード"""
+        renderer = StreamingRenderer(scratch_dir)
+        wav_path = os.path.join(scratch_dir, "audio.wav")
+        audio_fps = video_settings.get("audio_fps", DEFAULT_SAMPLE_RATE)
+        background = renderer.open_background(background_path, audio_fps)
+        try:
+            renderer.mix_audio(segments, background, background_settings, wav_path, audio_fps)
+            renderer.encode_audio(wav_path, audio_path, video_settings)
+        finally:
+            if background is not None:
+                background.close()
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+    def _concat(
+        self,
+        chunk_paths: List[str],
+        audio_path: str,
+        output_path: str,
+        scratch_dir: str,
+        list_name: str = "chunks.txt"
+    ) -> None:
+        """concat demuxerでチャンクをストリームコピー結合し音声を多重化"""
+        list_path = os.path.join(scratch_dir, list_name)
+        with open(list_path, "w", encoding="utf-8") as list_file:
+            for path in chunk_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+
+        cmd = [
+            get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", audio_path,
+            "-map", "0:v", "-map", "1:a",
+            "-c", "copy",
+            "-movflags", "+faststart",
+            output_path
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        finally:
+            os.remove(list_path)
+        if result.returncode != 0:
+            raise Exception(f"チャンク結合エラー: {result.stderr.decode('utf-8', 'replace').strip()}")
@@ -7,25 +7,142 @@
 
 import gc
 import os
+import json
 import logging
+import threading
 import time
-from typing import Dict, Any, Optional
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 import psutil
 from moviepy.editor import VideoFileClip, AudioFileClip
 
 logger = logging.getLogger(__name__)
 
+
+def collect_process_tree_memory(process: psutil.Process, include_uss: bool = False) -> Dict[str, int]:
+    """
+    プロセスツリー（Python本体 + ffmpegリーダー/ライター）のメモリ使用量を取得
+
+    Args:
+        process: 対象プロセス（通常は自プロセス）
+        include_uss: USSも取得するか（smaps読み込みのため高コスト）
+
+    Returns:
+        Dict[str, int]: self/children それぞれのRSS（・USS）バイト数
+    """
+    def read(proc: psutil.Process) -> Dict[str, int]:
+        if include_uss:
+            try:
+                full_info = proc.memory_full_info()
+                return {"rss": full_info.rss, "uss": getattr(full_info, "uss", full_info.rss)}
+            except psutil.AccessDenied:
+                pass
+        rss = proc.memory_info().rss
+        return {"rss": rss, "uss": rss}
+
+    usage = {"self_rss": 0, "self_uss": 0, "children_rss": 0, "children_uss": 0, "children_count": 0}
+    try:
+        own = read(process)
+        usage["self_rss"], usage["self_uss"] = own["rss"], own["uss"]
+        children = process.children(recursive=True)
+    except psutil.Error:
+        return usage
+
+    for child in children:
+        try:
+            child_usage = read(child)
+        except psutil.Error:
+            continue  # 計測中に終了した子プロセス
+        usage["children_rss"] += child_usage["rss"]
+        usage["children_uss"] += child_usage["uss"]
+        usage["children_count"] += 1
+
+    return usage
+
+
+class ProcessMemorySampler:
+    """プロセスツリーのRSSを一定間隔でサンプリングしピークを記録するスレッド"""
+
+    def __init__(self, process: psutil.Process, interval: float = 0.05):
+        self.process = process
+        self.interval = interval
+        self.peak_self_rss = 0
+        self.peak_children_rss = 0
+        self.peak_total_rss = 0
+        self.first_total_rss: Optional[int] = None
+        self.last_total_rss = 0
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> Dict[str, int]:
+        """1回サンプリングしてピークを更新"""
+        usage = collect_process_tree_memory(self.process)
+        self.peak_self_rss = max(self.peak_self_rss, usage["self_rss"])
+        self.peak_children_rss = max(self.peak_children_rss, usage["children_rss"])
+        total_rss = usage["self_rss"] + usage["children_rss"]
+        self.peak_total_rss = max(self.peak_total_rss, total_rss)
+        if self.first_total_rss is None:
+            self.first_total_rss = total_rss
+        self.last_total_rss = total_rss
+        self.sample_count += 1
+        return usage
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self) -> "ProcessMemorySampler":
+        """サンプリング開始"""
+        self.sample()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, float]:
+        """サンプリング停止（ピーク値と開始・終了時の合計RSSをMBで返す）"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+        return {
+            "self_mb": self.peak_self_rss / (1024**2),
+            "children_mb": self.peak_children_rss / (1024**2),
+            "total_mb": self.peak_total_rss / (1024**2),
+            "start_total_mb": (self.first_total_rss or 0) / (1024**2),
+            "end_total_mb": self.last_total_rss / (1024**2)
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
 class PerformanceOptimizer:
     """動画生成パフォーマンス最適化クラス"""
 
+    # ジョブメモリ予測の係数（1080p実測値ベース）
+    BASE_PROCESS_GB = 0.15          # Python + MoviePy本体
+    FRAME_BUFFER_COUNT = 6          # 合成中に同時に存在するフレームバッファ数
+    ENCODER_BASE_GB = 0.1           # ffmpegライター（x264）の固定分
+    ENCODER_PER_MEGAPIXEL_GB = 0.15 # x264のルックアヘッド等（解像度比例）
+    AUDIO_READER_GB = 0.03          # 音声リーダー（ffmpegプロセス）1つあたり
+    VIDEO_READER_GB = 0.08          # 背景動画リーダー1つあたり
+
     def __init__(self):
         self.memory_threshold = 0.8  # メモリ使用率80%で警告
         self.temp_files = []  # 一時ファイル管理
         self.performance_stats = {}
+        self.process = psutil.Process(os.getpid())
+        self.sampling_interval = 0.05  # ピークRSSサンプリング間隔（秒）
+        self.admission_safety_factor = 1.2  # 予測メモリに対する安全係数
 
     def monitor_memory_usage(self) -> Dict[str, float]:
-        """メモリ使用量監視"""
+        """メモリ使用量監視（ホスト全体）"""
         memory = psutil.virtual_memory()
         return {
             "percent": memory.percent,
@@ -34,6 +151,81 @@ class PerformanceOptimizer:
             "total_gb": memory.total / (1024**3)
         }
 
+    def monitor_process_memory(self, include_uss: bool = True) -> Dict[str, float]:
+        """合成プロセスツリー（Python + ffmpeg子プロセス）のメモリ使用量監視"""
+        usage = collect_process_tree_memory(self.process, include_uss=include_uss)
+        return {
+            "rss_gb": usage["self_rss"] / (1024**3),
+            "uss_gb": usage["self_uss"] / (1024**3),
+            "children_rss_gb": usage["children_rss"] / (1024**3),
+            "children_uss_gb": usage["children_uss"] / (1024**3),
+            "total_rss_gb": (usage["self_rss"] + usage["children_rss"]) / (1024**3),
+            "total_uss_gb": (usage["self_uss"] + usage["children_uss"]) / (1024**3),
+            "children_count": usage["children_count"]
+        }
+
+    def estimate_job_memory_gb(self, video_config: Dict[str, Any]) -> float:
+        """
+        ジョブ1件あたりの予測メモリ使用量（GB）
+
+        解像度・音声ファイル数・背景動画の有無から、Python本体と
+        ffmpegリーダー/ライターを含むプロセスツリーのピークを見積もる。
+        """
+        settings = video_config.get("settings", {})
+        width, height = settings.get("video", {}).get("resolution", (1920, 1080))
+        megapixels = width * height / 1_000_000
+        frame_gb = width * height * 3 / (1024**3)
+
+        audio_files = video_config.get("audio_files") or [video_config.get("audio_file")]
+        audio_count = len([f for f in audio_files if f])
+        if "audio_files" in video_config:
+            audio_count += 1  # タイトル音声
+
+        projected = (
+            self.BASE_PROCESS_GB
+            + frame_gb * self.FRAME_BUFFER_COUNT
+            + self.ENCODER_BASE_GB
+            + self.ENCODER_PER_MEGAPIXEL_GB * megapixels
+            + self.AUDIO_READER_GB * audio_count
+            + self.VIDEO_READER_GB
+        )
+        return projected
+
+    def can_admit_job(self, video_config: Dict[str, Any], reserved_gb: float = 0.0) -> bool:
+        """
+        予測メモリに基づくジョブ受け入れ判定
+
+        Args:
+            video_config: 動画合成設定
+            reserved_gb: 実行中ジョブがこれから確保するとみなすメモリ（GB）。
+                既に使用中の分は利用可能メモリから差し引かれているため含めない
+        """
+        projected_gb = self.estimate_job_memory_gb(video_config) * self.admission_safety_factor
+        available_gb = self.monitor_memory_usage()["available_gb"] - reserved_gb
+        if available_gb < projected_gb:
+            logger.warning(f"予測メモリ不足: 必要 {projected_gb:.2f}GB / 利用可能 {available_gb:.2f}GB")
+            return False
+        return True
+
+    def pending_job_memory_gb(self, running_configs: List[Dict[str, Any]]) -> float:
+        """
+        実行中ジョブの予測メモリのうち、まだ確保されていない分（GB）
+
+        ワーカー（子プロセス）が実際に使用中のメモリは利用可能メモリに反映済みのため、
+        予測の合計から子プロセスツリーの実測RSSを差し引いた残りだけを予約とみなす。
+
+        Args:
+            running_configs: 実行中ジョブの設定リスト
+
+        Returns:
+            float: 未確保の予測メモリ（GB）
+        """
+        if not running_configs:
+            return 0.0
+        projected_gb = sum(self.estimate_job_memory_gb(config) for config in running_configs)
+        materialized_gb = self.monitor_process_memory(include_uss=False)["children_rss_gb"]
+        return max(0.0, projected_gb * self.admission_safety_factor - materialized_gb)
+
     def check_memory_pressure(self) -> bool:
         """メモリ圧迫状況をチェック"""
         memory_info = self.monitor_memory_usage()
@@ -110,20 +302,23 @@ class PerformanceOptimizer:
         def decorator(func):
             def wrapper(*args, **kwargs):
                 start_time = time.time()
-                start_memory = self.monitor_memory_usage()
+                start_memory = self.monitor_process_memory(include_uss=False)
+                sampler = ProcessMemorySampler(self.process, self.sampling_interval).start()
 
                 try:
                     result = func(*args, **kwargs)
 
                     end_time = time.time()
-                    end_memory = self.monitor_memory_usage()
+                    peak = sampler.stop()
+                    end_memory = self.monitor_process_memory(include_uss=False)
 
                     execution_time = end_time - start_time
-                    memory_delta = end_memory["used_gb"] - start_memory["used_gb"]
+                    memory_delta = end_memory["total_rss_gb"] - start_memory["total_rss_gb"]
 
                     self.performance_stats[operation_name] = {
                         "execution_time": execution_time,
                         "memory_delta_gb": memory_delta,
+                        "peak_rss_mb": peak["total_mb"],
                         "timestamp": time.time()
                     }
 
@@ -131,12 +326,83 @@ class PerformanceOptimizer:
                     return result
 
                 except Exception as e:
+                    sampler.stop()
                     logger.error(f"{operation_name} 失敗: {e}")
                     raise
 
             return wrapper
         return decorator
 
+    @contextmanager
+    def measure_stage(self, stage_name: str):
+        """
+        パイプラインステージ計測コンテキスト
+
+        wall時間・CPU時間（ffmpeg子プロセス含む）・ピークRSS・RSS増減を記録する。
+        RSSはサンプリングスレッドでプロセスツリー単位に追跡する（smapsを読むUSS取得は行わない）。
+        yieldされた辞書に "frames" を設定するとエンコードfpsも算出する。
+        """
+        stage: Dict[str, Any] = {}
+        start_wall = time.perf_counter()
+        start_cpu = self._process_tree_cpu_time()
+        sampler = ProcessMemorySampler(self.process, self.sampling_interval).start()
+        failed = False
+
+        try:
+            yield stage
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall_time = time.perf_counter() - start_wall
+            peak_rss = sampler.stop()
+            cpu_time = self._process_tree_cpu_time() - start_cpu
+
+            stage.update({
+                "wall_time": wall_time,
+                "cpu_time": cpu_time,
+                "peak_rss_mb": peak_rss["self_mb"],
+                "children_peak_rss_mb": peak_rss["children_mb"],
+                "peak_total_rss_mb": peak_rss["total_mb"],
+                "execution_time": wall_time,
+                "memory_delta_gb": (peak_rss["end_total_mb"] - peak_rss["start_total_mb"]) / 1024,
+                "timestamp": time.time(),
+                "failed": failed
+            })
+            frames = stage.get("frames")
+            if frames:
+                stage["frames_per_second"] = frames / wall_time if wall_time > 0 else 0.0
+
+            self.performance_stats[stage_name] = stage
+            logger.debug(f"{stage_name}: wall {wall_time:.2f}秒, CPU {cpu_time:.2f}秒, "
+                         f"ピークRSS {peak_rss['self_mb']:.0f}MB (子 {peak_rss['children_mb']:.0f}MB)")
+
+    def reset_performance_stats(self):
+        """計測結果をリセット（レンダリング単位）"""
+        self.performance_stats.clear()
+
+    def _child_processes(self) -> list:
+        """生存中の子プロセス（ffmpegリーダー/ライター）を取得"""
+        try:
+            return self.process.children(recursive=True)
+        except psutil.Error:
+            return []
+
+    def _process_tree_cpu_time(self) -> float:
+        """自プロセス + 子プロセスのCPU時間（秒）"""
+        times = self.process.cpu_times()
+        # 回収済み子プロセス分（children_*）+ 生存中の子プロセス分
+        total = times.user + times.system
+        total += getattr(times, "children_user", 0.0) + getattr(times, "children_system", 0.0)
+
+        for child in self._child_processes():
+            try:
+                child_times = child.cpu_times()
+                total += child_times.user + child_times.system
+            except psutil.Error:
+                continue
+        return total
+
     def get_performance_report(self) -> Dict[str, Any]:
         """パフォーマンスレポート生成"""
         total_time = sum(stats["execution_time"] for stats in self.performance_stats.values())
@@ -147,7 +413,8 @@ class PerformanceOptimizer:
             "total_memory_usage_gb": total_memory,
             "operation_count": len(self.performance_stats),
             "operations": self.performance_stats,
-            "current_memory": self.monitor_memory_usage()
+            "current_memory": self.monitor_memory_usage(),
+            "process_memory": self.monitor_process_memory(include_uss=False)
         }
 
     def optimize_audio_processing(self, audio_files: list) -> Dict[str, Any]:
@@ -179,14 +446,14 @@ class PerformanceOptimizer:
 
     def pre_process_validation(self, video_config: Dict[str, Any]) -> bool:
         """処理前のバリデーション"""
-        # メモリチェック
-        memory_info = self.monitor_memory_usage()
-        if memory_info["available_gb"] < 1.0:
-            logger.error(f"利用可能メモリ不足: {memory_info['available_gb']:.2f}GB")
+        # メモリチェック（ジョブの予測メモリ使用量で判定）
+        if not self.can_admit_job(video_config):
+            logger.error("利用可能メモリ不足: ジョブの予測メモリ使用量を確保できません")
             return False
 
         # 音声ファイル存在チェック
-        audio_files = video_config.get("audio_files", [])
+        audio_files = video_config.get("audio_files") or [video_config.get("audio_file")]
+        audio_files = [f for f in audio_files if f]
         missing_files = [f for f in audio_files if not os.path.exists(f)]
         if missing_files:
             logger.error(f"音声ファイルが見つかりません: {missing_files}")
@@ -208,4 +475,169 @@ class PerformanceOptimizer:
 
         if self.performance_stats:
             report = self.get_performance_report()
-            logger.info(f"パフォーマンス最適化完了 - 総実行時間: {report['total_execution_time']:.2f}秒")
\ No newline at end of file
+            logger.info(f"パフォーマンス最適化完了 - 総実行時間: {report['total_execution_time']:.2f}秒")
+
+
+class BackpressureController:
+    """
+    バッチレンダリング用のメモリ圧迫バックプレッシャー制御
+
+    ホストのメモリ使用率に応じて状態を切り替える:
+        - normal:   全ワーカーで通常処理
+        - elevated: ワーカー数を半減し、新規ジョブを低メモリのストリーミング経路へ
+        - critical: 新規ジョブの受け入れを停止（実行中ジョブの完了を待つ）
+    閾値を下回っても recovery_margin 分下がるまでは復帰しない（ヒステリシス）。
+    """
+
+    STATE_NORMAL = "normal"
+    STATE_ELEVATED = "elevated"
+    STATE_CRITICAL = "critical"
+
+    def __init__(
+        self,
+        optimizer: PerformanceOptimizer,
+        max_workers: int = 1,
+        critical_threshold: float = 0.9,
+        recovery_margin: float = 0.05,
+        poll_interval: float = 0.5,
+        max_pause_seconds: float = 60.0
+    ):
+        self.optimizer = optimizer
+        self.max_workers = max(1, max_workers)
+        self.elevated_threshold = optimizer.memory_threshold
+        self.critical_threshold = critical_threshold
+        self.recovery_margin = recovery_margin
+        self.poll_interval = poll_interval
+        self.max_pause_seconds = max_pause_seconds
+        self.state = self.STATE_NORMAL
+        self.events: List[Dict[str, Any]] = []
+        self._paused_since: Optional[float] = None
+
+    @property
+    def allowed_workers(self) -> int:
+        """現在の状態で許可される同時実行ジョブ数"""
+        if self.state == self.STATE_NORMAL:
+            return self.max_workers
+        return max(1, self.max_workers // 2)
+
+    @property
+    def admission_paused(self) -> bool:
+        """新規ジョブ受け入れ停止中か"""
+        return self.state == self.STATE_CRITICAL
+
+    @property
+    def render_mode(self) -> str:
+        """新規ジョブに適用するレンダリング経路"""
+        return "default" if self.state == self.STATE_NORMAL else "streaming"
+
+    def evaluate(self) -> str:
+        """メモリ使用率を評価して状態を更新"""
+        usage = self.optimizer.monitor_memory_usage()["percent"] / 100
+
+        if usage >= self.critical_threshold:
+            new_state = self.STATE_CRITICAL
+        elif usage >= self.elevated_threshold:
+            new_state = self.STATE_ELEVATED
+        else:
+            new_state = self.STATE_NORMAL
+
+        # 復帰方向はヒステリシスを適用
+        if self._severity(new_state) < self._severity(self.state):
+            threshold = self.critical_threshold if self.state == self.STATE_CRITICAL else self.elevated_threshold
+            if usage > threshold - self.recovery_margin:
+                new_state = self.state
+
+        if new_state != self.state:
+            previous = self.state
+            self.state = new_state
+            if new_state == self.STATE_CRITICAL:
+                gc.collect()
+            self._emit("state_change", previous=previous, memory_percent=round(usage * 100, 1))
+
+        return self.state
+
+    def admit(self, video_config: Dict[str, Any], running_configs: List[Dict[str, Any]]) -> bool:
+        """
+        ジョブ受け入れ判定
+
+        Args:
+            video_config: 受け入れ候補のジョブ設定
+            running_configs: 実行中ジョブの設定リスト
+
+        Returns:
+            bool: 受け入れ可能か
+        """
+        self.evaluate()
+
+        running_jobs = len(running_configs)
+        if running_jobs >= self.allowed_workers:
+            return False
+
+        reserved_gb = self.optimizer.pending_job_memory_gb(running_configs)
+        if not self.admission_paused and self.optimizer.can_admit_job(video_config, reserved_gb):
+            self._paused_since = None
+            return True
+
+        if running_jobs > 0:
+            # 実行中ジョブの完了でメモリが解放されるのを待つ
+            if self._paused_since is None:
+                self._paused_since = time.time()
+                self._emit("admission_paused", running_jobs=running_jobs)
+            return False
+
+        # 実行中ジョブが無い場合は待っても解放されないため、一定時間後に強制受け入れ
+        if self._paused_since is None:
+            self._paused_since = time.time()
+            self._emit("admission_paused", running_jobs=running_jobs)
+        if time.time() - self._paused_since >= self.max_pause_seconds:
+            self._paused_since = None
+            self._emit("forced_admission", running_jobs=running_jobs)
+            return True
+
+        time.sleep(self.poll_interval)
+        return False
+
+    def apply_render_mode(self, video_config: Dict[str, Any], streaming_equivalent: bool = True) -> Dict[str, Any]:
+        """
+        現在の状態に応じたレンダリング経路をジョブ設定に反映
+
+        settings.render_mode を明示したジョブ、およびストリーミング経路では出力が変わるジョブ
+        （テキスト字幕・タイトル字幕を描画するジョブ）は経路を切り替えない。
+
+        Args:
+            video_config: ジョブ設定
+            streaming_equivalent: ストリーミング経路でも通常経路と同じ出力になるか
+        """
+        if self.render_mode == "default":
+            return video_config
+
+        output_path = video_config.get("output_path")
+        if video_config.get("settings", {}).get("render_mode"):
+            self._emit("render_mode_kept", output_path=output_path, reason="explicit")
+            return video_config
+        if not streaming_equivalent:
+            logger.warning(f"ストリーミング経路では字幕の描画が変わるため経路を切り替えません: {output_path}")
+            self._emit("render_mode_kept", output_path=output_path, reason="output_differs")
+            return video_config
+
+        job_config = dict(video_config)
+        job_config["settings"] = {**video_config.get("settings", {}), "render_mode": self.render_mode}
+        self._emit("render_mode_switch", output_path=output_path)
+        return job_config
+
+    def _severity(self, state: str) -> int:
+        return [self.STATE_NORMAL, self.STATE_ELEVATED, self.STATE_CRITICAL].index(state)
+
+    def _emit(self, event_type: str, **fields):
+        """構造化イベントを記録・ログ出力"""
+        event = {
+            "event": event_type,
+            "state": self.state,
+            "allowed_workers": self.allowed_workers,
+            "admission_paused": self.admission_paused,
+            "render_mode": self.render_mode,
+            "timestamp": time.time(),
+            **fields
+        }
+        self.events.append(event)
+        logger.info(f"backpressure {json.dumps(event, ensure_ascii=False)}")
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+共有ファイルシステム上のキューディレクトリによる複数ノードのレンダリングファーム
+
+メッセージブローカーを使わず、NFS等の共有ディレクトリに置いたジョブファイルを
+複数ホストのノードが取得して処理する。実行中のジョブにはリースファイル（ノード・期限）を置き、
+ノードはハートビートで期限を延長する。ハートビートはリースごとの自分専用のファイルへ書き、
+リースファイル自体は作成後に変更しないため、回収済みのリースを元の所有ノードが上書きすることはない。
+ノードが異常終了して期限が切れたリースは他のノードが回収して再実行する。RenderJobQueue と同じ操作を持つため、
+VideoComposer.consume_job_queue でそのまま処理できる。
+
+ファイルの作成はすべて一時ファイルを書いてから link / rename で公開する
+（link による排他作成はNFSでもアトミック）。期限の判定は各ホストの時計で行うため、
+ノード間の時刻はNTP等で同期しておくこと。
+
+キューディレクトリの構成:
+    jobs/<ジョブID>.json     ... 登録されたジョブ（登録後は変更しない）
+    leases/<ジョブID>.json   ... 実行中ジョブのリース（作成後は変更しない）
+    leases/<ジョブID>.<トークン>.hb ... リース所有ノードのハートビート（延長後の期限）
+    state/<ジョブID>.json    ... 試行回数・直近のエラー（リースを持つノードだけが更新）
+    done/<ジョブID>.json     ... 完了記録（出力パス・所要時間等）
+    failed/<ジョブID>.json   ... 失敗記録（試行回数の上限到達）
+    tmp/                     ... 公開前の一時ファイル
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    from .job_queue import (
+        DEFAULT_BATCH, DEFAULT_MAX_ATTEMPTS,
+        STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, STATE_FAILED, pid_alive
+    )
+    from .atomic_output import discard_partial, partial_writer, stale_partials
+    from .output_fanout import parse_outputs
+except ImportError:
+    from job_queue import (
+        DEFAULT_BATCH, DEFAULT_MAX_ATTEMPTS,
+        STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, STATE_FAILED, pid_alive
+    )
+    from atomic_output import discard_partial, partial_writer, stale_partials
+    from output_fanout import parse_outputs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 60.0
+
+_DIRS = ("jobs", "leases", "state", "done", "failed", "tmp")
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    """JSONファイルを読む（存在しなければNone）"""
+    try:
+        with open(path, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+class FarmQueue:
+    """共有ディレクトリ上のジョブキュー（ノードごとに1インスタンス）"""
+
+    def __init__(
+        self,
+        root: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        heartbeat_seconds: Optional[float] = None,
+        node: Optional[str] = None
+    ):
+        """
+        Args:
+            root: キューディレクトリ（全ノードから同じパスで見える共有ストレージ）
+            lease_seconds: リースの有効期間（この間ハートビートがなければ他ノードが回収）
+            heartbeat_seconds: リース延長の間隔（既定は有効期間の1/4）
+            node: ノード名（既定は <ホスト名>-<pid>）
+        """
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds or lease_seconds / 4
+        self.poll_interval = self.heartbeat_seconds
+        self.host = socket.gethostname()
+        self.node = node or f"{self.host}-{os.getpid()}"
+        for name in _DIRS:
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def close(self) -> None:
+        """ハートビートを止め、保持中のリースを解放（ジョブは待機中に戻り、他ノードがすぐ取得できる）"""
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        for job_id in list(self._leases):
+            self._drop_lease(job_id)
+
+    def __enter__(self) -> "FarmQueue":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _path(self, kind: str, job_id: str) -> str:
+        return os.path.join(self.root, kind, f"{job_id}.json")
+
+    def _tmp_path(self, name: str) -> str:
+        return os.path.join(self.root, "tmp", f"{name}.{self.node}.{uuid.uuid4().hex[:8]}.tmp")
+
+    def _write_tmp(self, name: str, data: Dict[str, Any]) -> str:
+        tmp = self._tmp_path(name)
+        with open(tmp, "w", encoding="utf-8") as tmp_file:
+            json.dump(data, tmp_file, ensure_ascii=False, default=str)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        return tmp
+
+    def _write_json(self, path: str, data: Dict[str, Any]) -> None:
+        """一時ファイルから置き換えて書く（読み手は書きかけのファイルを見ない）"""
+        os.replace(self._write_tmp(os.path.basename(path), data), path)
+
+    def _create_json(self, path: str, data: Dict[str, Any]) -> bool:
+        """存在しない場合だけ作成（link による排他作成）"""
+        tmp = self._write_tmp(os.path.basename(path), data)
+        try:
+            os.link(tmp, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def enqueue(
+        self,
+        configs: Sequence[Dict[str, Any]],
+        batch: str = DEFAULT_BATCH,
+        kind: str = "single",
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> List[str]:
+        """
+        ジョブを登録（同じバッチ・同じ出力パスのジョブが登録済みなら追加しない）
+
+        設定内のパス（音声・字幕・背景・出力）は全ノードから同じパスで見えること。
+
+        Args:
+            configs: compose_single_video / compose_theme_video の設定
+            batch: バッチ名
+            kind: "single" または "theme"
+            max_attempts: 失敗時の最大試行回数
+
+        Returns:
+            List[str]: 各設定に対応するジョブID
+        """
+        if kind not in ("single", "theme"):
+            raise ValueError(f"未対応のジョブ種別: {kind}")
+        job_ids = []
+        now = time.time()
+        for index, config in enumerate(configs):
+            job_id = hashlib.sha1(f"{batch}\0{config['output_path']}".encode("utf-8")).hexdigest()[:16]
+            self._create_json(self._path("jobs", job_id), {
+                "id": job_id,
+                "batch": batch,
+                "kind": kind,
+                "output_path": config["output_path"],
+                "config": config,
+                "max_attempts": max_attempts,
+                "created_at": now,
+                "sequence": index
+            })
+            job_ids.append(job_id)
+        return job_ids
+
+    def _all_jobs(self, batch: Optional[str] = None) -> List[Dict[str, Any]]:
+        """登録済みジョブ（登録順、ジョブファイルは不変なのでキャッシュする）"""
+        for name in os.listdir(os.path.join(self.root, "jobs")):
+            job_id, ext = os.path.splitext(name)
+            if ext == ".json" and job_id not in self._jobs:
+                job = _read_json(self._path("jobs", job_id))
+                if job is not None:
+                    self._jobs[job_id] = job
+        jobs = sorted(self._jobs.values(), key=lambda job: (job["created_at"], job["sequence"], job["id"]))
+        return [job for job in jobs if batch is None or job["batch"] == batch]
+
+    def _finished(self, job_id: str) -> bool:
+        return os.path.exists(self._path("done", job_id)) or os.path.exists(self._path("failed", job_id))
+
+    def _pending_jobs(self, batch: Optional[str]) -> Iterator[Dict[str, Any]]:
+        for job in self._all_jobs(batch):
+            if not self._finished(job["id"]):
+                yield job
+
+    def claim(self, batch: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        待機中のジョブ（リースなし・期限切れ）を1件取得して実行中にする
+
+        Args:
+            batch: 対象バッチ（Noneなら全バッチ）
+
+        Returns:
+            Optional[Dict[str, Any]]: ジョブ（取得できるジョブがなければNone）
+        """
+        for job in self._pending_jobs(batch):
+            job_id = job["id"]
+            lease = self._acquire(job_id)
+            if lease is None:
+                continue
+            if self._finished(job_id):
+                # 一覧の取得後に他ノードが完了させた
+                self._drop_lease(job_id)
+                continue
+
+            state = _read_json(self._path("state", job_id)) or {"attempts": 0}
+            error = state.get("error")
+            if lease.get("reclaimed_from"):
+                error = f"ノード異常終了（{lease['reclaimed_from']}、リース期限切れ）"
+            attempts = state.get("attempts", 0) + 1
+            if attempts > job["max_attempts"]:
+                self._write_record("failed", job, state.get("attempts", 0), error=error)
+                self._drop_lease(job_id)
+                continue
+            self._write_json(self._path("state", job_id), {"attempts": attempts, "error": error})
+
+            # 異常終了したノードの途中ファイルを削除（リースを失っただけのノードが書き込み中のものは残す）
+            video_settings = job["config"].get("settings", {}).get("video", {})
+            paths = [job["output_path"]] + [output["output_path"]
+                                            for output in parse_outputs(video_settings.get("outputs"), video_settings)]
+            for path in paths:
+                for partial in stale_partials(path):
+                    if self._abandoned_partial(path, partial):
+                        discard_partial(partial)
+
+            self._start_heartbeat()
+            return {
+                **job,
+                "state": STATE_RUNNING,
+                "attempts": attempts,
+                "worker_host": self.host,
+                "started_at": lease["acquired"]
+            }
+        return None
+
+    def _abandoned_partial(self, path: str, partial: str) -> bool:
+        """
+        途中ファイルが書き込み中でないか
+
+        同じホストのプロセスなら終了していること、他のホスト（生死を確認できない）なら
+        リースの有効期間より長く更新されていないことで判定する。
+        """
+        writer = partial_writer(path, partial)
+        if writer is not None and writer[0] == self.host:
+            return not pid_alive(writer[1])
+        try:
+            return time.time() - os.path.getmtime(partial) > self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def _heartbeat_path(self, job_id: str, token: str) -> str:
+        return os.path.join(self.root, "leases", f"{job_id}.{token}.hb")
+
+    def _lease_expires(self, lease: Dict[str, Any]) -> float:
+        """リースの期限（ハートビートで延長されていればその期限）"""
+        heartbeat = _read_json(self._heartbeat_path(lease.get("job_id", ""), lease.get("token", ""))) or {}
+        return max(lease.get("expires", 0), heartbeat.get("expires", 0))
+
+    def _remove_heartbeat(self, job_id: str, token: str) -> None:
+        try:
+            os.remove(self._heartbeat_path(job_id, token))
+        except FileNotFoundError:
+            pass
+
+    def _acquire(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """リースを取得（有効なリースがあればNone、期限切れなら回収して取得）"""
+        path = self._path("leases", job_id)
+        reclaimed_from = None
+        current = _read_json(path)
+        if current is not None:
+            if self._lease_expires(current) > time.time():
+                return None
+            if not self._break_lease(job_id, current):
+                return None
+            reclaimed_from = current.get("node")
+
+        now = time.time()
+        lease = {
+            "job_id": job_id,
+            "node": self.node,
+            "host": self.host,
+            "pid": os.getpid(),
+            "token": uuid.uuid4().hex,
+            "acquired": now,
+            "expires": now + self.lease_seconds,
+            "reclaimed_from": reclaimed_from
+        }
+        if not self._create_json(path, lease):
+            return None
+        with self._lock:
+            self._leases[job_id] = lease
+        if reclaimed_from:
+            logger.warning(f"期限切れのリースを回収: {job_id} ({reclaimed_from} → {self.node})")
+        return lease
+
+    def _break_lease(self, job_id: str, observed: Dict[str, Any]) -> bool:
+        """
+        期限切れのリースを取り除く
+
+        rename は1ノードだけが成功する。取り除いた後に別のリースだった、または
+        期限が延長されていた（判定後にハートビートが届いた）場合は元に戻す。
+
+        Returns:
+            bool: 取り除いたか
+        """
+        path = self._path("leases", job_id)
+        moved = self._tmp_path(f"{job_id}.stale")
+        try:
+            os.rename(path, moved)
+        except FileNotFoundError:
+            return False
+        try:
+            lease = _read_json(moved) or {}
+            if lease.get("token") != observed.get("token") or self._lease_expires(lease) > time.time():
+                try:
+                    os.link(moved, path)
+                except FileExistsError:
+                    pass
+                return False
+            self._remove_heartbeat(job_id, lease.get("token", ""))
+            return True
+        finally:
+            os.remove(moved)
+
+    def _owns(self, job_id: str) -> bool:
+        """リースファイルが自分のものか（他ノードに回収されていないか）"""
+        lease = self._leases.get(job_id)
+        current = _read_json(self._path("leases", job_id))
+        return lease is not None and current is not None and current.get("token") == lease["token"]
+
+    def _drop_lease(self, job_id: str) -> None:
+        """保持中のリースを解放（他ノードに回収されていたら何もしない）"""
+        with self._lock:
+            lease = self._leases.pop(job_id, None)
+        if lease is None:
+            return
+        self._remove_heartbeat(job_id, lease["token"])
+        path = self._path("leases", job_id)
+        moved = self._tmp_path(f"{job_id}.release")
+        try:
+            os.rename(path, moved)
+        except FileNotFoundError:
+            return
+        try:
+            if (_read_json(moved) or {}).get("token") != lease["token"]:
+                try:
+                    os.link(moved, path)
+                except FileExistsError:
+                    pass
+        finally:
+            os.remove(moved)
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat_thread is None:
+            self._stop.clear()
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="farm-heartbeat", daemon=True)
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except OSError as e:
+                # 共有ストレージの一時的な障害（次の周期で再試行、期限内に戻れば継続）
+                logger.warning(f"ハートビート失敗: {str(e)}")
+
+    def heartbeat(self) -> None:
+        """
+        保持中のリースの期限を延長
+
+        延長後の期限はリースのトークンごとのハートビートファイルへ書く（リースファイルは書き換えない）。
+        書いた後に所有を確認し、回収されていればリースを手放す。
+        """
+        with self._lock:
+            held = dict(self._leases)
+        for job_id, lease in held.items():
+            if self._owns(job_id):
+                now = time.time()
+                if now >= lease["expires"]:
+                    logger.warning(f"リースの延長が期限に間に合いませんでした: {job_id}")
+                expires = now + self.lease_seconds
+                self._write_json(self._heartbeat_path(job_id, lease["token"]), {"expires": expires, "heartbeat": now})
+                if self._owns(job_id):
+                    with self._lock:
+                        if self._leases.get(job_id) is lease:
+                            lease["expires"] = expires
+                    continue
+            logger.warning(f"リースを失いました（他ノードが回収）: {job_id}")
+            self._remove_heartbeat(job_id, lease["token"])
+            with self._lock:
+                if self._leases.get(job_id) is lease:
+                    del self._leases[job_id]
+
+    def _write_record(self, kind: str, job: Dict[str, Any], attempts: int, **fields: Any) -> None:
+        """完了・失敗記録を書く"""
+        lease = self._leases.get(job["id"], {})
+        finished_at = time.time()
+        started_at = lease.get("acquired")
+        self._write_json(self._path(kind, job["id"]), {
+            "id": job["id"],
+            "node": self.node,
+            "host": self.host,
+            "attempts": attempts,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "duration": finished_at - started_at if started_at else None,
+            **fields
+        })
+
+    def _load_job(self, job_id: str) -> Dict[str, Any]:
+        if job_id not in self._jobs:
+            self._jobs[job_id] = _read_json(self._path("jobs", job_id))
+        return self._jobs[job_id]
+
+    def complete(
+        self,
+        job_id: str,
+        output_paths: List[str],
+        captures: Optional[List[str]] = None,
+        report: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """ジョブを成功として記録（リースを失っていたら記録しない、出力は確定済みで内容は同じ）"""
+        if not self._owns(job_id):
+            logger.warning(f"リースを失ったため完了を記録しません（他ノードが再実行中）: {job_id}")
+            self._drop_lease(job_id)
+            return
+        state = _read_json(self._path("state", job_id)) or {}
+        self._write_record("done", self._load_job(job_id), state.get("attempts", 1),
+                           output_paths=output_paths, captures=captures or [], report=report or {})
+        self._drop_lease(job_id)
+
+    def fail(self, job_id: str, error: str, report: Optional[Dict[str, Any]] = None) -> str:
+        """
+        ジョブの失敗を記録（試行回数が上限未満なら再試行のため待機中へ戻す）
+
+        Returns:
+            str: 記録後の状態
+        """
+        if not self._owns(job_id):
+            logger.warning(f"リースを失ったため失敗を記録しません（他ノードが再実行中）: {job_id}")
+            self._drop_lease(job_id)
+            return STATE_RUNNING
+        job = self._load_job(job_id)
+        attempts = (_read_json(self._path("state", job_id)) or {}).get("attempts", 1)
+        if attempts < job["max_attempts"]:
+            self._write_json(self._path("state", job_id), {"attempts": attempts, "error": error})
+            self._drop_lease(job_id)
+            return STATE_QUEUED
+        self._write_record("failed", job, attempts, error=error, report=report or {})
+        self._drop_lease(job_id)
+        return STATE_FAILED
+
+    def release(self, job_id: str) -> None:
+        """取得したが実行しなかったジョブを試行回数を消費せず待機中へ戻す"""
+        if self._owns(job_id):
+            state = _read_json(self._path("state", job_id)) or {"attempts": 1}
+            self._write_json(self._path("state", job_id), {**state, "attempts": max(0, state["attempts"] - 1)})
+        self._drop_lease(job_id)
+
+    def recover_stale(self) -> int:
+        """
+        期限切れのリースを数える
+
+        期限切れのリースは claim が取り除いて取得する（回収元のノードを試行回数・エラーに記録するため）。
+        期限切れのジョブは待機中として数えられ、次の取得で再実行される。
+
+        Returns:
+            int: 期限切れのリース数
+        """
+        expired = 0
+        now = time.time()
+        for name in os.listdir(os.path.join(self.root, "leases")):
+            job_id, ext = os.path.splitext(name)
+            lease = _read_json(self._path("leases", job_id)) if ext == ".json" else None
+            if lease is not None and self._lease_expires(lease) <= now:
+                expired += 1
+        if expired:
+            logger.warning(f"期限切れのリース: {expired}件（次の取得で回収）")
+        return expired
+
+    def retry_failed(self, batch: Optional[str] = None) -> int:
+        """
+        失敗したジョブを試行回数をリセットして待機中へ戻す
+
+        Returns:
+            int: 再投入したジョブ数
+        """
+        retried = 0
+        for job in self._all_jobs(batch):
+            path = self._path("failed", job["id"])
+            if os.path.exists(path):
+                self._write_json(self._path("state", job["id"]), {"attempts": 0, "error": None})
+                os.remove(path)
+                retried += 1
+        return retried
+
+    def jobs(self, batch: Optional[str] = None) -> List[Dict[str, Any]]:
+        """ジョブ一覧（登録順、RenderJobQueue.jobs と同じ項目）"""
+        now = time.time()
+        rows = []
+        for job in self._all_jobs(batch):
+            job_id = job["id"]
+            done = _read_json(self._path("done", job_id))
+            failed = _read_json(self._path("failed", job_id)) if done is None else None
+            lease = _read_json(self._path("leases", job_id)) if done is None and failed is None else None
+            state = _read_json(self._path("state", job_id)) or {}
+            if done is not None:
+                status = STATE_SUCCEEDED
+            elif failed is not None:
+                status = STATE_FAILED
+            elif lease is not None and self._lease_expires(lease) > now:
+                status = STATE_RUNNING
+            else:
+                status = STATE_QUEUED
+            record = done or failed or {}
+            rows.append({
+                **job,
+                "state": status,
+                "attempts": record.get("attempts", state.get("attempts", 0)),
+                "worker_host": record.get("host") or (lease or {}).get("host"),
+                "worker_node": record.get("node") or (lease or {}).get("node"),
+                "started_at": record.get("started_at") or (lease or {}).get("acquired"),
+                "finished_at": record.get("finished_at"),
+                "duration": record.get("duration"),
+                "output_paths": record.get("output_paths"),
+                "captures": record.get("captures"),
+                "report": record.get("report"),
+                "error": record.get("error", state.get("error")) if done is None else None
+            })
+        return rows
+
+    def summary(self, batch: Optional[str] = None) -> Dict[str, int]:
+        """状態ごとのジョブ数"""
+        counts = {state: 0 for state in (STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, STATE_FAILED)}
+        for job in self.jobs(batch):
+            counts[job["state"]] += 1
+        counts["total"] = sum(counts.values())
+        return counts
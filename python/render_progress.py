@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+レンダリング進捗の通知と協調的な中止
+
+書き出し済みフレーム数を一定間隔でまとめてイベント送信先（multiprocessing の
+Manager キュー等、put できるもの）へ送る。全経路（通常・ストリーミング・YUV・チャンク並列の
+各チャンクプロセス）のフレームライターがフレームの書き出しごとに advance を呼び、
+MoviePy の write_videofile 経路では MoviePyProgressLogger が同じ通知を行う。
+中止が要求されていれば送信のタイミング（および音声ミックス・チャンク結合等のステージの間）で
+RenderCancelled を送出し、書き出し中の途中ファイルは atomic_outputs により削除される。
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, Optional
+
+from proglog import ProgressBarLogger
+
+logger = logging.getLogger(__name__)
+
+# 進捗イベントの最短送信間隔（秒）
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+
+class RenderCancelled(Exception):
+    """レンダリングの中止要求"""
+
+
+class RenderProgress:
+    """書き出し済みフレーム数を送信し、中止要求を確認する（pickleしてチャンクプロセスへ渡せる）"""
+
+    def __init__(self, sink: Any, job_id: str, cancelled: Optional[Dict[str, Any]] = None,
+                 interval: float = DEFAULT_PROGRESS_INTERVAL):
+        """
+        Args:
+            sink: イベント送信先（put(dict) を持つもの）
+            job_id: ジョブID（イベントに含める）
+            cancelled: 中止要求されたジョブIDを含む辞書（Manager の dict 等）
+            interval: 送信間隔（秒）
+        """
+        self.sink = sink
+        self.job_id = job_id
+        self.cancelled = cancelled
+        self.interval = interval
+        self._pending = 0
+        self._last_sent = time.monotonic()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # チャンクプロセスでは未送信分を持ち越さない
+        return {**self.__dict__, "_pending": 0}
+
+    def _send(self, event: str, **fields: Any) -> None:
+        self.sink.put({"id": self.job_id, "event": event, "pid": os.getpid(), "time": time.time(), **fields})
+
+    def check_cancelled(self) -> None:
+        if self.cancelled is not None and self.job_id in self.cancelled:
+            raise RenderCancelled(f"レンダリングを中止しました: {self.job_id}")
+
+    def start(self, total_frames: int) -> None:
+        """書き出し開始（総フレーム数を通知）"""
+        self.check_cancelled()
+        self._last_sent = time.monotonic()
+        self._send("start", total_frames=total_frames)
+
+    def advance(self, frames: int = 1) -> None:
+        """フレームの書き出しを記録（送信間隔ごとにまとめて通知）"""
+        self._pending += frames
+        now = time.monotonic()
+        if now - self._last_sent >= self.interval:
+            self.flush()
+            self.check_cancelled()
+
+    def flush(self) -> None:
+        """未送信のフレーム数を通知"""
+        if self._pending:
+            self._send("frames", frames=self._pending)
+            self._pending = 0
+        self._last_sent = time.monotonic()
+
+
+class MoviePyProgressLogger(ProgressBarLogger):
+    """write_videofile の進捗バーを RenderProgress へ中継する（音声・映像の書き出し中も中止要求を確認）"""
+
+    def __init__(self, progress: RenderProgress):
+        super().__init__()
+        self.progress = progress
+        self._frames = 0
+
+    def bars_callback(self, bar: str, attr: str, value: Any, old_value: Any = None) -> None:
+        if attr != "index":
+            return
+        if bar == "t":
+            # 映像フレームのバー（インデックス = 書き出し済みフレーム数）
+            if value > self._frames:
+                self.progress.advance(value - self._frames)
+                self._frames = value
+        else:
+            # 音声チャンクのバー
+            self.progress.check_cancelled()
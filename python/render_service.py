@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+ローカルHTTP / Unixソケットのレンダリングサービス（asyncio）
+
+常駐プロセスがジョブを受け付け、上限付きのプロセスプールで合成する。プールのワーカーは
+ジョブ間で再利用されるため、ジョブごとのPython起動・モジュール読み込みのコストがなく、
+字幕画像キャッシュ等もワーカー内で共有される。進捗（書き出し済みフレーム数・推定残り時間）は
+Server-Sent Events または改行区切りJSON（chunked）で配信し、実行中のジョブも中止できる。
+
+API:
+    POST   /jobs                {"kind": "single" | "theme", "config": {...}} → 202 ジョブ
+    GET    /jobs                ジョブ一覧
+    GET    /jobs/<id>           ジョブの状態
+    GET    /jobs/<id>/events    進捗イベント（text/event-stream、?format=ndjson で改行区切りJSON）
+    DELETE /jobs/<id>           中止（待機中は即時、実行中はフレーム書き出し中に停止）
+    GET    /health              稼働状況
+
+起動:
+    python python/render_service.py --port 8765 --workers 2
+    python python/render_service.py --socket /tmp/nanj-render.sock --workers 2
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# パッケージ経由（python.render_service）とスクリプト直接実行の両方に対応
+try:
+    from .video_composer import VideoComposer
+    from .render_progress import RenderProgress
+except ImportError:
+    from video_composer import VideoComposer
+    from render_progress import RenderProgress
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+
+# リクエスト本文の上限（ジョブ設定のJSON）
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# 保持する完了済みジョブ数（超えたら古いものから破棄）
+MAX_FINISHED_JOBS = 1000
+# SSE接続を維持するためのコメント送信間隔（秒）
+KEEPALIVE_SECONDS = 15.0
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_SUCCEEDED = "succeeded"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+FINISHED_STATES = (STATE_SUCCEEDED, STATE_FAILED, STATE_CANCELLED)
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+            500: "Internal Server Error"}
+
+# ワーカープロセスごとに1つの VideoComposer を使い回す（キャッシュをジョブ間で共有）
+_worker_composer: Optional[VideoComposer] = None
+
+
+def _run_service_job(
+    job_id: str,
+    kind: str,
+    config: Dict[str, Any],
+    events: Any,
+    cancelled: Any
+) -> Dict[str, Any]:
+    """ワーカープロセスで1ジョブを合成（pickle可能なモジュール関数）"""
+    global _worker_composer
+    if _worker_composer is None:
+        _worker_composer = VideoComposer()
+    composer = _worker_composer
+    composer.progress = RenderProgress(events, job_id, cancelled)
+    events.put({"id": job_id, "event": "running", "pid": os.getpid(), "time": time.time()})
+
+    compose = composer.compose_theme_video if kind == "theme" else composer.compose_single_video
+    try:
+        output_path = compose(config)
+        error = None
+    except Exception as e:
+        output_path, error = None, str(e)
+    finally:
+        composer.progress = None
+    return {
+        "output_path": output_path,
+        "output_paths": composer.last_output_paths if error is None else [],
+        "captures": composer.last_capture_paths if error is None else [],
+        "performance": composer.last_performance_report,
+        "error": error,
+        "cancelled": error is not None and job_id in cancelled
+    }
+
+
+class HttpError(Exception):
+    """HTTPエラー応答"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RenderJob:
+    """サービス内の1ジョブの状態と進捗"""
+
+    def __init__(self, kind: str, config: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.config = config
+        self.state = STATE_QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.render_started_at: Optional[float] = None
+        self.total_frames: Optional[int] = None
+        self.frames_done = 0
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def progress(self) -> Dict[str, Any]:
+        """書き出し済みフレーム数・割合・速度・推定残り時間"""
+        percent = fps = eta = None
+        if self.state == STATE_SUCCEEDED:
+            percent, eta = 100.0, 0.0
+        elif self.total_frames:
+            percent = round(min(100.0, self.frames_done * 100 / self.total_frames), 1)
+            elapsed = time.time() - (self.render_started_at or time.time())
+            if self.frames_done and elapsed > 0:
+                fps = self.frames_done / elapsed
+                eta = max(0.0, (self.total_frames - self.frames_done) / fps)
+        return {
+            "frames_done": self.frames_done,
+            "total_frames": self.total_frames,
+            "percent": percent,
+            "fps": round(fps, 1) if fps is not None else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "output_path": self.config.get("output_path"),
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.progress(),
+            "output_paths": self.result.get("output_paths"),
+            "captures": self.result.get("captures"),
+            "performance": self.result.get("performance"),
+            "error": self.error
+        }
+
+    def publish(self, event: str) -> None:
+        """購読中の接続へイベントを配信"""
+        message = {"event": event, **self.to_dict()}
+        for queue in self.subscribers:
+            queue.put_nowait(message)
+
+
+class RenderService:
+    """ジョブの受け付け・実行・進捗配信"""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, job_runner: Callable[..., Dict[str, Any]] = _run_service_job):
+        """
+        Args:
+            max_workers: 同時に合成するジョブ数（プロセスプールのワーカー数）
+            job_runner: ワーカーで1ジョブを実行するモジュール関数（_run_service_job と同じ引数・戻り値）
+        """
+        self.max_workers = max_workers
+        self.job_runner = job_runner
+        self.jobs: Dict[str, RenderJob] = {}
+        self._finished: deque = deque()
+        # イベントを送るスレッドを持つプロセスから fork しないよう、ワーカーは spawn で起動する
+        context = multiprocessing.get_context("spawn")
+        self._manager = context.Manager()
+        self._events = self._manager.Queue()
+        self._cancelled = self._manager.dict()
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        self._slots = asyncio.Semaphore(max_workers)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pump_thread: Optional[threading.Thread] = None
+
+    async def start(self) -> None:
+        """ワーカーからのイベントの受信を開始"""
+        self._loop = asyncio.get_running_loop()
+        self._pump_thread = threading.Thread(target=self._pump_events, name="render-events", daemon=True)
+        self._pump_thread.start()
+
+    async def close(self) -> None:
+        """全ジョブを中止し、ワーカーを停止"""
+        tasks = []
+        for job in self.jobs.values():
+            if not job.finished:
+                self.cancel(job.id)
+                tasks.append(job.task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        self._events.put(None)
+        if self._pump_thread is not None:
+            self._pump_thread.join()
+        self._manager.shutdown()
+
+    def _pump_events(self) -> None:
+        """ワーカーのイベントをイベントループへ渡す（Managerのキューの待ち受けはスレッドで行う）"""
+        while True:
+            try:
+                event = self._events.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_event, event)
+
+    def _on_event(self, event: Dict[str, Any]) -> None:
+        job = self.jobs.get(event["id"])
+        if job is None or job.finished:
+            return
+        if event["event"] == "running":
+            job.publish("running")
+        elif event["event"] == "start":
+            job.total_frames = event["total_frames"]
+            job.frames_done = 0
+            job.render_started_at = event["time"]
+            job.publish("progress")
+        elif event["event"] == "frames":
+            job.frames_done += event["frames"]
+            job.publish("progress")
+
+    def submit(self, kind: str, config: Dict[str, Any]) -> RenderJob:
+        """
+        ジョブを受け付ける
+
+        Args:
+            kind: "single" または "theme"
+            config: compose_single_video / compose_theme_video の設定
+
+        Returns:
+            RenderJob: 受け付けたジョブ（空きワーカーがなければ待機中）
+        """
+        if kind not in ("single", "theme"):
+            raise HttpError(400, f"未対応のジョブ種別: {kind}")
+        if not isinstance(config, dict) or not config.get("output_path"):
+            raise HttpError(400, "config.output_path が必要です")
+        job = RenderJob(kind, config)
+        self.jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run(job))
+        logger.info(f"ジョブ受付: {job.id} ({kind}) → {config['output_path']}")
+        return job
+
+    async def _run(self, job: RenderJob) -> None:
+        try:
+            async with self._slots:
+                job.state = STATE_RUNNING
+                job.started_at = time.time()
+                outcome = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.job_runner, job.id, job.kind, job.config, self._events, self._cancelled
+                )
+        except asyncio.CancelledError:
+            # ワーカー待ちの間に中止された
+            self._finish(job, STATE_CANCELLED)
+            return
+        except Exception as e:
+            # ワーカープロセスの異常終了等
+            self._finish(job, STATE_FAILED, error=str(e))
+            return
+        finally:
+            self._cancelled.pop(job.id, None)
+
+        job.result = outcome
+        if outcome["cancelled"]:
+            self._finish(job, STATE_CANCELLED)
+        elif outcome["error"] is not None:
+            self._finish(job, STATE_FAILED, error=outcome["error"])
+        else:
+            self._finish(job, STATE_SUCCEEDED)
+
+    def _finish(self, job: RenderJob, state: str, error: Optional[str] = None) -> None:
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        job.publish(state)
+        for queue in job.subscribers:
+            queue.put_nowait(None)
+        logger.info(f"ジョブ終了: {job.id} {state}" + (f" ({error})" if error else ""))
+
+        self._finished.append(job.id)
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        ジョブを中止
+
+        Returns:
+            bool: 中止を受け付けたか（終了済みならFalse）
+        """
+        job = self.jobs[job_id]
+        if job.finished:
+            return False
+        if job.state == STATE_QUEUED:
+            job.task.cancel()
+        else:
+            # 実行中のワーカーは進捗の送信時に中止要求を確認して停止する
+            self._cancelled[job_id] = True
+        logger.info(f"ジョブ中止要求: {job_id}")
+        return True
+
+    def summary(self) -> Dict[str, int]:
+        counts = {state: 0 for state in (STATE_QUEUED, STATE_RUNNING) + FINISHED_STATES}
+        for job in self.jobs.values():
+            counts[job.state] += 1
+        return counts
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """1接続のHTTPリクエストを処理（応答後に切断）"""
+        try:
+            method, path, query, body = await _read_request(reader)
+            await self._route(method, path, query, body, writer)
+        except HttpError as e:
+            await _send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.exception("リクエスト処理エラー")
+            try:
+                await _send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(
+        self,
+        method: str,
+        path: str,
+        query: Dict[str, List[str]],
+        body: bytes,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"] and method == "GET":
+            await _send_json(writer, 200, {"status": "ok", "workers": self.max_workers, "jobs": self.summary()})
+        elif parts == ["jobs"] and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpError(400, "本文がJSONではありません")
+            if not isinstance(request, dict):
+                raise HttpError(400, "本文は {\"kind\": ..., \"config\": {...}} の形式で指定してください")
+            job = self.submit(request.get("kind", "single"), request.get("config"))
+            await _send_json(writer, 202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+        elif parts == ["jobs"] and method == "GET":
+            await _send_json(writer, 200, {"jobs": [job.to_dict() for job in self.jobs.values()]})
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HttpError(404, f"ジョブがありません: {parts[1]}")
+            if len(parts) == 3 and parts[2] == "events" and method == "GET":
+                await self._stream_events(job, query.get("format", ["sse"])[0], writer)
+            elif len(parts) == 2 and method == "GET":
+                await _send_json(writer, 200, job.to_dict())
+            elif len(parts) == 2 and method == "DELETE":
+                if not self.cancel(job.id):
+                    raise HttpError(409, f"ジョブは終了済みです: {job.state}")
+                await _send_json(writer, 202, job.to_dict())
+            else:
+                raise HttpError(405, f"{method} {path} は使用できません")
+        else:
+            raise HttpError(404, f"{path} はありません")
+
+    async def _stream_events(self, job: RenderJob, stream_format: str, writer: asyncio.StreamWriter) -> None:
+        """
+        ジョブのイベントを終了まで配信
+
+        sse: text/event-stream（event: <種類> / data: <JSON>）
+        ndjson: chunked の改行区切りJSON
+        """
+        ndjson = stream_format == "ndjson"
+        if ndjson:
+            writer.write(_response_head(200, "application/x-ndjson", {"Transfer-Encoding": "chunked"}))
+        else:
+            writer.write(_response_head(200, "text/event-stream", {"Cache-Control": "no-cache"}))
+
+        def encode(message: Dict[str, Any]) -> bytes:
+            data = json.dumps(message, ensure_ascii=False)
+            if ndjson:
+                line = (data + "\n").encode("utf-8")
+                return f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n"
+            return f"event: {message['event']}\ndata: {data}\n\n".encode("utf-8")
+
+        # 接続時点の状態を最初に送る
+        writer.write(encode({"event": job.state if job.finished else "snapshot", **job.to_dict()}))
+        await writer.drain()
+        if not job.finished:
+            queue: asyncio.Queue = asyncio.Queue()
+            job.subscribers.add(queue)
+            try:
+                while True:
+                    try:
+                        message = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        if not ndjson:
+                            writer.write(b": keepalive\n\n")
+                            await writer.drain()
+                        continue
+                    if message is None:
+                        break
+                    writer.write(encode(message))
+                    await writer.drain()
+            finally:
+                job.subscribers.discard(queue)
+        if ndjson:
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, List[str]], bytes]:
+    """HTTP/1.1 リクエストを読む（メソッド・パス・クエリ・本文）"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "ヘッダーが大きすぎます")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "不正なリクエスト行です")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if "transfer-encoding" in headers:
+        raise HttpError(400, "Transfer-Encoding には対応していません（Content-Length を指定してください）")
+    length = _content_length(headers.get("content-length"))
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), body
+
+
+def _content_length(value: Optional[str]) -> int:
+    """Content-Length の値を検証（数字以外・負の値は400、上限超過は413）"""
+    if not value:
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise HttpError(400, f"不正な Content-Length です: {value}")
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"本文が大きすぎます（上限 {MAX_BODY_BYTES} バイト）")
+    return length
+
+
+def _response_head(status: int, content_type: str, extra: Optional[Dict[str, str]] = None) -> bytes:
+    headers = {"Content-Type": content_type, "Connection": "close", **(extra or {})}
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"] + [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send_json(
+    writer: asyncio.StreamWriter,
+    status: int,
+    data: Dict[str, Any],
+    extra: Optional[Dict[str, str]] = None
+) -> None:
+    body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+    writer.write(_response_head(status, "application/json; charset=utf-8",
+                                {"Content-Length": str(len(body)), **(extra or {})}) + body)
+    await writer.drain()
+
+
+async def serve(
+    max_workers: int = DEFAULT_WORKERS,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None
+) -> None:
+    """
+    サービスを起動し、SIGINT / SIGTERM まで待ち受ける
+
+    Args:
+        max_workers: 同時に合成するジョブ数
+        host / port: TCPの待ち受け先（socket_path 指定時は使わない）
+        socket_path: Unixソケットのパス
+    """
+    service = RenderService(max_workers)
+    await service.start()
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(service.handle, path=socket_path)
+        logger.info(f"レンダリングサービス起動: unix:{socket_path} (ワーカー{max_workers})")
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        logger.info(f"レンダリングサービス起動: http://{host}:{port} (ワーカー{max_workers})")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        logger.info("レンダリングサービス停止中")
+        await service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main():
+    """メイン関数 - コマンドライン実行用"""
+    args = sys.argv[1:]
+    if "--help" in args:
+        print("使用方法: python render_service.py [--host HOST] [--port PORT | --socket PATH] [--workers N]")
+        sys.exit(0)
+
+    def option(name: str, default: Any) -> Any:
+        return args[args.index(name) + 1] if name in args else default
+
+    asyncio.run(serve(
+        max_workers=int(option("--workers", DEFAULT_WORKERS)),
+        host=option("--host", DEFAULT_HOST),
+        port=int(option("--port", DEFAULT_PORT)),
+        socket_path=option("--socket", None)
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+レンダリングリソース管理
+
+1回のレンダリングで開いたクリップ（ffmpegリーダーを保持する）を登録し、
+失敗時を含めて確実に解放する。開いているリーダー数・ファイルディスクリプタ数を
+取得できるため、長時間バッチでのリークをテレメトリで検出できる。
+"""
+
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+def open_resource_counts(process: Optional[psutil.Process] = None) -> Dict[str, int]:
+    """
+    プロセスが保持しているリソース数を取得
+
+    Returns:
+        Dict[str, int]: ffmpeg子プロセス数・ファイルディスクリプタ（Windowsはハンドル）数
+    """
+    process = process or psutil.Process(os.getpid())
+    ffmpeg_processes = 0
+    try:
+        for child in process.children(recursive=True):
+            try:
+                if "ffmpeg" in child.name().lower():
+                    ffmpeg_processes += 1
+            except psutil.Error:
+                continue
+    except psutil.Error:
+        pass
+
+    try:
+        open_fds = process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+    except psutil.Error:
+        open_fds = -1
+
+    return {"ffmpeg_processes": ffmpeg_processes, "open_fds": open_fds}
+
+
+class RenderResources:
+    """レンダリング中に開いたクリップを追跡し、確実に解放するレジストリ"""
+
+    def __init__(self, name: str = "render"):
+        self.name = name
+        self.process = psutil.Process(os.getpid())
+        self._clips: List[Tuple[str, Any]] = []
+        self.opened_count = 0
+        self.closed_count = 0
+        self.close_errors: List[str] = []
+        self.counts_before: Dict[str, int] = {}
+        self.counts_after: Dict[str, int] = {}
+
+    def track(self, clip: Any, label: Optional[str] = None) -> Any:
+        """クリップを登録して返す（Noneはそのまま返す）"""
+        if clip is None:
+            return clip
+        if any(registered is clip for _, registered in self._clips):
+            return clip
+        self._clips.append((label or type(clip).__name__, clip))
+        self.opened_count += 1
+        return clip
+
+    @property
+    def open_count(self) -> int:
+        """未解放の登録クリップ数"""
+        return len(self._clips)
+
+    def close_all(self) -> None:
+        """登録クリップを逆順に解放（失敗しても残りの解放を継続）"""
+        while self._clips:
+            label, clip = self._clips.pop()
+            try:
+                clip.close()
+                self.closed_count += 1
+            except Exception as e:
+                message = f"{label}: {str(e)}"
+                self.close_errors.append(message)
+                logger.warning(f"クリップ解放失敗（{self.name}）: {message}")
+
+    def telemetry(self) -> Dict[str, Any]:
+        """リーク検出用のリソース統計"""
+        return {
+            "tracked_clips": self.opened_count,
+            "closed_clips": self.closed_count,
+            "open_clips": self.open_count,
+            "close_errors": list(self.close_errors),
+            "before": self.counts_before,
+            "after": self.counts_after
+        }
+
+    def __enter__(self) -> "RenderResources":
+        self.counts_before = open_resource_counts(self.process)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close_all()
+        self.counts_after = open_resource_counts(self.process)
+
+        leaked = self.counts_after["ffmpeg_processes"] - self.counts_before["ffmpeg_processes"]
+        if leaked > 0:
+            logger.warning(f"ffmpegプロセスが解放されていません（{self.name}）: {leaked}個")
+        return False
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+ストリーミング動画合成（メモリ上限一定）
+
+タイムラインをセグメント単位で処理し、各音声はそのセグメントの処理中だけ
+開いて直後に閉じる。字幕画像はデコード済みキャッシュ（overlay_cache、合計
+バイト数上限付き）から取得する。背景動画はループ連結せず単一リーダーを
+時刻の剰余で参照するため、ピークメモリはコメント数や総再生時間に依存しない。
+"""
+
+import os
+import wave
+import logging
+import queue
+import tempfile
+import subprocess
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Any
+
+from moviepy.editor import VideoFileClip
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+import numpy as np
+
+try:
+    from .audio_analysis import DEFAULT_SAMPLE_RATE, read_pcm, resample_pcm
+    from .frame_ring import FrameRing, write_frame_view
+    from .yuv_compositing import (
+        YuvBackgroundReader, YuvFrame, YuvFrameWriter, blend_yuv_overlay, solid_color_yuv
+    )
+    from .overlay_cache import SubtitleOverlay, get_overlay_cache
+    from .frame_capture import FrameCapture
+    from .render_progress import RenderProgress
+    from .output_fanout import FanoutFrameWriter, parse_outputs
+    from .atomic_output import atomic_outputs
+    from .theme_timeline import Timeline, TimelineSegment
+except ImportError:
+    from audio_analysis import DEFAULT_SAMPLE_RATE, read_pcm, resample_pcm
+    from frame_ring import FrameRing, write_frame_view
+    from yuv_compositing import (
+        YuvBackgroundReader, YuvFrame, YuvFrameWriter, blend_yuv_overlay, solid_color_yuv
+    )
+    from overlay_cache import SubtitleOverlay, get_overlay_cache
+    from frame_capture import FrameCapture
+    from render_progress import RenderProgress
+    from output_fanout import FanoutFrameWriter, parse_outputs
+    from atomic_output import atomic_outputs
+    from theme_timeline import Timeline, TimelineSegment
+
+logger = logging.getLogger(__name__)
+
+# 野球場を連想させる緑色（VideoComposer._create_default_background と同じ）
+DEFAULT_BACKGROUND_COLOR = (34, 139, 34)
+
+# 合成スレッド1つあたりの先行フレーム数（書き出し待ちキューの上限）
+REORDER_DEPTH = 2
+
+
+class StreamingRenderer:
+    """セグメント単位で素材を開閉するストリーミング合成クラス"""
+
+    def __init__(self, temp_dir: str, optimizer=None):
+        self.temp_dir = temp_dir
+        self.optimizer = optimizer
+
+    def render(
+        self,
+        segments: Sequence[TimelineSegment],
+        background_path: Optional[str],
+        output_path: str,
+        video_settings: Dict[str, Any],
+        background_settings: Dict[str, Any],
+        subtitle_settings: Dict[str, Any],
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> str:
+        """
+        セグメント列をストリーミング合成して出力
+
+        Args:
+            segments: タイムライン（Timeline またはフレーム範囲確定済みの TimelineSegment 列）
+            background_path: 背景動画パス（存在しなければ単色背景）
+            output_path: 出力パス
+            video_settings: 動画設定（fps, codec, bitrate, audio_codec, resolution, audio_fps）
+            background_settings: 背景設定（volume）
+            subtitle_settings: 字幕設定（fade_duration）
+            capture: 書き出し中に静止画を保存する場合の FrameCapture
+            progress: 書き出したフレーム数の通知先（音声ミックス後にも中止要求を確認）
+
+        Returns:
+            str: 出力動画のパス
+        """
+        fps = video_settings.get("fps", 30)
+        audio_fps = video_settings.get("audio_fps", DEFAULT_SAMPLE_RATE)
+        base_name = os.path.splitext(os.path.basename(output_path))[0]
+        # 並列ワーカーが同名の出力を同時に処理しても衝突しないよう一時ファイルは一意な名前にする
+        temp_wav = self._temp_path(base_name, "_stream_audio.wav")
+        temp_audio = self._temp_path(base_name, "_stream_audio.m4a")
+
+        background = self.open_background(background_path, audio_fps)
+        try:
+            with self._stage("load_audio"):
+                self.mix_audio(segments, background, background_settings, temp_wav, audio_fps)
+                self.encode_audio(temp_wav, temp_audio, video_settings)
+            if progress is not None:
+                progress.check_cancelled()
+
+            # 途中ファイルへ書き出し、完成後に出力パスへアトミックに置き換える
+            with self._stage("export_video") as stage, \
+                    atomic_outputs(output_path, video_settings) as (partial_output, partial_settings):
+                stage["frames"] = self.write_frames(
+                    segments, background, temp_audio, partial_output, partial_settings, subtitle_settings, fps,
+                    capture=capture, progress=progress
+                )
+                if progress is not None:
+                    progress.flush()
+        finally:
+            if background is not None:
+                background.close()
+            for path in (temp_wav, temp_audio):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        logger.info(f"ストリーミング合成完了: {output_path} ({len(segments)}セグメント)")
+        return output_path
+
+    def _temp_path(self, base_name: str, suffix: str) -> str:
+        """temp_dir に一意な名前の一時ファイルを作成してパスを返す"""
+        fd, path = tempfile.mkstemp(prefix=f"{base_name}_", suffix=suffix, dir=self.temp_dir)
+        os.close(fd)
+        return path
+
+    def _stage(self, stage_name: str):
+        """計測ステージ（optimizer未指定時は何もしない）"""
+        if self.optimizer is not None:
+            return self.optimizer.measure_stage(stage_name)
+        return nullcontext({})
+
+    def open_background(self, background_path: Optional[str], audio_fps: int = DEFAULT_SAMPLE_RATE) -> Optional[VideoFileClip]:
+        """背景動画リーダーを1つだけ開く（ループ連結はしない、音声はaudio_fpsでデコード）"""
+        if background_path and os.path.exists(background_path):
+            try:
+                return VideoFileClip(background_path, audio_fps=audio_fps)
+            except Exception as e:
+                logger.warning(f"背景動画読み込み失敗、単色背景を使用: {str(e)}")
+        return None
+
+    def mix_audio(
+        self,
+        segments: Sequence[TimelineSegment],
+        background: Optional[VideoFileClip],
+        background_settings: Dict[str, Any],
+        wav_path: str,
+        audio_fps: int
+    ) -> None:
+        """
+        セグメントごとに音声を開いてミックスし、WAVへ逐次書き出す
+
+        音声はネイティブレートで読み、audio_fpsと異なる場合のみ1回だけ再サンプリングする。
+        """
+        bg_audio = background.audio if background is not None else None
+        bg_volume = background_settings.get("volume", 0.1)
+
+        with wave.open(wav_path, "wb") as wav_file:
+            wav_file.setnchannels(2)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(audio_fps)
+
+            cursor = None
+            for segment in segments:
+                first = int(round(segment.start * audio_fps))
+                last = int(round(segment.end * audio_fps))
+                # 区間の間に空きがあれば（映像と同じく）背景音だけの区間として書き出す
+                start = cursor if cursor is not None and cursor < first else first
+                cursor = last
+                buffer = np.zeros((last - start, 2), dtype=np.float32)
+
+                if segment.audio_file:
+                    samples, sample_rate = read_pcm(segment.audio_file)
+                    samples = resample_pcm(samples, sample_rate, audio_fps)
+                    if segment.audio_end is not None:
+                        samples = samples[:int(round(segment.audio_end * audio_fps))]
+                    if segment.audio_start is not None:
+                        samples = samples[int(round(segment.audio_start * audio_fps)):]
+                    voice = buffer[first - start:]
+                    count = min(len(samples), len(voice))
+                    gain = segment.gain if segment.gain is not None else 1.0
+                    voice[:count] += samples[:count] * gain
+
+                if bg_audio is not None:
+                    buffer += self._read_looped_audio(bg_audio, start, len(buffer), audio_fps) * bg_volume
+
+                np.clip(buffer, -1.0, 1.0, out=buffer)
+                wav_file.writeframes((buffer * 32767).astype("<i2").tobytes())
+
+    def _read_looped_audio(self, audio_clip: Any, first_sample: int, count: int, audio_fps: int) -> np.ndarray:
+        """ループ再生を前提に背景音声の区間を読み出す"""
+        loop_samples = max(1, int(audio_clip.duration * audio_fps))
+        result = np.zeros((count, 2), dtype=np.float32)
+        filled = 0
+        while filled < count:
+            offset = (first_sample + filled) % loop_samples
+            take = min(count - filled, loop_samples - offset)
+            chunk = audio_clip.subclip(offset / audio_fps, (offset + take) / audio_fps).to_soundarray(
+                fps=audio_fps, nbytes=2, quantize=False
+            )
+            chunk = chunk[:take]
+            result[filled:filled + len(chunk)] = chunk
+            filled += take
+        return result
+
+    def encode_audio(self, wav_path: str, audio_path: str, video_settings: Dict[str, Any]) -> None:
+        """ミックス済みWAVを出力用コーデックで1回だけエンコード"""
+        audio_codec = video_settings.get("audio_codec", "aac")
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+               "-i", wav_path, "-acodec", audio_codec, audio_path]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def write_frames(
+        self,
+        segments: Sequence[TimelineSegment],
+        background: Optional[VideoFileClip],
+        audio_path: Optional[str],
+        output_path: str,
+        video_settings: Dict[str, Any],
+        subtitle_settings: Dict[str, Any],
+        fps: int,
+        threads: Optional[int] = None,
+        composite_workers: Optional[int] = None,
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> int:
+        """
+        セグメント単位でフレームを合成してffmpegへ書き出す（audio_path未指定なら映像のみ）
+
+        背景フレームの読み出しは単一リーダーのため順番に行い、字幕の合成は
+        スレッドプールで複数フレーム同時に処理する（NumPyの演算中はGILが解放される）。
+        合成結果は投入順のキュー（上限 workers x REORDER_DEPTH）から順番どおりに書き出す。
+        video_settings.composite_mode が "process" なら合成をワーカープロセスで行い、
+        フレームは共有メモリのリングバッファ（frame_ring.FrameRing）で受け渡す。
+        video_settings.composite_format が "yuv420p" なら背景をYUVのまま読み、
+        YUV平面上で合成してそのままエンコーダへ渡す（yuv_compositing）。
+        video_settings.outputs があれば同じフレームから全出力を同時にエンコードする（output_fanout）。
+
+        Args:
+            threads: ffmpegのスレッド数
+            composite_workers: 合成スレッド（プロセス）数（省略時は video_settings.composite_threads、
+                未指定ならCPUコア数（最大4）。1なら逐次処理）
+            capture: 指定フレームを書き出し時に静止画として保存（frame_capture.FrameCapture）
+            progress: 書き出したフレーム数の通知先（通知のタイミングで中止要求を確認）
+        """
+        if background is not None:
+            size = tuple(background.size)
+        else:
+            size = tuple(video_settings.get("resolution", (1920, 1080)))
+
+        if video_settings.get("composite_format") == "yuv420p":
+            if size[0] % 2 == 0 and size[1] % 2 == 0:
+                return self._write_frames_yuv(
+                    segments, background, size, audio_path, output_path, video_settings, subtitle_settings, fps, threads,
+                    capture, progress
+                )
+            logger.warning(f"解像度が奇数のためRGBで合成: {size[0]}x{size[1]}")
+
+        solid_frame = None
+        if background is None:
+            solid_frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            solid_frame[:] = DEFAULT_BACKGROUND_COLOR
+            logger.info("デフォルト背景（緑色）を使用")
+
+        writer = open_frame_writer(output_path, size, fps, video_settings, audio_path, threads)
+        fade_duration = subtitle_settings.get("fade_duration", 0.3)
+        workers = (composite_workers or video_settings.get("composite_threads")
+                   or min(os.cpu_count() or 1, 4))
+        frame_count = 0
+
+        def frame_jobs():
+            """(フレーム番号, 背景フレーム, セグメント, 字幕, 位置, 不透明度) をフレーム順に生成（背景フレームは読み取り専用）"""
+            current = None
+            overlay = position = None
+            for n, segment in as_timeline(segments, fps).iter_frames():
+                if segment is not current:
+                    current = segment
+                    overlay, position = self._segment_overlay(segment, size, get_overlay_cache().get)
+
+                t = n / fps
+                fade = fade_factor(t - segment.start, segment.duration, fade_duration) if overlay is not None else 0.0
+                if solid_frame is not None:
+                    base = solid_frame
+                else:
+                    base = np.asarray(background.get_frame(t % background.duration), dtype=np.uint8)
+                yield n, base, segment, overlay, position, fade
+
+        try:
+            if workers > 1 and video_settings.get("composite_mode") == "process":
+                frame_count = self._write_frames_shared(writer, frame_jobs(), size, workers, capture, progress)
+            elif workers <= 1:
+                for n, base, _, overlay, position, fade in frame_jobs():
+                    frame = composite_frame(base, overlay, position, fade)
+                    if capture is not None:
+                        capture.capture(n, frame)
+                    writer.write_frame(frame)
+                    frame_count += 1
+                    if progress is not None:
+                        progress.advance()
+            else:
+                def write_oldest() -> None:
+                    n, future = pending.popleft()
+                    frame = future.result()
+                    if capture is not None:
+                        capture.capture(n, frame)
+                    writer.write_frame(frame)
+                    if progress is not None:
+                        progress.advance()
+
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="composite") as pool:
+                    pending = deque()
+                    for n, base, _, overlay, position, fade in frame_jobs():
+                        pending.append((n, pool.submit(composite_frame, base, overlay, position, fade)))
+                        if len(pending) >= workers * REORDER_DEPTH:
+                            write_oldest()
+                            frame_count += 1
+                    while pending:
+                        write_oldest()
+                        frame_count += 1
+        finally:
+            writer.close()
+
+        return frame_count
+
+    def _write_frames_yuv(
+        self,
+        segments: Sequence[TimelineSegment],
+        background: Optional[VideoFileClip],
+        size: Tuple[int, int],
+        audio_path: Optional[str],
+        output_path: str,
+        video_settings: Dict[str, Any],
+        subtitle_settings: Dict[str, Any],
+        fps: int,
+        threads: Optional[int],
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> int:
+        """
+        YUV420pのまま合成して書き出す
+
+        背景はffmpegから yuv420p の生フレームを1本のバッファへ直接読み込み、
+        字幕は変換済みのYUV + アルファ（字幕画像キャッシュで共有）を重ねる。
+        """
+        timeline = as_timeline(segments, fps)
+        frame = YuvFrame(*size)
+        reader = None
+        solid_color = None
+        first_frame = timeline[0].first_frame if len(timeline) else 0
+        if background is not None:
+            reader = YuvBackgroundReader(background.filename, size, fps, (first_frame / fps) % background.duration)
+        else:
+            solid_color = solid_color_yuv(DEFAULT_BACKGROUND_COLOR)
+            logger.info("デフォルト背景（緑色）を使用")
+
+        writer = open_frame_writer(output_path, size, fps, video_settings, audio_path, threads, pix_fmt="yuv420p")
+        fade_duration = subtitle_settings.get("fade_duration", 0.3)
+        frame_count = 0
+
+        try:
+            current = None
+            overlay = position = None
+            for n, segment in timeline.iter_frames():
+                if segment is not current:
+                    current = segment
+                    overlay, position = self._segment_overlay(segment, size, get_overlay_cache().get_yuv)
+
+                if reader is not None:
+                    reader.read_into(frame)
+                else:
+                    frame.fill(solid_color)
+
+                if overlay is not None:
+                    fade = fade_factor(n / fps - segment.start, segment.duration, fade_duration)
+                    blend_yuv_overlay(frame, overlay, position, fade)
+
+                if capture is not None:
+                    capture.capture_yuv(n, frame)
+                writer.write_frame(frame.buffer)
+                frame_count += 1
+                if progress is not None:
+                    progress.advance()
+        finally:
+            if reader is not None:
+                reader.close()
+            writer.close()
+
+        return frame_count
+
+    def _segment_overlay(
+        self,
+        segment: Optional[TimelineSegment],
+        size: Tuple[int, int],
+        load_overlay: Any
+    ) -> Tuple[Any, Optional[Tuple[int, int]]]:
+        """区間の字幕と左上座標（字幕がない・区間外ならどちらもNone）"""
+        overlay = load_overlay(segment.subtitle_image) if segment is not None else None
+        if overlay is None:
+            return None, None
+        return overlay, resolve_position(segment.position or "bottom", size, overlay.size)
+
+    def _write_frames_shared(
+        self,
+        writer: FFMPEG_VideoWriter,
+        jobs: Iterator[tuple],
+        size: Tuple[int, int],
+        workers: int,
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> int:
+        """
+        合成をワーカープロセスで行い、共有メモリのリングバッファ経由で書き出す
+
+        フレームnはスロット n % スロット数 を使う。背景をスロットへ書き込んだ後、
+        字幕のあるフレームだけワーカーへ（フレーム番号, スロット, 字幕パス, 位置, 不透明度）を送り、
+        ワーカーはスロット上で直接合成する。書き出しはフレーム順で、スロットは書き出し後に再利用する。
+        """
+        ring = FrameRing(workers * REORDER_DEPTH, (size[1], size[0], 3))
+        # メモリ計測のサンプリングスレッドやffmpegの入出力スレッドが動いているプロセスから
+        # fork しないよう、ワーカーは spawn で起動する
+        context = multiprocessing.get_context("spawn")
+        tasks = context.Queue()
+        done_queue = context.Queue()
+        processes = [
+            context.Process(target=_ring_composite_worker, args=(ring.spec(), tasks, done_queue), daemon=True)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        in_flight: deque = deque()
+        done = set()
+        frame_count = 0
+
+        def flush_oldest() -> None:
+            n, frame_number, slot = in_flight.popleft()
+            while n not in done:
+                try:
+                    done.add(done_queue.get(timeout=1.0))
+                except queue.Empty:
+                    if not all(process.is_alive() for process in processes):
+                        raise RuntimeError("合成ワーカープロセスが異常終了しました")
+            done.discard(n)
+            if capture is not None:
+                capture.capture(frame_number, ring.slot(slot))
+            write_frame_view(writer, ring.slot(slot))
+            if progress is not None:
+                progress.advance()
+
+        try:
+            for n, (frame_number, base, segment, overlay, position, fade) in enumerate(jobs):
+                if len(in_flight) == ring.slot_count:
+                    flush_oldest()
+                    frame_count += 1
+                slot = n % ring.slot_count
+                np.copyto(ring.slot(slot), base)
+                if overlay is not None and fade > 0:
+                    tasks.put((n, slot, segment.subtitle_image, position, fade))
+                else:
+                    done.add(n)
+                in_flight.append((n, frame_number, slot))
+            while in_flight:
+                flush_oldest()
+                frame_count += 1
+        finally:
+            for _ in processes:
+                tasks.put(None)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            ring.close()
+
+        return frame_count
+
+
+def as_timeline(segments: Sequence[TimelineSegment], fps: int) -> Timeline:
+    """セグメント列を Timeline にする（チャンク並列のチャンク等、リストで渡された場合）"""
+    return segments if isinstance(segments, Timeline) else Timeline(segments, fps)
+
+
+def open_frame_writer(
+    output_path: str,
+    size: Tuple[int, int],
+    fps: int,
+    video_settings: Dict[str, Any],
+    audio_path: Optional[str],
+    threads: Optional[int],
+    pix_fmt: str = "rgb24"
+):
+    """
+    エンコーダを開く（video_settings.outputs があれば全出力を同時にエンコードするマルチ出力）
+
+    Args:
+        pix_fmt: 書き出すフレームの画素形式（"rgb24" または "yuv420p"）
+    """
+    outputs = parse_outputs(video_settings.get("outputs"), video_settings)
+    codec = video_settings.get("codec", "libx264")
+    bitrate = video_settings.get("bitrate", "5000k")
+    if outputs:
+        return FanoutFrameWriter(output_path, size, fps, codec=codec, audiofile=audio_path,
+                                 bitrate=bitrate, threads=threads, outputs=outputs, pix_fmt=pix_fmt)
+    if pix_fmt == "yuv420p":
+        return YuvFrameWriter(output_path, size, fps, codec=codec, audiofile=audio_path,
+                              bitrate=bitrate, threads=threads)
+    return FFMPEG_VideoWriter(output_path, size, fps, codec=codec, audiofile=audio_path,
+                              bitrate=bitrate, threads=threads)
+
+
+def resolve_position(position: Any, frame_size: Tuple[int, int], overlay_size: Tuple[int, int]) -> Tuple[int, int]:
+    """MoviePyのset_positionと同じ規則で字幕の左上座標を求める"""
+    frame_w, frame_h = frame_size
+    overlay_w, overlay_h = overlay_size
+
+    if isinstance(position, str):
+        position = {
+            "center": ("center", "center"),
+            "top": ("center", "top"),
+            "bottom": ("center", "bottom"),
+            "left": ("left", "center"),
+            "right": ("right", "center")
+        }.get(position, ("center", "bottom"))
+
+    x, y = position
+    x = {"left": 0, "center": (frame_w - overlay_w) // 2, "right": frame_w - overlay_w}.get(x, x)
+    y = {"top": 0, "center": (frame_h - overlay_h) // 2, "bottom": frame_h - overlay_h}.get(y, y)
+    return int(x), int(y)
+
+
+def _ring_composite_worker(ring_spec: tuple, tasks, done_queue) -> None:
+    """合成ワーカープロセス（共有メモリのスロット上で字幕を合成し、フレーム番号を返す）"""
+    ring = FrameRing.attach(ring_spec)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            n, slot, image_path, position, fade = task
+            overlay = get_overlay_cache().get(image_path)
+            if overlay is not None:
+                blend_overlay(ring.slot(slot), overlay, position, fade)
+            done_queue.put(n)
+    finally:
+        ring.close()
+
+
+def composite_frame(
+    base: np.ndarray,
+    overlay: Optional[SubtitleOverlay],
+    position: Optional[Tuple[int, int]],
+    fade: float
+) -> np.ndarray:
+    """1フレーム分の合成（背景は共有・読み取り専用のため複製してから字幕を重ねる）"""
+    frame = base.copy()
+    if overlay is not None:
+        blend_overlay(frame, overlay, position, fade)
+    return frame
+
+
+def fade_factor(t: float, duration: float, fade_duration: float) -> float:
+    """フェードイン/アウトの不透明度係数"""
+    if fade_duration <= 0:
+        return 1.0
+    return max(0.0, min(1.0, t / fade_duration, (duration - t) / fade_duration))
+
+
+def blend_overlay(
+    frame: np.ndarray,
+    overlay: SubtitleOverlay,
+    position: Tuple[int, int],
+    fade: float
+) -> None:
+    """乗算済みアルファで字幕をフレームへ上書き合成（画面外ははみ出し分を切り捨て）"""
+    if fade <= 0:
+        return
+    width, height = overlay.size
+    x, y = position
+    frame_h, frame_w = frame.shape[:2]
+
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, frame_w), min(y + height, frame_h)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    ox, oy = x0 - x, y0 - y
+    src_rgb = overlay.premultiplied[oy:oy + (y1 - y0), ox:ox + (x1 - x0)]
+    src_alpha = overlay.alpha[oy:oy + (y1 - y0), ox:ox + (x1 - x0)]
+    region = frame[y0:y1, x0:x1]
+
+    blended = region * (1.0 - fade * src_alpha) + fade * src_rgb
+    region[:] = blended.astype(np.uint8)
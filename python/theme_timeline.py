@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+テーマ動画のタイムライン構築
+
+タイトル + コメント音声をセグメント列（区間・音声・字幕画像・字幕位置）へ
+配置する。従来の固定レイアウト（1分40秒を21等分）に加え、実際の音声長から
+区間を詰めて配置する可変長レイアウトを提供する。音声・字幕・映像はすべて
+同じタイムラインから組み立てるため、表示タイミングは常に音声と一致する。
+
+音声の有効範囲（無音トリミング結果）を渡すと、各セグメントに
+audio_start / audio_end（音声ファイル内のサブクリップ範囲、秒）を付与する。
+"""
+
+import wave
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from moviepy.editor import AudioFileClip
+
+logger = logging.getLogger(__name__)
+
+# 可変長レイアウトの既定値
+DEFAULT_PACKED_SETTINGS = {
+    "gap": 0.3,            # 音声終了後の間（秒）
+    "min_duration": 1.0,   # 1区間の最短表示時間（秒）
+    "max_duration": None   # 動画全体の上限（秒、Noneで無制限）
+}
+
+
+class TimelineSegment:
+    """タイムラインの1区間（フレーム範囲は Timeline が確定させる）"""
+
+    __slots__ = (
+        "start", "end", "audio_file", "audio_start", "audio_end", "gain",
+        "subtitle_image", "position", "first_frame", "last_frame"
+    )
+
+    def __init__(
+        self,
+        start: float,
+        end: float,
+        audio_file: Optional[str] = None,
+        audio_start: Optional[float] = None,
+        audio_end: Optional[float] = None,
+        gain: Optional[float] = None,
+        subtitle_image: Optional[str] = None,
+        position: Any = None
+    ):
+        self.start = start
+        self.end = end
+        self.audio_file = audio_file
+        self.audio_start = audio_start      # 音声ファイル内の使用範囲（秒、Noneで先頭から）
+        self.audio_end = audio_end          # 同上（Noneで末尾まで）
+        self.gain = gain                    # ミックス時の線形ゲイン（Noneで1.0）
+        self.subtitle_image = subtitle_image
+        self.position = position            # 字幕位置（"bottom" 等の文字列または (x, y)）
+        self.first_frame = 0                # 表示開始フレーム（含む）
+        self.last_frame = 0                 # 表示終了フレーム（含まない）
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def frame_count(self) -> int:
+        return self.last_frame - self.first_frame
+
+    def to_dict(self) -> Dict[str, Any]:
+        """設定値のみの辞書（ジョブ識別・ログ用、未設定項目は含めない）"""
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if getattr(self, name) is not None
+        }
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        return f"TimelineSegment({self.start:.2f}-{self.end:.2f}s, frames {self.first_frame}-{self.last_frame})"
+
+
+class Timeline:
+    """
+    フレーム範囲を確定させたセグメント列
+
+    区間の開始・終了時刻とフレーム範囲を配列でも保持し、
+    フレーム番号・時刻からの区間検索を二分探索（O(log n)）で行う。
+    ストリーミング合成はフレーム番号列をまとめて区間番号へ変換して（segment_indices）フレームを生成する。
+    """
+
+    __slots__ = ("segments", "fps", "starts", "ends", "first_frames", "last_frames")
+
+    def __init__(self, segments: Sequence[TimelineSegment], fps: int):
+        self.segments: List[TimelineSegment] = list(segments)
+        self.fps = fps
+        for segment in self.segments:
+            segment.first_frame = int(round(segment.start * fps))
+            segment.last_frame = int(round(segment.end * fps))
+
+        self.starts = np.array([segment.start for segment in self.segments], dtype=np.float64)
+        self.ends = np.array([segment.end for segment in self.segments], dtype=np.float64)
+        self.first_frames = np.array([segment.first_frame for segment in self.segments], dtype=np.int64)
+        self.last_frames = np.array([segment.last_frame for segment in self.segments], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __iter__(self) -> Iterator[TimelineSegment]:
+        return iter(self.segments)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[TimelineSegment, List[TimelineSegment]]:
+        return self.segments[index]
+
+    @property
+    def duration(self) -> float:
+        return float(self.ends[-1]) if len(self.segments) else 0.0
+
+    @property
+    def frame_count(self) -> int:
+        return int(self.last_frames[-1]) if len(self.segments) else 0
+
+    def segment_index_at_frame(self, frame: int) -> int:
+        """フレームを含む区間の番号（範囲外は-1）"""
+        index = int(np.searchsorted(self.first_frames, frame, side="right")) - 1
+        if index < 0 or frame >= self.last_frames[index]:
+            return -1
+        return index
+
+    def segment_at_frame(self, frame: int) -> Optional[TimelineSegment]:
+        """フレームを含む区間（範囲外はNone）"""
+        index = self.segment_index_at_frame(frame)
+        return self.segments[index] if index >= 0 else None
+
+    def segment_at_time(self, t: float) -> Optional[TimelineSegment]:
+        """時刻を含む区間（範囲外はNone）"""
+        return self.segment_at_frame(int(t * self.fps))
+
+    def segment_indices(self, frames: np.ndarray) -> np.ndarray:
+        """フレーム番号配列をまとめて区間番号へ変換（範囲外は-1）"""
+        frames = np.asarray(frames, dtype=np.int64)
+        indices = np.searchsorted(self.first_frames, frames, side="right") - 1
+        valid = indices >= 0
+        valid[valid] = frames[valid] < self.last_frames[indices[valid]]
+        return np.where(valid, indices, -1)
+
+    def iter_frames(self) -> Iterator[Tuple[int, Optional[TimelineSegment]]]:
+        """
+        先頭区間の開始から最終区間の終了までの (フレーム番号, 区間) を順に生成
+
+        区間の割り当ては segment_indices で一括して求める（区間の間に空きがあれば区間はNone）。
+        """
+        if not self.segments:
+            return
+        frames = np.arange(self.first_frames[0], self.last_frames[-1], dtype=np.int64)
+        for frame, index in zip(frames.tolist(), self.segment_indices(frames).tolist()):
+            yield frame, self.segments[index] if index >= 0 else None
+
+
+def probe_audio_duration(audio_path: str) -> float:
+    """
+    音声ファイルの長さを取得（WAVはヘッダのみ読む）
+
+    Args:
+        audio_path: 音声ファイルパス
+
+    Returns:
+        float: 長さ（秒）
+    """
+    try:
+        with wave.open(audio_path, "rb") as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except (wave.Error, EOFError):
+        clip = AudioFileClip(audio_path)
+        try:
+            return clip.duration
+        finally:
+            clip.close()
+
+
+def snap_to_frame(seconds: float, fps: int) -> float:
+    """時刻をフレーム境界に丸める"""
+    return round(seconds * fps) / fps
+
+
+def _audio_segment(
+    start: float,
+    end: float,
+    audio_file: Optional[str],
+    audio_bounds: Optional[Dict[str, Tuple[float, float]]],
+    **overlay: Any
+) -> TimelineSegment:
+    """音声付きセグメント（有効範囲があればサブクリップ範囲を付与）"""
+    segment = TimelineSegment(start, end, audio_file, **overlay)
+    if audio_file and audio_bounds and audio_file in audio_bounds:
+        segment.audio_start, segment.audio_end = audio_bounds[audio_file]
+    return segment
+
+
+def build_fixed_timeline(
+    title_audio: Optional[str],
+    audio_files: List[str],
+    subtitle_images: List[Optional[str]],
+    positions: List[Any],
+    target_duration: float,
+    segment_count: int,
+    fps: int,
+    audio_bounds: Optional[Dict[str, Tuple[float, float]]] = None
+) -> Timeline:
+    """
+    固定レイアウト（全体をsegment_count等分、残りは無音区間）
+
+    Args:
+        audio_bounds: 音声パス→有効範囲（開始・終了秒）
+
+    Returns:
+        Timeline: タイムライン（先頭がタイトル）
+    """
+    segment_duration = target_duration / segment_count
+
+    segments = [_audio_segment(0.0, segment_duration, title_audio, audio_bounds)]
+    for i, audio_file in enumerate(audio_files):
+        segments.append(_audio_segment(
+            (i + 1) * segment_duration,
+            (i + 2) * segment_duration,
+            audio_file,
+            audio_bounds,
+            subtitle_image=subtitle_images[i] if i < len(subtitle_images) else None,
+            position=positions[i]
+        ))
+
+    # 音声ファイル数に関わらず全体は目標時間に揃える（残りは無音区間）
+    if segments[-1].end < target_duration:
+        segments.append(TimelineSegment(segments[-1].end, target_duration))
+    return Timeline(segments, fps)
+
+
+def build_packed_timeline(
+    title_audio: Optional[str],
+    audio_files: List[str],
+    subtitle_images: List[Optional[str]],
+    positions: List[Any],
+    fps: int,
+    gap: float = DEFAULT_PACKED_SETTINGS["gap"],
+    min_duration: float = DEFAULT_PACKED_SETTINGS["min_duration"],
+    max_duration: Optional[float] = DEFAULT_PACKED_SETTINGS["max_duration"],
+    audio_bounds: Optional[Dict[str, Tuple[float, float]]] = None
+) -> Timeline:
+    """
+    可変長レイアウト（実際の音声長 + 間で詰めて配置）
+
+    各区間の長さは max(音声長 + gap, min_duration) で、境界はフレームに揃える。
+    max_duration を超える区間は切り詰め、それ以降のコメントは配置しない。
+
+    Args:
+        title_audio: タイトル音声パス（Noneなら最短表示時間の無音）
+        audio_files: コメント音声パスのリスト
+        subtitle_images: コメント字幕画像パスのリスト
+        positions: コメント字幕位置のリスト
+        fps: フレームレート
+        gap: 音声終了後の間（秒）
+        min_duration: 1区間の最短表示時間（秒）
+        max_duration: 動画全体の上限（秒）
+        audio_bounds: 音声パス→有効範囲（開始・終了秒、区間長もこの範囲から求める）
+
+    Returns:
+        Timeline: タイムライン（先頭がタイトル）
+    """
+    entries = [(title_audio, None, None)]
+    for i, audio_file in enumerate(audio_files):
+        entries.append((audio_file, subtitle_images[i] if i < len(subtitle_images) else None, positions[i]))
+
+    segments: List[TimelineSegment] = []
+    cursor = 0.0
+    for index, (audio_file, subtitle_image, position) in enumerate(entries):
+        if max_duration is not None and cursor >= max_duration:
+            logger.info(f"最大長{max_duration:.1f}秒に到達: 残り{len(entries) - index}区間を省略")
+            break
+
+        segment = _audio_segment(cursor, cursor, audio_file, audio_bounds,
+                                 subtitle_image=subtitle_image, position=position)
+        if segment.audio_start is not None:
+            audio_duration = segment.audio_end - segment.audio_start
+        else:
+            audio_duration = probe_audio_duration(audio_file) if audio_file else 0.0
+        end = snap_to_frame(cursor + max(audio_duration + gap, min_duration), fps)
+        if max_duration is not None:
+            end = min(end, snap_to_frame(max_duration, fps))
+
+        segment.end = end
+        segments.append(segment)
+        cursor = end
+
+    logger.info(f"可変長タイムライン: {len(segments)}区間 / 総時間 {cursor:.2f}秒")
+    return Timeline(segments, fps)
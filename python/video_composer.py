@@ -9,10 +9,17 @@ MoviePyを使用した高品質動画合成
 import json
 import sys
 import os
+import time
+import socket
 import tempfile
 import logging
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union, Any
 import traceback
 
 try:
@@ -24,13 +31,61 @@ try:
     from moviepy.audio.fx import audio_fadeout, audio_fadein
     import numpy as np
     from PIL import Image, ImageDraw, ImageFont
-    # from .performance_optimizer import PerformanceOptimizer
-    # パフォーマンス最適化は一時的に無効化
 except ImportError as e:
     print(f"必須ライブラリが不足しています: {e}")
     print("pip install -r requirements.txt を実行してください")
     sys.exit(1)
 
+# パッケージ経由（python.video_composer）とスクリプト直接実行の両方に対応
+try:
+    from .performance_optimizer import PerformanceOptimizer, BackpressureController
+    from .streaming_composer import StreamingRenderer
+    from .resource_registry import RenderResources
+    from .parallel_encoder import ParallelSegmentEncoder
+    from .theme_timeline import (
+        DEFAULT_PACKED_SETTINGS, Timeline, TimelineSegment, build_fixed_timeline, build_packed_timeline
+    )
+    from .audio_analysis import (
+        AudioAnalyzer, DEFAULT_NORMALIZE_SETTINGS, DEFAULT_SAMPLE_RATE,
+        negotiate_sample_rate, normalization_gain, probe_sample_rate
+    )
+    from .audio_manifest import get_audio_manifest
+    from .bubble_layout import compute_bubble_layout
+    from .overlay_cache import get_overlay_cache
+    from .frame_writer import BufferedFrameWriter
+    from .output_fanout import parse_outputs
+    from .frame_capture import FrameCapture, capture_settings, capture_targets
+    from .render_progress import MoviePyProgressLogger, RenderProgress
+    from .output_store import OutputStore, render_fingerprint
+    from .atomic_output import atomic_outputs, discard_partial, partial_writer, stale_partials
+    from .job_queue import RenderJobQueue, STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, pid_alive
+    from .render_farm import FarmQueue, DEFAULT_LEASE_SECONDS
+    from .isolated_executor import IsolatedProcessExecutor
+except ImportError:
+    from performance_optimizer import PerformanceOptimizer, BackpressureController
+    from streaming_composer import StreamingRenderer
+    from resource_registry import RenderResources
+    from parallel_encoder import ParallelSegmentEncoder
+    from theme_timeline import (
+        DEFAULT_PACKED_SETTINGS, Timeline, TimelineSegment, build_fixed_timeline, build_packed_timeline
+    )
+    from audio_analysis import (
+        AudioAnalyzer, DEFAULT_NORMALIZE_SETTINGS, DEFAULT_SAMPLE_RATE,
+        negotiate_sample_rate, normalization_gain, probe_sample_rate
+    )
+    from audio_manifest import get_audio_manifest
+    from bubble_layout import compute_bubble_layout
+    from overlay_cache import get_overlay_cache
+    from frame_writer import BufferedFrameWriter
+    from output_fanout import parse_outputs
+    from frame_capture import FrameCapture, capture_settings, capture_targets
+    from render_progress import MoviePyProgressLogger, RenderProgress
+    from output_store import OutputStore, render_fingerprint
+    from atomic_output import atomic_outputs, discard_partial, partial_writer, stale_partials
+    from job_queue import RenderJobQueue, STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, pid_alive
+    from render_farm import FarmQueue, DEFAULT_LEASE_SECONDS
+    from isolated_executor import IsolatedProcessExecutor
+
 # ログ設定
 logging.basicConfig(
     level=logging.INFO,
@@ -45,10 +100,21 @@ logger = logging.getLogger(__name__)
 class VideoComposer:
     """動画合成処理クラス"""
     
+    THEME_TARGET_DURATION = 100.0  # テーマ動画の長さ（1分40秒固定）
+    THEME_SEGMENT_COUNT = 21       # タイトル1個 + コメント20個
+    
     def __init__(self, temp_dir: Optional[str] = None):
         self.temp_dir = temp_dir or tempfile.gettempdir()
         self.default_settings = self._get_default_settings()
-        # self.performance_optimizer = PerformanceOptimizer()  # 一時的に無効化
+        self.performance_optimizer = PerformanceOptimizer()
+        self.last_performance_report: Dict[str, Any] = {}
+        self.last_output_paths: List[str] = []
+        self.last_capture_paths: List[str] = []
+        self.batch_performance_reports: List[Dict[str, Any]] = []
+        self.backpressure_events: List[Dict[str, Any]] = []
+        self.progress: Optional[RenderProgress] = None
+        self._resources: Optional[RenderResources] = None
+        self.audio_analyzer = AudioAnalyzer(os.path.join(self.temp_dir, "nanj_audio_analysis.json"))
     
     def _get_default_settings(self) -> Dict[str, Any]:
         """デフォルト設定を取得"""
@@ -74,7 +140,7 @@ class VideoComposer:
     def compose_single_video(self, config: Dict[str, Any]) -> str:
         """
         単一動画を合成
-        
+
         Args:
             config: 動画合成設定
                 - text: 字幕テキスト
@@ -83,57 +149,99 @@ class VideoComposer:
                 - background_video: 背景動画パス（オプション）
                 - output_path: 出力パス
                 - settings: 追加設定
-        
+
         Returns:
             str: 出力動画のパス
         """
         try:
             logger.info(f"動画合成開始: {config.get('output_path', '不明')}")
-            
-            # 設定の検証
-            self._validate_config(config)
-            
-            # 音声クリップの読み込み
-            audio_clip = self._load_audio(config["audio_file"])
-            duration = audio_clip.duration
-            
-            # 背景動画の準備
-            background_clip = self._prepare_background(
-                config.get("background_video"), 
-                duration,
-                config.get("settings", {})
-            )
-            
-            # 字幕クリップの準備
-            subtitle_clip = self._prepare_subtitle(
-                config.get("subtitle_image"),
-                config.get("text", ""),
-                duration,
-                config.get("settings", {})
-            )
-            
-            # 動画の合成
-            final_video = self._compose_final_video(
-                background_clip,
-                subtitle_clip,
-                audio_clip,
-                config.get("settings", {})
-            )
-            
-            # 出力
-            output_path = self._export_video(final_video, config["output_path"], config.get("settings", {}))
-            
-            # クリーンアップ
-            self._cleanup_clips([background_clip, subtitle_clip, audio_clip, final_video])
-            
-            logger.info(f"動画合成完了: {output_path}")
-            return output_path
-            
+            optimizer = self.performance_optimizer
+            optimizer.reset_performance_stats()
+
+            with self._render_scope(config.get("output_path", "single")):
+                # ジョブの準備（どの経路でも同じステージとして計測する）
+                with optimizer.measure_stage("prepare_job"):
+                    # 設定の検証
+                    self._validate_config(config)
+
+                    # 処理前バリデーション（予測メモリによる受け入れ判定）
+                    if not optimizer.pre_process_validation(config):
+                        raise Exception("処理前バリデーション失敗")
+
+                    # ジョブ内部の音声サンプリングレートを決定（以降の読み込み・出力はこのレート）
+                    background_path = self._choose_background(config, config.get("settings", {}))
+                    config = {**config, "settings": self._with_audio_fps(
+                        config.get("settings", {}), [config["audio_file"]], background_path
+                    )}
+
+                    # 同じ入力の出力が出力ストアにあれば再エンコードせずハードリンクで出力
+                    fingerprint = self._render_fingerprint(config, config["settings"], "single")
+                    restored = self._restore_outputs(fingerprint, config, config["settings"])
+                if restored:
+                    logger.info(f"動画合成完了: {config['output_path']}")
+                    return config["output_path"]
+                config = {**config, "background_video": background_path}
+
+                # 低メモリのストリーミング経路（音声の読み込み・書き出しは StreamingRenderer がステージとして計測）
+                if config["settings"].get("render_mode") == "streaming":
+                    with optimizer.measure_stage("build_timeline"):
+                        timeline = self._single_streaming_timeline(config)
+                    output_path = self._render_streaming(timeline, background_path, config["output_path"],
+                                                         config["settings"], has_title=False)
+                    self._store_outputs(fingerprint, config, config["settings"])
+                    logger.info(f"動画合成完了: {output_path}")
+                    return output_path
+
+                # 音声クリップの読み込み
+                with optimizer.measure_stage("load_audio"):
+                    audio_clip = self._track(self._load_audio(
+                        config["audio_file"],
+                        self._audio_bounds(config["audio_file"], config["settings"]),
+                        self._audio_gain(config["audio_file"], config["settings"]),
+                        self._job_audio_fps(config["settings"])
+                    ))
+                duration = audio_clip.duration
+
+                # 背景動画の準備
+                with optimizer.measure_stage("prepare_background"):
+                    background_clip = self._prepare_background(background_path, duration, config["settings"])
+
+                # 字幕クリップの準備
+                with optimizer.measure_stage("prepare_subtitle"):
+                    subtitle_clip = self._track(self._prepare_subtitle(
+                        config.get("subtitle_image"),
+                        config.get("text", ""),
+                        duration,
+                        config["settings"]
+                    ))
+
+                # 動画の合成
+                with optimizer.measure_stage("compose_final_video"):
+                    final_video = self._track(self._compose_final_video(
+                        background_clip,
+                        subtitle_clip,
+                        audio_clip,
+                        config["settings"]
+                    ))
+
+                # 出力（有効なら書き出し中に静止画も保存）
+                with optimizer.measure_stage("export_video") as stage:
+                    timeline = Timeline([TimelineSegment(0.0, duration)], self._job_fps(config["settings"]))
+                    capture = self._frame_capture(config["output_path"], timeline, config["settings"], has_title=False)
+                    output_path = self._export_video(final_video, config["output_path"], config["settings"],
+                                                     capture, self._start_progress(timeline))
+                    stage["frames"] = self._count_frames(final_video, config["settings"])
+                self._finish_capture(capture)
+                self._store_outputs(fingerprint, config, config["settings"])
+
+                logger.info(f"動画合成完了: {output_path}")
+                return output_path
+
         except Exception as e:
             logger.error(f"動画合成エラー: {str(e)}")
             logger.error(traceback.format_exc())
             raise Exception(f"動画合成に失敗しました: {str(e)}")
-    
+
     def compose_theme_video(self, theme_config: Dict[str, Any]) -> str:
         """
         テーマごとの動画を合成（20個の音声+吹き出しを1つの動画に統合）
@@ -150,99 +258,598 @@ class VideoComposer:
         Returns:
             str: 出力動画のパス
         """
-        # パフォーマンス最適化は一時的に無効化
         try:
             logger.info(f"テーマ動画合成開始: {theme_config.get('theme_name', '不明')}")
+            optimizer = self.performance_optimizer
+            optimizer.reset_performance_stats()
 
-            # 処理前バリデーション（簡略化）
-            # if not optimizer.pre_process_validation(theme_config):
-            #     raise Exception("処理前バリデーション失敗")
+            with self._render_scope(theme_config.get("output_path", "theme")):
+                # ジョブの準備（どの経路でも同じステージとして計測する）
+                with optimizer.measure_stage("prepare_job"):
+                    # 設定の検証
+                    self._validate_theme_config(theme_config)
 
-            # 設定の検証
-            self._validate_theme_config(theme_config)
+                    # 処理前バリデーション（予測メモリによる受け入れ判定）
+                    if not optimizer.pre_process_validation(theme_config):
+                        raise Exception("処理前バリデーション失敗")
 
-            # 設定を取得（最適化は一時的に無効化）
-            optimized_settings = theme_config.get("settings", {}).copy()
-            audio_files = theme_config["audio_files"]
+                    # 設定を取得（最適化は一時的に無効化）
+                    optimized_settings = theme_config.get("settings", {}).copy()
+                    audio_files = theme_config["audio_files"]
 
-            # 基本設定を使用
-            if "video" not in optimized_settings:
-                optimized_settings["video"] = {}
-            # optimized_settings["audio"] = audio_opts
+                    # 基本設定を使用
+                    if "video" not in optimized_settings:
+                        optimized_settings["video"] = {}
+                    # optimized_settings["audio"] = audio_opts
 
-            # 音声クリップの読み込みと結合
-            combined_audio, audio_timings = self._combine_theme_audios(theme_config["audio_files"])
+                    # ジョブ内部の音声サンプリングレートを決定（以降の読み込み・出力はこのレート）
+                    background_path = self._choose_background(theme_config, optimized_settings)
+                    optimized_settings = self._with_audio_fps(
+                        optimized_settings, [self._find_title_audio_file(audio_files)] + list(audio_files),
+                        background_path
+                    )
 
-            # 背景動画の準備
-            background_clip = self._prepare_background(
-                theme_config.get("background_video"),
-                combined_audio.duration,
-                optimized_settings
-            )
+                    # 同じ入力の出力が出力ストアにあれば再エンコードせずハードリンクで出力
+                    fingerprint = self._render_fingerprint(theme_config, optimized_settings, "theme")
+                    restored = self._restore_outputs(fingerprint, theme_config, optimized_settings)
+                if restored:
+                    logger.info(f"テーマ動画合成完了: {theme_config['output_path']}")
+                    return theme_config["output_path"]
+                theme_config = {**theme_config, "background_video": background_path}
 
-            # 複数吹き出しクリップの準備（一時的に無効化してまず音声のみテスト）
-            subtitle_clips = []
-                # subtitle_clips = self._prepare_title_and_subtitles(
-                #     theme_config.get("theme_name", "テーマ"),
-                #     theme_config.get("subtitle_images", []),
-                #     theme_config.get("texts", []),
-                #     audio_timings,
-                #     optimized_settings
-            # )
-
-            # 動画の合成
-            final_video = self._compose_theme_final_video(
-                background_clip,
-                subtitle_clips,
-                combined_audio,
-                optimized_settings
-            )
+                # 低メモリのストリーミング経路（セグメント単位で素材を開閉）
+                if optimized_settings.get("render_mode") == "streaming":
+                    output_path = self._compose_theme_streaming(theme_config, optimized_settings)
+                    self._store_outputs(fingerprint, theme_config, optimized_settings)
+                    logger.info(f"テーマ動画合成完了: {output_path}")
+                    return output_path
 
-            # 出力
-            output_path = self._export_video(final_video, theme_config["output_path"], optimized_settings)
+                # チャンク並列エンコード経路（ストリームコピーで結合、チェックポイント再開可）
+                if optimized_settings.get("render_mode") == "parallel" or optimized_settings.get("checkpoint"):
+                    output_path = self._compose_theme_parallel(theme_config, optimized_settings)
+                    self._store_outputs(fingerprint, theme_config, optimized_settings)
+                    logger.info(f"テーマ動画合成完了: {output_path}")
+                    return output_path
 
-            # クリーンアップ
-            clips_to_cleanup = [background_clip, combined_audio, final_video] + subtitle_clips
-            self._cleanup_clips(clips_to_cleanup)
+                # 音声クリップの読み込みと結合（字幕タイミングも同じタイムラインに従う）
+                with optimizer.measure_stage("load_audio"):
+                    timeline = self._build_theme_timeline(theme_config, optimized_settings)
+                    combined_audio = self._track(self._combine_theme_audios(
+                        audio_files, timeline, self._job_audio_fps(optimized_settings)
+                    ))
 
-            # パフォーマンスレポート（一時的に無効化）
-            # report = optimizer.get_performance_report()
-            # logger.info(f"パフォーマンス詳細 - 総実行時間: {report['total_execution_time']:.2f}秒, "
-            #           f"メモリ使用量: {report['total_memory_usage_gb']:.2f}GB")
+                # 背景動画の準備
+                with optimizer.measure_stage("prepare_background"):
+                    background_clip = self._prepare_background(
+                        theme_config.get("background_video"),
+                        combined_audio.duration,
+                        optimized_settings
+                    )
 
-            logger.info(f"テーマ動画合成完了: {output_path}")
-            return output_path
+                # タイトル + 複数吹き出しクリップの準備
+                with optimizer.measure_stage("prepare_subtitle"):
+                    subtitle_clips = [self._track(clip) for clip in self._prepare_title_and_subtitles(
+                        theme_config.get("theme_name", "テーマ"),
+                        theme_config.get("texts", []),
+                        timeline,
+                        optimized_settings
+                    )]
+
+                # 動画の合成
+                with optimizer.measure_stage("compose_final_video"):
+                    final_video = self._track(self._compose_theme_final_video(
+                        background_clip,
+                        subtitle_clips,
+                        combined_audio,
+                        optimized_settings
+                    ))
+
+                # 出力（有効なら書き出し中に静止画も保存）
+                with optimizer.measure_stage("export_video") as stage:
+                    capture = self._frame_capture(theme_config["output_path"], timeline, optimized_settings)
+                    output_path = self._export_video(final_video, theme_config["output_path"], optimized_settings,
+                                                     capture, self._start_progress(timeline))
+                    stage["frames"] = self._count_frames(final_video, optimized_settings)
+                self._finish_capture(capture)
+                self._store_outputs(fingerprint, theme_config, optimized_settings)
+
+                # パフォーマンスレポート
+                report = optimizer.get_performance_report()
+                logger.info(f"パフォーマンス詳細 - 総実行時間: {report['total_execution_time']:.2f}秒")
+
+                logger.info(f"テーマ動画合成完了: {output_path}")
+                return output_path
 
         except Exception as e:
             logger.error(f"テーマ動画合成エラー: {str(e)}")
             logger.error(traceback.format_exc())
             raise Exception(f"テーマ動画合成に失敗しました: {str(e)}")
 
-    def compose_batch_videos(self, configs: List[Dict[str, Any]]) -> List[str]:
+    def compose_batch_videos(self, configs: List[Dict[str, Any]], max_workers: int = 1) -> List[str]:
         """
         複数動画を一括合成
         
+        メモリ圧迫時はバックプレッシャー制御により、受け入れ停止・
+        ワーカー数縮小・ストリーミング経路への切り替えを行う。
+        
         Args:
             configs: 動画合成設定のリスト
+            max_workers: 最大同時実行数（2以上でプロセス並列）
         
         Returns:
             List[str]: 出力動画パスのリスト
         """
-        results = []
+        results: List[Optional[str]] = [None] * len(configs)
+        self.batch_performance_reports = [{} for _ in configs]
+        controller = BackpressureController(self.performance_optimizer, max_workers)
+        self.backpressure_events = controller.events
         
-        for i, config in enumerate(configs):
-            try:
-                logger.info(f"バッチ処理 {i+1}/{len(configs)}: {config.get('output_path', '不明')}")
-                result = self.compose_single_video(config)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"バッチ処理 {i+1} でエラー: {str(e)}")
-                results.append(None)
+        pending = deque(enumerate(configs))
+        in_flight = {}
+        executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+        
+        try:
+            while pending or in_flight:
+                # 受け入れ可能な限りジョブを投入
+                while pending and controller.admit(pending[0][1], [configs[i] for i in in_flight.values()]):
+                    i, config = pending.popleft()
+                    job_config = controller.apply_render_mode(config, self._streaming_equivalent("single", config))
+                    logger.info(f"バッチ処理 {i+1}/{len(configs)}: {config.get('output_path', '不明')}")
+                    
+                    if executor is None:
+                        self._record_batch_result(i, self._compose_batch_job(job_config), results)
+                        continue
+                    try:
+                        future = executor.submit(_compose_batch_job_in_worker, job_config)
+                    except BrokenProcessPool:
+                        # ワーカーの異常終了でプールが使えなくなったら作り直して続行
+                        logger.warning("ワーカープールが停止したため再作成します")
+                        executor.shutdown(wait=False)
+                        executor = ProcessPoolExecutor(max_workers=max_workers)
+                        future = executor.submit(_compose_batch_job_in_worker, job_config)
+                    in_flight[future] = i
+                
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=controller.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = in_flight.pop(future)
+                        try:
+                            job_result = future.result()
+                        except Exception as e:
+                            # ワーカープロセスの異常終了等（他のジョブの結果は保持して続行）
+                            job_result = (None, {}, str(e))
+                        self._record_batch_result(i, job_result, results)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
         
         success_count = sum(1 for r in results if r is not None)
         logger.info(f"バッチ処理完了: {success_count}/{len(configs)} 成功")
-        
+
         return results
+
+    def consume_job_queue(
+        self,
+        queue: Union[RenderJobQueue, FarmQueue],
+        batch: Optional[str] = None,
+        max_workers: int = 1,
+        job_timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict[str, Any], str, Dict[str, int]], None]] = None
+    ) -> Dict[str, int]:
+        """
+        永続ジョブキューのジョブを空になるまで合成
+
+        compose_batch_videos と同じバックプレッシャー制御で投入する。ジョブの状態・試行回数・
+        所要時間・出力パスはキューに記録されるため、中断後に同じキューを処理すれば
+        未完了のジョブから再開する。同じホストの複数プロセスで同じキューを同時に処理できる。
+        取得できるジョブがなくなっても他のコンシューマーの実行中ジョブがあれば、それが終わるまで待つ。
+        job_timeout を指定すると各ジョブを専用プロセスで実行し、制限時間を超えたジョブは
+        プロセスを強制終了して失敗として記録する（試行回数が残っていれば再試行）。
+
+        Args:
+            queue: ジョブキュー（RenderJobQueue、または共有ディレクトリの FarmQueue）
+            batch: 対象バッチ（Noneなら全バッチ）
+            max_workers: 最大同時実行数（2以上でプロセス並列）
+            job_timeout: 1ジョブの制限時間（秒、Noneで無制限）
+            on_progress: ジョブの結果を記録するたびに (ジョブ, 記録後の状態, 状態ごとのジョブ数) で呼ぶ関数
+
+        Returns:
+            Dict[str, int]: 処理後の状態ごとのジョブ数
+        """
+        queue.recover_stale()
+        controller = BackpressureController(self.performance_optimizer, max_workers)
+        self.backpressure_events = controller.events
+
+        claimed = None
+        in_flight = {}
+        executor = None
+        if job_timeout is not None:
+            executor = IsolatedProcessExecutor(job_timeout)
+        elif max_workers > 1:
+            # FarmQueue のハートビートスレッドが動いているプロセスから fork しないよう、ワーカーは spawn で起動する
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        try:
+            while True:
+                # 実行枠が空いている時だけ取得する（取得したジョブは他のコンシューマーから見えなくなる）
+                if claimed is None and len(in_flight) < controller.allowed_workers:
+                    claimed = queue.claim(batch)
+                if claimed is None and not in_flight:
+                    if queue.summary(batch)[STATE_RUNNING] == 0:
+                        break
+                    # 他のコンシューマー（ノード）の実行中ジョブを待つ（失敗時の再投入・異常終了時の回収に備える）
+                    time.sleep(queue.poll_interval)
+                    queue.recover_stale()
+                    continue
+
+                if claimed is not None and controller.admit(claimed["config"], [job["config"] for job in in_flight.values()]):
+                    job, claimed = claimed, None
+                    job_config = controller.apply_render_mode(
+                        job["config"], self._streaming_equivalent(job["kind"], job["config"])
+                    )
+                    logger.info(f"キュージョブ {job['id']} (試行{job['attempts']}/{job['max_attempts']}): {job['output_path']}")
+
+                    if executor is None:
+                        state = self._record_queue_result(queue, job, self._compose_queue_job(job["kind"], job_config))
+                        if on_progress is not None:
+                            on_progress(job, state, queue.summary(batch))
+                    else:
+                        in_flight[executor.submit(_compose_queue_job_in_worker, job["kind"], job_config)] = job
+                    continue
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=controller.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = in_flight.pop(future)
+                        try:
+                            job_result = future.result()
+                        except Exception as e:
+                            # ワーカープロセスの異常終了・制限時間超過等（強制終了したプロセスの途中ファイルを削除）
+                            job_result = (None, {}, str(e), [], [])
+                            self._discard_dead_partials(job["config"])
+                        state = self._record_queue_result(queue, job, job_result)
+                        if on_progress is not None:
+                            on_progress(job, state, queue.summary(batch))
+        except BaseException:
+            if claimed is not None:
+                queue.release(claimed["id"])
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+        summary = queue.summary(batch)
+        logger.info(f"キュー処理完了: {json.dumps(summary, ensure_ascii=False)}")
+        return summary
+
+    def _streaming_equivalent(self, kind: str, config: Dict[str, Any]) -> bool:
+        """
+        ストリーミング経路でも通常経路と同じ出力になるか（バックプレッシャーによる経路切り替えの可否）
+
+        ストリーミング経路は字幕画像だけを描画し、テキスト字幕・タイトル字幕は描画しない。
+        テーマ動画は通常経路とタイトル・吹き出しの描画が異なるため切り替えない。
+        """
+        if kind == "theme":
+            return False
+        subtitle_image = config.get("subtitle_image")
+        if subtitle_image and os.path.exists(subtitle_image):
+            return True
+        return not config.get("text")
+    
+    def _single_streaming_timeline(self, config: Dict[str, Any]) -> Timeline:
+        """単一動画のストリーミング経路用タイムライン（音声の使用範囲・ゲイン・字幕位置を反映）"""
+        settings = config.get("settings", {})
+        bounds = self._audio_bounds(config["audio_file"], settings)
+        if bounds is not None:
+            duration = bounds[1] - bounds[0]
+        else:
+            with AudioFileClip(config["audio_file"]) as audio_clip:
+                duration = audio_clip.duration
+
+        subtitle_settings = {**self.default_settings["subtitle"], **settings.get("subtitle", {})}
+        segment = TimelineSegment(
+            0.0,
+            duration,
+            config["audio_file"],
+            subtitle_image=config.get("subtitle_image"),
+            position=self._get_subtitle_position(subtitle_settings)
+        )
+        if bounds is not None:
+            segment.audio_start, segment.audio_end = bounds
+        timeline = Timeline([segment], self._job_fps(settings))
+        self._apply_audio_gains(timeline, settings)
+        return timeline
+    
+    def _compose_theme_streaming(self, theme_config: Dict[str, Any], settings: Dict[str, Any]) -> str:
+        """テーマ動画をストリーミング経路で合成"""
+        timeline = self._build_theme_timeline(theme_config, settings)
+        return self._render_streaming(timeline, theme_config.get("background_video"), theme_config["output_path"], settings)
+    
+    def _compose_theme_parallel(self, theme_config: Dict[str, Any], settings: Dict[str, Any]) -> str:
+        """テーマ動画をチャンク並列エンコードで合成"""
+        timeline = self._build_theme_timeline(theme_config, settings)
+        encoder = self._parallel_encoder(settings)
+        background_path = self._choose_background(theme_config, settings)
+        
+        capture = self._frame_capture(theme_config["output_path"], timeline, settings)
+        output_path = encoder.render(
+            timeline,
+            background_path,
+            theme_config["output_path"],
+            {**self.default_settings["video"], **settings.get("video", {})},
+            self._background_settings(background_path, settings),
+            {**self.default_settings["subtitle"], **settings.get("subtitle", {})},
+            capture,
+            self._start_progress(timeline)
+        )
+        self._finish_capture(capture)
+        return output_path
+    
+    def _parallel_encoder(self, settings: Dict[str, Any]) -> ParallelSegmentEncoder:
+        """settings.parallel に従うチャンク並列エンコーダ"""
+        parallel_settings = settings.get("parallel", {})
+        return ParallelSegmentEncoder(
+            self.temp_dir,
+            self.performance_optimizer,
+            parallel_settings.get("workers"),
+            parallel_settings.get("chunks"),
+            parallel_settings.get("scratch_dir")
+        )
+    
+    def _choose_background(self, config: Dict[str, Any], settings: Dict[str, Any]) -> Optional[str]:
+        """
+        ジョブで使う背景動画を決める（ランダム選択は合成前に1回だけ行う）
+
+        音声のサンプリングレートを実際に使う背景動画の音声に合わせるため、
+        ランダム選択もレートの決定前に行う。中断したチャンク並列ジョブの続きなら同じ背景を使う。
+
+        Returns:
+            Optional[str]: 背景動画パス（背景動画がなければNone）
+        """
+        background_path = config.get("background_video")
+        if background_path and background_path != "random":
+            return background_path
+        if "audio_files" in config and (settings.get("render_mode") == "parallel" or settings.get("checkpoint")):
+            checkpointed = self._parallel_encoder(settings).checkpointed_background(config["output_path"])
+            if checkpointed:
+                return checkpointed
+        return self._select_random_background_video()
+    
+    def _build_theme_timeline(self, theme_config: Dict[str, Any], settings: Dict[str, Any]) -> Timeline:
+        """
+        テーマ動画のタイムラインを構築
+
+        settings.timeline.mode が "packed" なら実際の音声長で詰めて配置し、
+        それ以外は従来どおり1分40秒・21区間の均等配置とする。
+        """
+        audio_files = theme_config["audio_files"]
+        subtitle_images = theme_config.get("subtitle_images", [])
+        positions = self._bubble_positions(subtitle_images, len(audio_files), settings, "comment_grid")
+        title_audio = self._find_title_audio_file(audio_files)
+        timeline_settings = settings.get("timeline", {})
+        
+        # 無音トリミング（有効時のみ、解析結果はキャッシュ）
+        audio_bounds = {}
+        for audio_file in [title_audio] + list(audio_files):
+            bounds = self._audio_bounds(audio_file, settings)
+            if bounds is not None:
+                audio_bounds[audio_file] = bounds
+        
+        fps = self._job_fps(settings)
+        if timeline_settings.get("mode") == "packed":
+            packed = {**DEFAULT_PACKED_SETTINGS, **timeline_settings}
+            timeline = build_packed_timeline(
+                title_audio, audio_files, subtitle_images, positions, fps,
+                gap=packed["gap"],
+                min_duration=packed["min_duration"],
+                max_duration=packed["max_duration"],
+                audio_bounds=audio_bounds
+            )
+        else:
+            timeline = build_fixed_timeline(
+                title_audio, audio_files, subtitle_images, positions,
+                self.THEME_TARGET_DURATION, self.THEME_SEGMENT_COUNT, fps,
+                audio_bounds=audio_bounds
+            )
+        
+        self._apply_audio_gains(timeline, settings)
+        return timeline
+    
+    def _audio_bounds(self, audio_path: Optional[str], settings: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        """
+        無音を除いた音声の使用範囲を取得
+
+        settings.audio.trim_silence が true（または閾値等の辞書）の場合のみ解析する。
+
+        Returns:
+            Optional[Tuple[float, float]]: サブクリップ範囲（無効時・ファイルなしはNone）
+        """
+        trim = settings.get("audio", {}).get("trim_silence")
+        if not trim or not audio_path or not os.path.exists(audio_path):
+            return None
+        return self.audio_analyzer.trim_bounds(audio_path, trim if isinstance(trim, dict) else None)
+    
+    def _with_audio_fps(
+        self,
+        settings: Dict[str, Any],
+        audio_paths: List[Optional[str]],
+        background_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        ジョブ内部の音声サンプリングレートを決めて settings.video.audio_fps に設定
+
+        settings.audio.audio_fps（optimize_audio_processing の推奨値）または
+        settings.video.audio_fps の指定を優先し、なければ入力音声と背景動画の音声の
+        ネイティブレートのうち最大のものに合わせる。どの入力のレートも分からなければ
+        DEFAULT_SAMPLE_RATE とする。
+
+        Args:
+            settings: ジョブの設定
+            audio_paths: 音声ファイルのパス
+            background_path: 使用する背景動画のパス（ランダム選択は _choose_background で決定済みのもの）
+
+        Returns:
+            Dict[str, Any]: audio_fps を設定した settings のコピー
+        """
+        requested = settings.get("audio", {}).get("audio_fps") or settings.get("video", {}).get("audio_fps")
+        paths = list(audio_paths)
+        if background_path and background_path != "random":
+            paths.append(background_path)
+        input_rates = [probe_sample_rate(path) for path in dict.fromkeys(paths) if path and os.path.exists(path)]
+        audio_fps = negotiate_sample_rate(input_rates, requested)
+        logger.info(f"内部サンプリングレート: {audio_fps}Hz (入力: {sorted(set(r for r in input_rates if r))})")
+        return {**settings, "video": {**settings.get("video", {}), "audio_fps": audio_fps}}
+    
+    def _job_fps(self, settings: Dict[str, Any]) -> int:
+        """ジョブの映像フレームレート"""
+        return settings.get("video", {}).get("fps", self.default_settings["video"]["fps"])
+    
+    def _job_audio_fps(self, settings: Dict[str, Any]) -> int:
+        """ジョブ内部の音声サンプリングレート"""
+        return settings.get("video", {}).get("audio_fps", DEFAULT_SAMPLE_RATE)
+    
+    def _normalize_settings(self, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """settings.audio.normalize が有効なら正規化設定（true または上書き辞書）"""
+        normalize = settings.get("audio", {}).get("normalize")
+        if not normalize:
+            return None
+        return {**DEFAULT_NORMALIZE_SETTINGS, **(normalize if isinstance(normalize, dict) else {})}
+    
+    def _audio_gain(self, audio_path: Optional[str], settings: Dict[str, Any]) -> Optional[float]:
+        """
+        音声を目標ラウドネスへ揃える線形ゲインを取得
+
+        Returns:
+            Optional[float]: ゲイン（正規化無効時・ファイルなしはNone）
+        """
+        normalize = self._normalize_settings(settings)
+        if normalize is None or not audio_path or not os.path.exists(audio_path):
+            return None
+        return normalization_gain(
+            self.audio_analyzer.loudness(audio_path),
+            normalize["target_lufs"],
+            normalize["max_peak_dbfs"]
+        )
+    
+    def _apply_audio_gains(self, timeline: Timeline, settings: Dict[str, Any]) -> None:
+        """正規化有効時、各セグメントにミックス時のゲインを付与"""
+        for segment in timeline:
+            segment.gain = self._audio_gain(segment.audio_file, settings)
+    
+    def _background_volume(self, background_path: Optional[str], settings: Dict[str, Any]) -> float:
+        """
+        背景音の音量倍率を取得
+
+        正規化有効時は背景音のラウドネスから background_lufs に揃える倍率、
+        それ以外（解析できない場合を含む）は settings.background.volume。
+        """
+        bg_settings = {**self.default_settings["background"], **settings.get("background", {})}
+        normalize = self._normalize_settings(settings)
+        if normalize is None or not background_path or not os.path.exists(background_path):
+            return bg_settings["volume"]
+        try:
+            loudness = self.audio_analyzer.loudness(background_path)
+        except Exception as e:
+            logger.warning(f"背景音ラウドネス解析失敗、固定音量を使用: {str(e)}")
+            return bg_settings["volume"]
+        return normalization_gain(loudness, normalize["background_lufs"], normalize["max_peak_dbfs"])
+    
+    def _background_settings(self, background_path: Optional[str], settings: Dict[str, Any]) -> Dict[str, Any]:
+        """ストリーミング系レンダラーへ渡す背景設定（音量は解析結果を反映）"""
+        return {
+            **self.default_settings["background"],
+            **settings.get("background", {}),
+            "volume": self._background_volume(background_path, settings)
+        }
+    
+    def _render_streaming(
+        self,
+        timeline: Timeline,
+        background_path: Optional[str],
+        output_path: str,
+        settings: Dict[str, Any],
+        has_title: bool = True
+    ) -> str:
+        """ストリーミング合成の共通処理（has_title: 先頭区間がタイトルか）"""
+        if not background_path or background_path == "random":
+            background_path = self._select_random_background_video()
+        
+        renderer = StreamingRenderer(self.temp_dir, self.performance_optimizer)
+        capture = self._frame_capture(output_path, timeline, settings, has_title)
+        output_path = renderer.render(
+            timeline,
+            background_path,
+            output_path,
+            {**self.default_settings["video"], **settings.get("video", {})},
+            self._background_settings(background_path, settings),
+            {**self.default_settings["subtitle"], **settings.get("subtitle", {})},
+            capture,
+            self._start_progress(timeline)
+        )
+        self._finish_capture(capture)
+        return output_path
+    
+    def _compose_batch_job(self, config: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any], Optional[str]]:
+        """バッチ内の1ジョブを合成（結果・性能レポート・エラー）"""
+        try:
+            result = self.compose_single_video(config)
+            return result, self.last_performance_report, None
+        except Exception as e:
+            return None, self.last_performance_report, str(e)
+    
+    def _compose_queue_job(
+        self,
+        kind: str,
+        config: Dict[str, Any]
+    ) -> Tuple[Optional[str], Dict[str, Any], Optional[str], List[str], List[str]]:
+        """キューの1ジョブを合成（結果・性能レポート・エラー・出力パス・静止画パス）"""
+        compose = self.compose_theme_video if kind == "theme" else self.compose_single_video
+        try:
+            result = compose(config)
+            return result, self.last_performance_report, None, self.last_output_paths, self.last_capture_paths
+        except Exception as e:
+            return None, self.last_performance_report, str(e), [], []
+
+    def _discard_dead_partials(self, config: Dict[str, Any]) -> None:
+        """終了したこのホストのプロセスが残した途中ファイルを削除"""
+        video_settings = {**self.default_settings["video"], **config.get("settings", {}).get("video", {})}
+        paths = [config["output_path"]] + [output["output_path"]
+                                           for output in parse_outputs(video_settings.get("outputs"), video_settings)]
+        host = socket.gethostname()
+        for path in paths:
+            for partial in stale_partials(path):
+                writer = partial_writer(path, partial)
+                if writer is not None and writer[0] == host and not pid_alive(writer[1]):
+                    discard_partial(partial)
+
+    def _record_queue_result(
+        self,
+        queue: RenderJobQueue,
+        job: Dict[str, Any],
+        job_result: Tuple[Optional[str], Dict[str, Any], Optional[str], List[str], List[str]]
+    ) -> str:
+        """キュージョブの結果をキューへ記録（記録後の状態を返す）"""
+        result, report, error, output_paths, captures = job_result
+        if error is None:
+            queue.complete(job["id"], output_paths or [result], captures, report)
+            return STATE_SUCCEEDED
+        state = queue.fail(job["id"], error, report)
+        retry_note = "（再試行します）" if state == STATE_QUEUED else ""
+        logger.error(f"キュージョブ {job['id']} でエラー{retry_note}: {error}")
+        return state
+
+    def _record_batch_result(
+        self,
+        index: int,
+        job_result: Tuple[Optional[str], Dict[str, Any], Optional[str]],
+        results: List[Optional[str]]
+    ) -> None:
+        """バッチジョブの結果を記録"""
+        result, report, error = job_result
+        results[index] = result
+        self.batch_performance_reports[index] = report
+        if error is not None:
+            logger.error(f"バッチ処理 {index+1} でエラー: {error}")
     
     def _validate_config(self, config: Dict[str, Any]) -> None:
         """設定の検証"""
@@ -256,15 +863,24 @@ class VideoComposer:
         if not os.path.exists(config["audio_file"]):
             raise FileNotFoundError(f"音声ファイルが見つかりません: {config['audio_file']}")
         
-        # 出力ディレクトリの作成
-        output_dir = os.path.dirname(config["output_path"])
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
+        # 出力ディレクトリの作成（マルチ出力の追加出力先も含む）
+        self._prepare_outputs(config)
     
-    def _load_audio(self, audio_path: str) -> AudioFileClip:
-        """音声ファイルを読み込み"""
+    def _load_audio(
+        self,
+        audio_path: str,
+        bounds: Optional[Tuple[float, float]] = None,
+        gain: Optional[float] = None,
+        audio_fps: int = DEFAULT_SAMPLE_RATE
+    ) -> AudioFileClip:
+        """音声ファイルを読み込み（boundsがあればその範囲のみ使用、gainがあれば音量補正）"""
         try:
-            audio_clip = AudioFileClip(audio_path)
+            audio_clip = self._track(AudioFileClip(audio_path, fps=audio_fps), "audio")
+            # 派生クリップも登録する（元のリーダーを参照し続けるため、途中で失敗しても解放する）
+            if bounds is not None:
+                audio_clip = self._track(audio_clip.subclip(*bounds), "audio_subclip")
+            if gain is not None:
+                audio_clip = self._track(audio_clip.volumex(gain), "audio_gain")
             logger.info(f"音声読み込み完了: {audio_path} ({audio_clip.duration:.2f}秒)")
             return audio_clip
         except Exception as e:
@@ -283,16 +899,20 @@ class VideoComposer:
         if background_path and os.path.exists(background_path):
             try:
                 # 指定された背景動画を使用
-                background = VideoFileClip(background_path)
+                background = self._track(
+                    VideoFileClip(background_path, audio_fps=self._job_audio_fps(settings)), "background"
+                )
 
                 # 長さの調整
                 if background.duration < duration:
                     if bg_settings["loop"]:
                         # ループ再生
                         loop_count = int(duration / background.duration) + 1
-                        background = concatenate_videoclips([background] * loop_count)
+                        background = self._track(
+                            concatenate_videoclips([background] * loop_count), "background_loop"
+                        )
 
-                background = background.subclip(0, duration)
+                background = self._track(background.subclip(0, duration), "background_subclip")
 
                 # 解像度調整 - PIL.Image.ANTIALIAS問題を回避
                 target_resolution = self.default_settings["video"]["resolution"]
@@ -309,9 +929,9 @@ class VideoComposer:
 
                 # 音量調整（背景動画に音声がある場合）
                 if background.audio is not None:
-                    background = background.set_audio(
-                        background.audio.volumex(bg_settings["volume"])
-                    )
+                    background = self._track(background.set_audio(
+                        background.audio.volumex(self._background_volume(background_path, settings))
+                    ), "background_audio")
 
                 logger.info(f"背景動画読み込み完了: {background_path}")
                 return background
@@ -369,10 +989,11 @@ class VideoComposer:
         """字幕クリップを準備"""
         subtitle_settings = {**self.default_settings["subtitle"], **settings.get("subtitle", {})}
         
-        if subtitle_image_path and os.path.exists(subtitle_image_path):
+        overlay = get_overlay_cache().get(subtitle_image_path)
+        if overlay is not None:
             try:
-                # 字幕画像を使用
-                subtitle_clip = ImageClip(subtitle_image_path, duration=duration)
+                # 字幕画像を使用（デコード結果はプロセス内でキャッシュ）
+                subtitle_clip = overlay.to_clip(duration)
                 
                 # ポジション設定
                 position = self._get_subtitle_position(subtitle_settings)
@@ -456,8 +1077,22 @@ class VideoComposer:
         logger.info("動画合成完了")
         return final_video
     
-    def _export_video(self, video: CompositeVideoClip, output_path: str, settings: Dict[str, Any]) -> str:
-        """動画を出力"""
+    def _export_video(
+        self,
+        video: CompositeVideoClip,
+        output_path: str,
+        settings: Dict[str, Any],
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> str:
+        """
+        動画を出力
+
+        既定では事前確保したフレームバッファへ合成してffmpegへ直接書き出す（frame_writer）。
+        settings.video.frame_writer が "moviepy" なら MoviePy の write_videofile を使う
+        （マルチ出力・静止画保存はフレームバッファ経路でのみ扱えるため、指定時はそちらを使う）。
+        進捗の通知と中止要求の確認はどちらの経路でも音声・映像の書き出し中に行う。
+        """
         try:
             video_settings = {**self.default_settings["video"], **settings.get("video", {})}
             
@@ -467,18 +1102,36 @@ class VideoComposer:
             bitrate = video_settings.get("bitrate", "5000k")
             audio_codec = video_settings.get("audio_codec", "aac")
             
-            # ファイル出力
-            video.write_videofile(
-                output_path,
-                fps=fps,
-                codec=codec,
-                bitrate=bitrate,
-                audio_codec=audio_codec,
-                temp_audiofile=os.path.join(self.temp_dir, "temp_audio.m4a"),
-                remove_temp=True,
-                verbose=False,
-                logger=None
-            )
+            buffered_only = bool(video_settings.get("outputs")) or capture is not None
+            if buffered_only and video_settings.get("frame_writer") == "moviepy":
+                logger.warning("マルチ出力・静止画保存は write_videofile では扱えないため事前確保バッファ経路で出力")
+            
+            # 途中ファイルへ書き出し、完成後に出力パスへアトミックに置き換える
+            with atomic_outputs(output_path, video_settings) as (partial_output, partial_settings):
+                if video_settings.get("frame_writer") != "moviepy" or buffered_only:
+                    self._export_buffered(video, partial_output, fps, codec, bitrate, audio_codec,
+                                          {**settings, "video": partial_settings}, capture, progress)
+                else:
+                    # ファイル出力（音声はジョブ内部のレートのまま出力し再サンプリングしない）
+                    temp_audio = self._temp_audio_path(output_path)
+                    try:
+                        video.write_videofile(
+                            partial_output,
+                            fps=fps,
+                            codec=codec,
+                            bitrate=bitrate,
+                            audio_fps=self._job_audio_fps(settings),
+                            audio_codec=audio_codec,
+                            temp_audiofile=temp_audio,
+                            remove_temp=True,
+                            verbose=False,
+                            logger=MoviePyProgressLogger(progress) if progress is not None else None
+                        )
+                    finally:
+                        if os.path.exists(temp_audio):
+                            os.remove(temp_audio)
+                if progress is not None:
+                    progress.flush()
             
             logger.info(f"動画出力完了: {output_path}")
             return output_path
@@ -486,14 +1139,190 @@ class VideoComposer:
         except Exception as e:
             raise Exception(f"動画出力エラー: {str(e)}")
     
-    def _cleanup_clips(self, clips: List[Any]) -> None:
-        """クリップのクリーンアップ"""
-        for clip in clips:
-            if clip is not None:
-                try:
-                    clip.close()
-                except:
-                    pass  # エラーが発生しても継続
+    def _export_buffered(
+        self,
+        video: CompositeVideoClip,
+        output_path: str,
+        fps: int,
+        codec: str,
+        bitrate: str,
+        audio_codec: str,
+        settings: Dict[str, Any],
+        capture: Optional[FrameCapture] = None,
+        progress: Optional[RenderProgress] = None
+    ) -> str:
+        """事前確保バッファへ合成し、フレームを複製せずにffmpegへ書き出す"""
+        temp_audio = None
+        video_settings = {**self.default_settings["video"], **settings.get("video", {})}
+        try:
+            if video.audio is not None:
+                temp_audio = self._temp_audio_path(output_path)
+                video.audio.write_audiofile(temp_audio, fps=self._job_audio_fps(settings), codec=audio_codec,
+                                            verbose=False, logger=None)
+            if progress is not None:
+                progress.check_cancelled()
+            with BufferedFrameWriter(output_path, video.size, fps, codec=codec, bitrate=bitrate, audiofile=temp_audio,
+                                     outputs=parse_outputs(video_settings.get("outputs"), video_settings)) as writer:
+                writer.write_clip(video, capture, progress)
+        finally:
+            if temp_audio and os.path.exists(temp_audio):
+                os.remove(temp_audio)
+        return output_path
+    
+    def _temp_audio_path(self, output_path: str) -> str:
+        """ジョブ専用の一時音声ファイル（並列ワーカーが同時に書き出しても衝突しない名前）"""
+        fd, temp_audio = tempfile.mkstemp(
+            prefix=f"{os.path.splitext(os.path.basename(output_path))[0]}_", suffix="_audio.m4a", dir=self.temp_dir
+        )
+        os.close(fd)
+        return temp_audio
+    
+    def _count_frames(self, video: CompositeVideoClip, settings: Dict[str, Any]) -> int:
+        """出力フレーム数を算出（エンコードfps計測用）"""
+        video_settings = {**self.default_settings["video"], **settings.get("video", {})}
+        fps = video_settings.get("fps", 30)
+        return int(round((video.duration or 0) * fps))
+    
+    @contextmanager
+    def _render_scope(self, name: str):
+        """1回のレンダリングで開いたクリップを追跡し、失敗時も確実に解放する"""
+        resources = RenderResources(name)
+        self._resources = resources
+        try:
+            with resources:
+                yield resources
+        finally:
+            self._resources = None
+            self.last_performance_report = {
+                **self.performance_optimizer.get_performance_report(),
+                "resources": resources.telemetry()
+            }
+    
+    def _track(self, clip: Any, label: Optional[str] = None) -> Any:
+        """クリップを現在のレンダリングのリソースレジストリへ登録"""
+        if self._resources is not None:
+            return self._resources.track(clip, label)
+        return clip
+    
+    def _frame_capture(
+        self,
+        output_path: str,
+        timeline: Timeline,
+        settings: Dict[str, Any],
+        has_title: bool = True
+    ) -> Optional[FrameCapture]:
+        """settings.capture が有効なら、書き出し中に静止画を保存する FrameCapture を作成"""
+        capture = capture_settings(settings)
+        if capture is None:
+            return None
+        subtitle_settings = {**self.default_settings["subtitle"], **settings.get("subtitle", {})}
+        targets = capture_targets(timeline, self._job_fps(settings), subtitle_settings.get("fade_duration", 0.3),
+                                  has_title, capture["title"], capture["comments"])
+        return FrameCapture(output_path, targets, capture)
+    
+    def _start_progress(self, timeline: Timeline) -> Optional[RenderProgress]:
+        """進捗の通知先（self.progress）があれば総フレーム数を通知して返す（中止要求もここで確認）"""
+        if self.progress is not None:
+            self.progress.start(timeline.frame_count)
+        return self.progress
+    
+    def _finish_capture(self, capture: Optional[FrameCapture]) -> None:
+        """コンタクトシートを作成し、保存した静止画を記録"""
+        if capture is not None:
+            self.last_capture_paths = capture.finish()
+    
+    def _render_fingerprint(self, config: Dict[str, Any], settings: Dict[str, Any], kind: str) -> Optional[str]:
+        """
+        出力ストア用の入力の指紋（settings.output_store 未指定・背景がランダム選択ならNone）
+
+        素材ファイルは内容のハッシュ、設定は出力先パス等の出力内容に影響しない項目を除いて含める。
+        """
+        if not settings.get("output_store"):
+            return None
+        background = config.get("background_video")
+        if not background or background == "random":
+            logger.info("背景がランダム選択のため出力ストアを使用しません")
+            return None
+
+        def signature(path: Optional[str]) -> Any:
+            if not path or not os.path.exists(path):
+                return path
+            return self.audio_analyzer.cache.digest(path)
+
+        inputs = {key: value for key, value in config.items() if key not in ("output_path", "settings")}
+        for key in ("audio_file", "subtitle_image", "background_video"):
+            if key in inputs:
+                inputs[key] = signature(inputs[key])
+        for key in ("audio_files", "subtitle_images"):
+            if key in inputs:
+                inputs[key] = [signature(path) for path in inputs[key]]
+        if kind == "theme":
+            inputs["title_audio"] = signature(self._find_title_audio_file(config["audio_files"]))
+
+        render_settings = {key: value for key, value in settings.items() if key != "output_store"}
+        video_settings = dict(render_settings.get("video", {}))
+        if video_settings.get("outputs"):
+            video_settings["outputs"] = [{key: value for key, value in output.items() if key != "output_path"}
+                                         for output in video_settings["outputs"]]
+        render_settings["video"] = video_settings
+        if isinstance(render_settings.get("capture"), dict):
+            render_settings["capture"] = {key: value for key, value in render_settings["capture"].items() if key != "dir"}
+        if "parallel" in render_settings:
+            render_settings["parallel"] = {key: value for key, value in render_settings["parallel"].items()
+                                           if key not in ("workers", "scratch_dir")}
+        return render_fingerprint({"kind": kind, "inputs": inputs, "settings": render_settings})
+    
+    def _output_roles(self, config: Dict[str, Any], settings: Dict[str, Any], capture_paths: List[str]) -> Dict[str, str]:
+        """出力ストアでの役割名 → 出力パス（主出力・追加出力・静止画）"""
+        video_settings = {**self.default_settings["video"], **settings.get("video", {})}
+        roles = {f"video{os.path.splitext(config['output_path'])[1]}": config["output_path"]}
+        for k, output in enumerate(parse_outputs(video_settings.get("outputs"), video_settings)):
+            roles[f"output_{k}{os.path.splitext(output['output_path'])[1]}"] = output["output_path"]
+        if capture_paths:
+            prefix = FrameCapture(config["output_path"], {}, capture_settings(settings)).prefix
+            for path in capture_paths:
+                roles[f"capture_{path[len(prefix) + 1:]}"] = path
+        return roles
+    
+    def _restore_outputs(self, fingerprint: Optional[str], config: Dict[str, Any], settings: Dict[str, Any]) -> bool:
+        """出力ストアに同じ入力の出力があれば出力先へハードリンクする"""
+        if fingerprint is None:
+            return False
+        store = OutputStore(settings["output_store"])
+        stored = store.lookup(fingerprint)
+        if stored is None:
+            return False
+        capture_paths = []
+        if capture_settings(settings) is not None:
+            prefix = FrameCapture(config["output_path"], {}, capture_settings(settings)).prefix
+            capture_paths = [f"{prefix}_{role[len('capture_'):]}" for role in stored if role.startswith("capture_")]
+        if not store.restore(fingerprint, self._output_roles(config, settings, capture_paths)):
+            return False
+        self.last_capture_paths = capture_paths
+        return True
+    
+    def _store_outputs(self, fingerprint: Optional[str], config: Dict[str, Any], settings: Dict[str, Any]) -> None:
+        """完成した出力を出力ストアへ登録（失敗してもレンダリング結果には影響させない）"""
+        if fingerprint is None:
+            return
+        try:
+            OutputStore(settings["output_store"]).save(
+                fingerprint, self._output_roles(config, settings, self.last_capture_paths)
+            )
+        except OSError as e:
+            logger.warning(f"出力ストア登録失敗: {str(e)}")
+    
+    def _prepare_outputs(self, config: Dict[str, Any]) -> None:
+        """出力先の準備（settings.video.outputs・settings.capture の形式確認、出力ディレクトリの作成、出力パス一覧の記録）"""
+        video_settings = {**self.default_settings["video"], **config.get("settings", {}).get("video", {})}
+        outputs = parse_outputs(video_settings.get("outputs"), video_settings)
+        self.last_output_paths = [config["output_path"]] + [output["output_path"] for output in outputs]
+        self.last_capture_paths = []
+        capture_settings(config.get("settings", {}))
+        for path in self.last_output_paths:
+            output_dir = os.path.dirname(path)
+            if output_dir and not os.path.exists(output_dir):
+                os.makedirs(output_dir, exist_ok=True)
     
     def _validate_theme_config(self, config: Dict[str, Any]) -> None:
         """テーマ設定の検証"""
@@ -518,95 +1347,70 @@ class VideoComposer:
         if texts and len(texts) != len(audio_files):
             raise ValueError(f"テキスト数({len(texts)})と音声ファイル数({len(audio_files)})が一致しません")
         
-        # 出力ディレクトリの作成
-        output_dir = os.path.dirname(config["output_path"])
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
+        # 出力ディレクトリの作成（マルチ出力の追加出力先も含む）
+        self._prepare_outputs(config)
     
-    def _combine_theme_audios(self, audio_files: List[str]) -> Tuple[AudioFileClip, List[Tuple[float, float]]]:
-        """テーマの音声ファイルを結合（1分40秒固定・均等配置）"""
+    def _combine_theme_audios(
+        self,
+        audio_files: List[str],
+        timeline: Optional[Timeline] = None,
+        audio_fps: int = DEFAULT_SAMPLE_RATE
+    ) -> AudioFileClip:
+        """
+        テーマの音声ファイルをタイムラインどおりに結合
+
+        Args:
+            audio_files: コメント音声ファイルのリスト
+            timeline: _build_theme_timeline のタイムライン（省略時は1分40秒固定・均等配置）
+            audio_fps: 音声の読み込みレート（ジョブ内部のサンプリングレート）
+
+        Returns:
+            AudioFileClip: 結合音声（字幕の表示区間は同じタイムラインのセグメントから取る）
+        """
         try:
-            TARGET_DURATION = 100.0  # 1分40秒固定
-            
-            # 21等分（タイトル1個 + コメント20個）
-            segment_duration = TARGET_DURATION / 21  # 約4.76秒ずつ
+            if timeline is None:
+                timeline = build_fixed_timeline(
+                    self._find_title_audio_file(audio_files), audio_files, [], [None] * len(audio_files),
+                    self.THEME_TARGET_DURATION, self.THEME_SEGMENT_COUNT, self.default_settings["video"]["fps"]
+                )
+            total_duration = timeline.duration
             
-            timings = []
             positioned_audio_clips = []
             
-            # タイトル音声セグメント（最初の4.76秒）
-            title_audio_file = None
-            
-            # タイトル音声ファイルを探索
-            import glob
-            audio_dir = os.path.dirname(audio_files[0]) if audio_files else '.'
-            
-            # テーマ番号を推測（音声ファイル名から）
-            theme_num = 1
-            if audio_files:
-                filename = os.path.basename(audio_files[0])
-                if 'theme2' in filename:
-                    theme_num = 2
-                elif 'theme3' in filename:
-                    theme_num = 3
-            
-            # テーマごとの特定タイトル音声ファイル名
-            theme_title_files = {
-                1: 'title_gekiteki.wav',
-                2: 'title_shushin_fail.wav', 
-                3: 'title_shinjin_katsuyaku.wav'
-            }
-            
-            specific_title_file = theme_title_files.get(theme_num, 'title_gekiteki.wav')
-            
-            title_patterns = [
-                os.path.join(audio_dir, specific_title_file),  # テーマ固有のタイトル
-                os.path.join(audio_dir, 'title_*.wav'),
-                os.path.join(audio_dir, '*title*.wav'),
-                # フォールバック: 最初のコメント音声をタイトルとして使用
-                audio_files[0] if audio_files else None
-            ]
-            
-            for pattern in title_patterns[:2]:  # patternファイル検索
-                matches = glob.glob(pattern)
-                if matches:
-                    title_audio_file = matches[0]
-                    break
-            
-            if not title_audio_file and audio_files:
-                # フォールバック: 最初のコメント音声をタイトルに流用
-                title_audio_file = audio_files[0]
-                logger.info(f"タイトル音声未発見、フォールバック使用: {title_audio_file}")
+            # タイトル音声セグメント（先頭区間）
+            title_segment = timeline[0]
+            title_audio_file = title_segment.audio_file
+            title_duration = title_segment.duration
             
             if title_audio_file and os.path.exists(title_audio_file):
                 # 実際のタイトル音声を使用
-                title_audio = AudioFileClip(title_audio_file)
-                if title_audio.duration > segment_duration:
-                    title_audio = title_audio.subclip(0, segment_duration)
+                title_audio = self._open_segment_audio(title_segment, "title_audio", audio_fps)
+                if title_audio.duration > title_duration:
+                    title_audio = self._track(title_audio.subclip(0, title_duration), "title_audio_subclip")
                 
                 positioned_audio_clips.append(title_audio.set_start(0))
-                logger.info(f"タイトル音声配置: {title_audio_file} (0.0s-{segment_duration:.2f}s)")
+                logger.info(f"タイトル音声配置: {title_audio_file} (0.0s-{title_duration:.2f}s)")
             else:
                 # フォールバック: 無音
                 from moviepy.editor import AudioClip
-                title_silence = AudioClip(make_frame=lambda t: [0, 0], duration=segment_duration)
+                title_silence = AudioClip(make_frame=lambda t: [0, 0], duration=title_duration)
                 positioned_audio_clips.append(title_silence.set_start(0))
-                logger.info(f"タイトル用無音セグメント作成: 0.0s-{segment_duration:.2f}s")
-                
-            timings.append((0, segment_duration))
+                logger.info(f"タイトル用無音セグメント作成: 0.0s-{title_duration:.2f}s")
             
-            # 20個の音声ファイルを100秒全体に均等配置
-            for i, audio_file in enumerate(audio_files):
-                original_audio = AudioFileClip(audio_file)
+            # コメント音声を各区間に配置（音声のない末尾の無音区間は除く）
+            comment_segments = [segment for segment in timeline[1:] if segment.audio_file]
+            for i, segment in enumerate(comment_segments):
+                audio_file = segment.audio_file
+                original_audio = self._open_segment_audio(segment, f"audio[{i+1}]", audio_fps)
                 
-                # 各セグメントの開始時間を計算
-                segment_start = (i + 1) * segment_duration
-                segment_end = segment_start + segment_duration
+                segment_start = segment.start
+                segment_end = segment.end
+                segment_duration = segment.duration
                 
                 # 音声を必要に応じて調整
                 if original_audio.duration > segment_duration:
                     # 長い場合は切り詰め
-                    adjusted_audio = original_audio.subclip(0, segment_duration)
+                    adjusted_audio = self._track(original_audio.subclip(0, segment_duration), f"audio[{i+1}]_subclip")
                 else:
                     # 短い場合はそのまま使用
                     adjusted_audio = original_audio
@@ -615,75 +1419,87 @@ class VideoComposer:
                 positioned_audio = adjusted_audio.set_start(segment_start)
                 positioned_audio_clips.append(positioned_audio)
                 
-                # タイミング情報を記録
-                timings.append((segment_start, segment_end))
-                
                 logger.info(f"音声[{i+1}]配置: {audio_file} ({segment_start:.2f}s-{segment_end:.2f}s)")
-                # original_audio.close()  # 後でクリーンアップ
             
-            # 100秒の完全な音声トラックを作成
+            # タイムライン全体の音声トラックを作成
             from moviepy.editor import CompositeAudioClip
-            combined_audio = CompositeAudioClip(positioned_audio_clips).set_duration(TARGET_DURATION)
+            combined_audio = CompositeAudioClip(positioned_audio_clips).set_duration(total_duration)
             
-            logger.info(f"音声結合完了: 総時間 {combined_audio.duration:.2f}秒 (目標: {TARGET_DURATION}秒)")
-            logger.info(f"21個セグメント配置: タイトル1個 + コメント20個")
-            return combined_audio, timings
+            logger.info(f"音声結合完了: 総時間 {combined_audio.duration:.2f}秒")
+            logger.info(f"{len(comment_segments) + 1}個セグメント配置: タイトル1個 + コメント{len(comment_segments)}個")
+            return combined_audio
             
         except Exception as e:
             raise Exception(f"音声結合エラー: {str(e)}")
     
+    def _open_segment_audio(self, segment: TimelineSegment, label: str, audio_fps: int = DEFAULT_SAMPLE_RATE) -> AudioFileClip:
+        """セグメントの音声を開く（使用範囲があればサブクリップ、ゲインがあれば音量補正）"""
+        audio_clip = self._track(AudioFileClip(segment.audio_file, fps=audio_fps), label)
+        if segment.audio_start is not None:
+            audio_clip = self._track(audio_clip.subclip(segment.audio_start, segment.audio_end), f"{label}_subclip")
+        if segment.gain is not None:
+            audio_clip = self._track(audio_clip.volumex(segment.gain), f"{label}_gain")
+        return audio_clip
+    
+    def _find_title_audio_file(self, audio_files: List[str]) -> Optional[str]:
+        """タイトル音声ファイルを音声マニフェストから取得（見つからなければ最初のコメント音声）"""
+        if not audio_files:
+            return None
+        
+        audio_dir = os.path.dirname(audio_files[0]) or '.'
+        title_audio_file = None
+        if os.path.isdir(audio_dir):
+            manifest = get_audio_manifest(audio_dir)
+            # テーマ番号はファイル名の theme{N} から（判別できなければテーマ1）
+            theme_num = manifest.theme_of(audio_files[0]) or 1
+            title_audio_file = manifest.title_for(theme_num)
+        
+        if not title_audio_file:
+            # フォールバック: 最初のコメント音声をタイトルに流用
+            title_audio_file = audio_files[0]
+            logger.warning(f"タイトル音声未発見、フォールバック使用: {title_audio_file}")
+        
+        return title_audio_file
+    
     def _prepare_title_and_subtitles(
         self,
         theme_name: str,
-        subtitle_images: List[str], 
-        texts: List[str], 
-        timings: List[Tuple[float, float]],
+        texts: List[str],
+        timeline: Timeline,
         settings: Dict[str, Any]
     ) -> List[ImageClip]:
-        """タイトル + 複数の吹き出し字幕を準備（計21個）"""
+        """
+        タイトル + 複数の吹き出し字幕を準備（計21個）
+
+        表示区間・字幕画像・位置はタイムラインのセグメント（_build_theme_timeline で確定済み）から取る。
+
+        Args:
+            theme_name: タイトル吹き出しの文字列
+            texts: コメントの文字列（字幕画像がない場合のテキスト字幕用）
+            timeline: テーマ動画のタイムライン（先頭がタイトル）
+            settings: ジョブの設定
+
+        Returns:
+            List[ImageClip]: 表示開始時刻・位置を設定した字幕クリップ
+        """
         subtitle_clips = []
         
         try:
-            for i, (start_time, end_time) in enumerate(timings):
-                duration = end_time - start_time
-                
-                if i == 0:
-                    # 最初はタイトル吹き出し
-                    text = theme_name
-                    logger.info(f"タイトル吹き出し準備: '{text}' ({start_time:.1f}s-{end_time:.1f}s)")
-                    
-                    # タイトル専用の大きな吹き出しを画面中央に配置
-                    subtitle_clip = self._create_title_subtitle(text, duration, settings)
-                    if subtitle_clip is not None:
-                        subtitle_clip = subtitle_clip.set_start(start_time)
-                        subtitle_clip = subtitle_clip.set_position('center')
-                        subtitle_clips.append(subtitle_clip)
-                        
-                else:
-                    # 2番目以降はコメント吹き出し
-                    comment_index = i - 1  # タイトルを除くインデックス
-                    text = texts[comment_index] if comment_index < len(texts) else f"コメント{comment_index + 1}"
-                    subtitle_image = subtitle_images[comment_index] if comment_index < len(subtitle_images) else None
-                    
-                    subtitle_clip = self._prepare_subtitle(
-                        subtitle_image, 
-                        text, 
-                        duration, 
-                        settings
-                    )
-                    
-                    if subtitle_clip is not None:
-                        # 表示タイミングを設定
-                        subtitle_clip = subtitle_clip.set_start(start_time)
-                        
-                        # コメント吹き出し位置の自動配置（重複回避）
-                        position = self._calculate_comment_subtitle_position(comment_index, len(timings) - 1, settings)
-                        subtitle_clip = subtitle_clip.set_position(position)
-                        
-                        subtitle_clips.append(subtitle_clip)
-                        logger.info(f"吹き出し[{comment_index + 1}]準備完了: {start_time:.1f}s-{end_time:.1f}s")
+            title_segment = timeline[0]
+            logger.info(f"タイトル吹き出し準備: '{theme_name}' ({title_segment.start:.1f}s-{title_segment.end:.1f}s)")
+            
+            # タイトル専用の大きな吹き出しを画面中央に配置
+            title_clip = self._create_title_subtitle(theme_name, title_segment.duration, settings)
+            if title_clip is not None:
+                subtitle_clips.append(title_clip.set_start(title_segment.start).set_position('center'))
             
-            logger.info(f"全吹き出し準備完了: {len(subtitle_clips)}個 (タイトル1個 + コメント{len(subtitle_clips) - 1}個)")
+            # 2番目以降はコメント吹き出し（音声のない末尾の無音区間は除く）
+            comment_segments = [segment for segment in timeline[1:] if segment.audio_file]
+            subtitle_clips.extend(self._prepare_multiple_subtitles(texts, comment_segments, settings))
+            
+            title_count = 1 if title_clip is not None else 0
+            logger.info(f"全吹き出し準備完了: {len(subtitle_clips)}個 "
+                        f"(タイトル{title_count}個 + コメント{len(subtitle_clips) - title_count}個)")
             return subtitle_clips
             
         except Exception as e:
@@ -691,41 +1507,44 @@ class VideoComposer:
     
     def _prepare_multiple_subtitles(
         self, 
-        subtitle_images: List[str], 
         texts: List[str], 
-        timings: List[Tuple[float, float]],
+        segments: Sequence[TimelineSegment],
         settings: Dict[str, Any]
     ) -> List[ImageClip]:
-        """複数の吹き出し字幕を準備"""
+        """
+        複数の吹き出し字幕を準備
+
+        Args:
+            texts: 各セグメントの文字列（字幕画像がない場合のテキスト字幕用）
+            segments: 吹き出しを表示するセグメント（字幕画像・位置は確定済み）
+            settings: ジョブの設定
+
+        Returns:
+            List[ImageClip]: 表示開始時刻・位置を設定した字幕クリップ
+        """
         subtitle_clips = []
         
         try:
-            for i, (start_time, end_time) in enumerate(timings):
-                duration = end_time - start_time
-                
+            for i, segment in enumerate(segments):
                 # 字幕画像または文字による字幕作成
-                subtitle_image = subtitle_images[i] if i < len(subtitle_images) else None
                 text = texts[i] if i < len(texts) else f"コメント{i+1}"
                 
                 subtitle_clip = self._prepare_subtitle(
-                    subtitle_image, 
+                    segment.subtitle_image, 
                     text, 
-                    duration, 
+                    segment.duration, 
                     settings
                 )
                 
                 if subtitle_clip is not None:
-                    # 表示タイミングを設定
-                    subtitle_clip = subtitle_clip.set_start(start_time)
-                    
-                    # 吹き出し位置の自動配置（重複回避）
-                    position = self._calculate_subtitle_position(i, len(timings), settings)
-                    subtitle_clip = subtitle_clip.set_position(position)
+                    # 表示タイミングと吹き出し位置（重複回避済みの配置表）を設定
+                    subtitle_clip = subtitle_clip.set_start(segment.start)
+                    if segment.position is not None:
+                        subtitle_clip = subtitle_clip.set_position(segment.position)
                     
                     subtitle_clips.append(subtitle_clip)
-                    logger.info(f"吹き出し[{i+1}]準備完了: {start_time:.1f}s-{end_time:.1f}s")
+                    logger.info(f"吹き出し[{i+1}]準備完了: {segment.start:.1f}s-{segment.end:.1f}s")
             
-            logger.info(f"全吹き出し準備完了: {len(subtitle_clips)}個")
             return subtitle_clips
             
         except Exception as e:
@@ -750,61 +1569,16 @@ class VideoComposer:
             logger.warning(f"タイトル字幕作成失敗: {str(e)}")
             return None
     
-    def _calculate_comment_subtitle_position(
-        self, 
-        index: int, 
-        total_count: int, 
-        settings: Dict[str, Any]
-    ) -> Tuple[int, int]:
-        """コメント吹き出し位置の自動計算（重複回避）"""
-        # 画面を格子状に分割して配置（20個のコメント用）
-        cols = 4  # 横4列
-        rows = 5  # 縦5行（20個を収容）
-        
-        col = index % cols
-        row = (index // cols) % rows
-        
-        # 画面解像度
-        screen_width, screen_height = self.default_settings["video"]["resolution"]
-        
-        # セクション サイズ
-        section_width = screen_width // cols
-        section_height = screen_height // rows
-        
-        # 位置計算（中央寄せ）
-        x = col * section_width + section_width // 4
-        y = row * section_height + section_height // 4
-        
-        logger.info(f"コメント吹き出し[{index+1}]位置: ({x}, {y})")
-        return (x, y)
-    
-    def _calculate_subtitle_position(
-        self, 
-        index: int, 
-        total_count: int, 
-        settings: Dict[str, Any]
-    ) -> Tuple[int, int]:
-        """吹き出し位置の自動計算（重複回避）"""
-        # 画面を格子状に分割して配置
-        cols = 3  # 横3列
-        rows = 7  # 縦7行（20個を収容）
-        
-        col = index % cols
-        row = (index // cols) % rows
-        
-        # 画面解像度
-        screen_width, screen_height = self.default_settings["video"]["resolution"]
-        
-        # セクション サイズ
-        section_width = screen_width // cols
-        section_height = screen_height // rows
-        
-        # 位置計算（中央寄せ）
-        x = col * section_width + section_width // 4
-        y = row * section_height + section_height // 4
-        
-        logger.info(f"吹き出し[{index+1}]位置: ({x}, {y})")
-        return (x, y)
+    def _bubble_positions(
+        self,
+        subtitle_images: List[Optional[str]],
+        count: int,
+        settings: Dict[str, Any],
+        template: str
+    ) -> Tuple[Tuple[int, int], ...]:
+        """吹き出しの配置表（ジョブの解像度と実際の画像サイズから、重なりを避けて1回だけ計算）"""
+        resolution = settings.get("video", {}).get("resolution", self.default_settings["video"]["resolution"])
+        return compute_bubble_layout(resolution, subtitle_images, count, template)
     
     def _compose_theme_final_video(
         self,
@@ -846,11 +1620,24 @@ class VideoComposer:
             logger.error(f"動画情報取得エラー: {str(e)}")
             return {}
 
+def _compose_batch_job_in_worker(config: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any], Optional[str]]:
+    """ワーカープロセス用のバッチジョブ実行（pickle可能なモジュール関数）"""
+    return VideoComposer()._compose_batch_job(config)
+
+def _compose_queue_job_in_worker(
+    kind: str,
+    config: Dict[str, Any]
+) -> Tuple[Optional[str], Dict[str, Any], Optional[str], List[str], List[str]]:
+    """ワーカープロセス用のキュージョブ実行（pickle可能なモジュール関数）"""
+    return VideoComposer()._compose_queue_job(kind, config)
+
 def main():
     """メイン関数 - コマンドライン実行用"""
     if len(sys.argv) < 2:
         print("使用方法: python video_composer.py <config_json>")
-        print("または: python video_composer.py <configs_json> --batch")
+        print("または: python video_composer.py <configs_json> --batch [--workers N]")
+        print("または: python video_composer.py <configs_json> --queue <db> [--batch-name NAME] [--kind single|theme] [--workers N] [--retry-failed]")
+        print("または: python video_composer.py <configs_json> --farm <shared_dir> [--lease SECONDS] [--batch-name NAME] [--kind single|theme] [--workers N] [--retry-failed]")
         sys.exit(1)
     
     try:
@@ -859,17 +1646,55 @@ def main():
         
         composer = VideoComposer()
         
-        if len(sys.argv) > 2 and sys.argv[2] == "--batch":
+        if len(sys.argv) > 3 and sys.argv[2] in ("--queue", "--farm"):
+            # 永続キュー（--farm は共有ディレクトリ）経由のバッチ処理（登録済みのジョブは追加しない、"[]" なら処理のみ）
+            configs = json.loads(config_json)
+            batch = sys.argv[sys.argv.index("--batch-name") + 1] if "--batch-name" in sys.argv else None
+            kind = sys.argv[sys.argv.index("--kind") + 1] if "--kind" in sys.argv else "single"
+            max_workers = 1
+            if "--workers" in sys.argv:
+                max_workers = int(sys.argv[sys.argv.index("--workers") + 1])
+            if sys.argv[2] == "--farm":
+                lease_seconds = float(sys.argv[sys.argv.index("--lease") + 1]) if "--lease" in sys.argv else DEFAULT_LEASE_SECONDS
+                queue = FarmQueue(sys.argv[3], lease_seconds=lease_seconds)
+            else:
+                queue = RenderJobQueue(sys.argv[3])
+            with queue:
+                if configs:
+                    queue.enqueue(configs, batch=batch or "default", kind=kind)
+                if "--retry-failed" in sys.argv:
+                    queue.retry_failed(batch)
+                summary = composer.consume_job_queue(queue, batch=batch, max_workers=max_workers)
+                jobs = queue.jobs(batch)
+
+            output = {
+                "success": summary["failed"] == 0,
+                "summary": summary,
+                "jobs": [
+                    {key: job[key] for key in ("id", "batch", "output_path", "state", "attempts",
+                                               "duration", "output_paths", "captures", "error")}
+                    for job in jobs
+                ],
+                "backpressure_events": composer.backpressure_events
+            }
+            print(json.dumps(output, ensure_ascii=False))
+
+        elif len(sys.argv) > 2 and sys.argv[2] == "--batch":
             # バッチ処理
             configs = json.loads(config_json)
-            results = composer.compose_batch_videos(configs)
+            max_workers = 1
+            if "--workers" in sys.argv:
+                max_workers = int(sys.argv[sys.argv.index("--workers") + 1])
+            results = composer.compose_batch_videos(configs, max_workers=max_workers)
             
             # 結果をJSON形式で出力
             output = {
                 "success": True,
                 "results": results,
                 "total": len(configs),
-                "success_count": sum(1 for r in results if r is not None)
+                "success_count": sum(1 for r in results if r is not None),
+                "performance": composer.batch_performance_reports,
+                "backpressure_events": composer.backpressure_events
             }
             print(json.dumps(output))
             
@@ -881,7 +1706,10 @@ def main():
             # 結果をJSON形式で出力
             output = {
                 "success": True,
-                "output_path": result
+                "output_path": result,
+                "output_paths": composer.last_output_paths,
+                "captures": composer.last_capture_paths,
+                "performance": composer.last_performance_report
             }
             print(json.dumps(output))
     
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+YUV420p のままの合成経路
+
+背景動画をffmpegから yuv420p の生フレームとして読み、字幕画像は一度だけ
+YUV + アルファ（色差は2x2平均）へ変換しておき、YUV平面上で合成して
+yuv420p のままエンコーダへ渡す。RGBへの展開と再変換を省き、1フレームあたりの
+転送量はRGB24の半分（W x H x 1.5 バイト）になる。
+
+色変換はlibx264がRGB入力に使うものと同じ BT.601 リミテッドレンジ。
+色差が2x2単位のため、字幕の配置座標は偶数に丸める。
+"""
+
+import logging
+import subprocess
+from typing import List, Optional, Tuple
+
+import numpy as np
+from moviepy.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# BT.601 リミテッドレンジ（RGB 0-255 → Y 16-235, U/V 16-240）
+_RGB_TO_YUV = np.array([
+    [65.481, 128.553, 24.966],
+    [-37.797, -74.203, 112.0],
+    [112.0, -93.786, -18.214]
+], dtype=np.float32) / 255.0
+_YUV_OFFSET = np.array([16.0, 128.0, 128.0], dtype=np.float32)
+_YUV_TO_RGB = np.linalg.inv(_RGB_TO_YUV).astype(np.float32)
+
+
+def rgb_to_yuv(rgb: np.ndarray) -> np.ndarray:
+    """RGB（H x W x 3）を Y, U, V（H x W x 3、float32）へ変換"""
+    return np.asarray(rgb, dtype=np.float32) @ _RGB_TO_YUV.T + _YUV_OFFSET
+
+
+def yuv_frame_to_rgb(frame: "YuvFrame") -> np.ndarray:
+    """yuv420p フレームをRGB（uint8、H x W x 3）へ変換（サムネイル等、少数フレーム用）"""
+    chroma = frame.uv.repeat(2, axis=1).repeat(2, axis=2)
+    yuv = np.stack([frame.y, chroma[0], chroma[1]], axis=-1).astype(np.float32) - _YUV_OFFSET
+    rgb = yuv @ _YUV_TO_RGB.T
+    return np.clip(rgb + 0.5, 0, 255).astype(np.uint8)
+
+
+def _downsample_2x2(plane: np.ndarray) -> np.ndarray:
+    """2x2ブロック平均（縦横とも偶数サイズ前提）"""
+    height, width = plane.shape[:2]
+    return plane.reshape(height // 2, 2, width // 2, 2, *plane.shape[2:]).mean(axis=(1, 3))
+
+
+class YuvOverlay:
+    """YUV420p用に変換済みの字幕画像（乗算済み、アルファは輝度・色差の解像度ごと）"""
+
+    __slots__ = ("y", "y_alpha", "uv", "uv_alpha", "size", "nbytes")
+
+    def __init__(self, premultiplied_rgb: np.ndarray, alpha: np.ndarray):
+        """
+        Args:
+            premultiplied_rgb: 乗算済みRGB（H x W x 3、0-255）
+            alpha: 不透明度（H x W x 1、0-1）
+        """
+        height, width = alpha.shape[:2]
+        even_h, even_w = height + height % 2, width + width % 2
+
+        # 乗算済みのまま色変換する（オフセット項もアルファ倍）
+        yuv = np.asarray(premultiplied_rgb, dtype=np.float32) @ _RGB_TO_YUV.T + alpha * _YUV_OFFSET
+        padded = np.zeros((even_h, even_w, 3), dtype=np.float32)
+        padded[:height, :width] = yuv
+        padded_alpha = np.zeros((even_h, even_w, 1), dtype=np.float32)
+        padded_alpha[:height, :width] = alpha
+
+        self.y = np.ascontiguousarray(padded[:, :, 0])
+        self.y_alpha = np.ascontiguousarray(padded_alpha[:, :, 0])
+        chroma = _downsample_2x2(padded[:, :, 1:])
+        self.uv = np.ascontiguousarray(np.moveaxis(chroma, 2, 0))        # (2, H/2, W/2)
+        self.uv_alpha = np.ascontiguousarray(_downsample_2x2(padded_alpha[:, :, 0]))
+        for array in (self.y, self.y_alpha, self.uv, self.uv_alpha):
+            array.flags.writeable = False
+        self.size = (even_w, even_h)
+        self.nbytes = self.y.nbytes + self.y_alpha.nbytes + self.uv.nbytes + self.uv_alpha.nbytes
+
+
+class YuvFrame:
+    """1フレーム分の yuv420p バッファ（Y, U, V 平面は連続領域のビュー）"""
+
+    def __init__(self, width: int, height: int):
+        if width % 2 or height % 2:
+            raise ValueError(f"yuv420p の解像度は偶数である必要があります: {width}x{height}")
+        self.width = width
+        self.height = height
+        luma = width * height
+        self.buffer = np.empty(luma * 3 // 2, dtype=np.uint8)
+        self.y = self.buffer[:luma].reshape(height, width)
+        self.uv = self.buffer[luma:].reshape(2, height // 2, width // 2)
+
+    def fill(self, color_yuv: Tuple[int, int, int]) -> None:
+        """単色で塗りつぶす"""
+        self.y.fill(color_yuv[0])
+        self.uv[0].fill(color_yuv[1])
+        self.uv[1].fill(color_yuv[2])
+
+
+def _blend_plane(plane: np.ndarray, source: np.ndarray, alpha: np.ndarray, x: int, y: int, fade: float) -> None:
+    """乗算済みの平面を上書き合成（画面外ははみ出し分を切り捨て）"""
+    height, width = alpha.shape
+    frame_h, frame_w = plane.shape[-2:]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, frame_w), min(y + height, frame_h)
+    if x0 >= x1 or y0 >= y1:
+        return
+    src = source[..., y0 - y:y1 - y, x0 - x:x1 - x]
+    src_alpha = alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+    region = plane[..., y0:y1, x0:x1]
+    # 四捨五入して0-255に収めてから uint8 へ（代入時の暗黙の切り捨て・オーバーフローを避ける）
+    blended = region * (1.0 - fade * src_alpha) + fade * src + 0.5
+    np.copyto(region, np.clip(blended, 0, 255), casting="unsafe")
+
+
+def blend_yuv_overlay(frame: YuvFrame, overlay: YuvOverlay, position: Tuple[int, int], fade: float) -> None:
+    """
+    YUV平面上で字幕を合成
+
+    Args:
+        frame: 合成先フレーム
+        overlay: YUV変換済みの字幕
+        position: 左上座標（偶数に丸める）
+        fade: フェード係数（0-1）
+    """
+    if fade <= 0:
+        return
+    x, y = position[0] & ~1, position[1] & ~1
+    _blend_plane(frame.y, overlay.y, overlay.y_alpha, x, y, fade)
+    _blend_plane(frame.uv, overlay.uv, overlay.uv_alpha, x // 2, y // 2, fade)
+
+
+class YuvBackgroundReader:
+    """背景動画を yuv420p の生フレームとして順番に読む（終端に達したら先頭からループ）"""
+
+    def __init__(self, path: str, size: Tuple[int, int], fps: float, start_time: float = 0.0):
+        """
+        Args:
+            path: 背景動画パス
+            size: 出力解像度（背景と異なればffmpeg側で拡縮）
+            fps: 出力フレームレート（背景のフレームレートから変換）
+            start_time: 読み始める時刻（背景動画内の秒）
+        """
+        cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error",
+               "-stream_loop", "-1", "-ss", f"{start_time:.6f}", "-i", path,
+               "-an", "-vf", f"fps={fps},scale={size[0]}:{size[1]}",
+               "-f", "rawvideo", "-pix_fmt", "yuv420p", "-"]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+
+    def read_into(self, frame: YuvFrame) -> None:
+        """次のフレームを frame のバッファへ直接読み込む"""
+        view = memoryview(frame.buffer)
+        filled = 0
+        while filled < len(view):
+            count = self.proc.stdout.readinto(view[filled:])
+            if not count:
+                raise IOError("背景動画のYUVフレーム読み込みに失敗しました")
+            filled += count
+
+    def close(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.stdout.close()
+        self.proc.wait()
+
+
+class YuvFrameWriter:
+    """yuv420p の生フレームをそのままffmpegへ渡してエンコード"""
+
+    def __init__(
+        self,
+        output_path: str,
+        size: Tuple[int, int],
+        fps: float,
+        codec: str = "libx264",
+        audiofile: Optional[str] = None,
+        bitrate: Optional[str] = None,
+        preset: str = "medium",
+        threads: Optional[int] = None
+    ):
+        cmd: List[str] = [
+            get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo",
+            "-s", f"{size[0]}x{size[1]}", "-pix_fmt", "yuv420p", "-r", f"{fps:.02f}",
+            "-an", "-i", "-"
+        ]
+        if audiofile is not None:
+            cmd.extend(["-i", audiofile, "-acodec", "copy"])
+        cmd.extend(["-vcodec", codec, "-preset", preset])
+        if bitrate is not None:
+            cmd.extend(["-b", bitrate])
+        if threads is not None:
+            cmd.extend(["-threads", str(threads)])
+        cmd.extend(["-pix_fmt", "yuv420p", output_path])
+        self.output_path = output_path
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def write_frame(self, buffer: np.ndarray) -> None:
+        """フレームバッファ（YuvFrame.buffer）を複製せずに書き出す"""
+        try:
+            self.proc.stdin.write(memoryview(buffer))
+        except IOError as e:
+            _, ffmpeg_error = self.proc.communicate()
+            raise IOError(f"{str(e)}\nffmpegエラー（{self.output_path}）: {ffmpeg_error.decode(errors='replace')}")
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        ffmpeg_error = self.proc.stderr.read()
+        self.proc.wait()
+        if self.proc.returncode:
+            raise IOError(f"ffmpegエラー（{self.output_path}）: {ffmpeg_error.decode(errors='replace')}")
+
+
+def solid_color_yuv(rgb: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    """単色背景のYUV値"""
+    yuv = rgb_to_yuv(np.array(rgb, dtype=np.float32))
+    return tuple(int(round(float(value))) for value in yuv)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+フレーム書き出しのマイクロベンチマーク
+
+背景 + 字幕画像（マスク付き）の CompositeVideoClip について、
+MoviePy の書き出し経路（get_frame → uint8変換 → tobytes）と
+python/frame_writer.py の事前確保バッファ経路（composite_into → memoryview）を比較し、
+ホットループ中のメモリ確保ピーク（tracemalloc）とfpsを表示する。
+エンコード時間を除くため、書き出し先は /dev/null とする。
+
+使い方:
+    python scripts/frame_writer_benchmark.py [フレーム数] [幅] [高さ]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "python"))
+
+from moviepy.editor import ColorClip, CompositeVideoClip, ImageClip  # noqa: E402
+from frame_writer import BlendScratch, composite_into  # noqa: E402
+
+
+def build_clip(width: int, height: int, duration: float) -> CompositeVideoClip:
+    """ベンチマーク用の合成クリップ（緑背景 + 下部の半透明字幕）"""
+    background = ColorClip(size=(width, height), color=(34, 139, 34), duration=duration)
+    subtitle_h = max(2, height // 5)
+    # 左半分は白、右半分は黒（背景より暗い画素も含めて合成結果を比較する）
+    rgb = np.full((subtitle_h, width, 3), 255, dtype=np.uint8)
+    rgb[:, width // 2:] = 0
+    alpha = np.tile(np.linspace(0.0, 1.0, width, dtype=np.float64), (subtitle_h, 1))
+    mask = ImageClip(alpha, ismask=True, duration=duration)
+    subtitle = ImageClip(rgb, duration=duration).set_mask(mask).set_position("bottom")
+    return CompositeVideoClip([background, subtitle])
+
+
+def run_moviepy(clip, sink, frames: int, fps: int, state=None):
+    for n in range(frames):
+        frame = clip.get_frame(n / fps).astype("uint8")
+        sink.write(frame.tobytes())
+
+
+def buffered_state(clip):
+    """事前確保するフレームバッファと作業バッファ"""
+    width, height = clip.size
+    return np.zeros((height, width, 3), dtype=np.uint8), BlendScratch()
+
+
+def run_buffered(clip, sink, frames: int, fps: int, state=None):
+    buffer, scratch = state
+    for n in range(frames):
+        composite_into(buffer, scratch, clip, n / fps)
+        sink.write(memoryview(buffer))
+
+
+def measure(name: str, func, clip, frames: int, fps: int, state=None) -> dict:
+    """fpsとメモリ確保ピークを計測（事前確保・ウォームアップ分は含めない）"""
+    with open(os.devnull, "wb", buffering=0) as sink:
+        func(clip, sink, 3, fps, state)  # ウォームアップ（ImageClipのフレームキャッシュ、作業バッファ確保等）
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        func(clip, sink, frames, fps, state)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "name": name,
+        "fps": frames / elapsed,
+        "peak_mb": peak / (1024 * 1024)
+    }
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 1920
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 1080
+    fps = 30
+    clip = build_clip(width, height, frames / fps + 1)
+
+    print(f"フレーム書き出しベンチマーク: {width}x{height} x {frames}フレーム")
+    results = []
+    for name, func, state in (("moviepy", run_moviepy, None),
+                              ("buffered", run_buffered, buffered_state(clip))):
+        result = measure(name, func, clip, frames, fps, state)
+        result["frame_mb"] = width * height * 3 / (1024 * 1024)
+        results.append(result)
+        print(f"  {name:9s}: {result['fps']:7.1f} fps  確保ピーク {result['peak_mb']:6.1f}MB "
+              f"(1フレーム {result['frame_mb']:.1f}MB)")
+
+    # MoviePyと同じフレームが得られることを確認
+    buffer, scratch = buffered_state(clip)
+    composite_into(buffer, scratch, clip, 0.5)
+    reference = clip.get_frame(0.5).astype("uint8")
+    max_diff = int(np.abs(buffer.astype(np.int16) - reference.astype(np.int16)).max())
+    print(f"  出力差分（最大）: {max_diff}")
+
+    speedup = results[1]["fps"] / results[0]["fps"]
+    print(f"  速度比: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
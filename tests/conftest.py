@@ -0,0 +1,52 @@
+"""pytest 共通設定（python/ のモジュールを python.<module> として読み込めるようにする）"""
+
+import sys
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture
+def make_wav(tmp_path):
+    """指定した長さ・レートのステレオWAVを作成する関数（samples を渡せば内容も指定できる）"""
+
+    def _make_wav(name, duration=1.0, sample_rate=24000, samples=None):
+        path = tmp_path / name
+        if samples is None:
+            samples = np.zeros((int(round(duration * sample_rate)), 2), dtype=np.float32)
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+        with wave.open(str(path), "wb") as wav_file:
+            wav_file.setnchannels(pcm.shape[1])
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(pcm.tobytes())
+        return str(path)
+
+    return _make_wav
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """単色の短い動画を作成する関数（audio_rate を渡せばそのレートの音声トラックも付ける）"""
+
+    def _make_video(name, duration=0.4, size=(32, 24), fps=10, audio_rate=None):
+        from moviepy.audio.AudioClip import AudioArrayClip
+        from moviepy.editor import ColorClip
+
+        path = str(tmp_path / name)
+        clip = ColorClip(size, color=(0, 0, 255), duration=duration)
+        if audio_rate is not None:
+            tone = 0.2 * np.sin(np.linspace(0, 2 * np.pi * 220 * duration, int(duration * audio_rate)))
+            clip = clip.set_audio(AudioArrayClip(np.stack([tone, tone], axis=1), fps=audio_rate))
+        clip.write_videofile(path, fps=fps, codec="libx264", audio_codec="aac", audio_fps=audio_rate or 44100,
+                             audio=audio_rate is not None, logger=None)
+        clip.close()
+        return path
+
+    return _make_video
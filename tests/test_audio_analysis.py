@@ -0,0 +1,143 @@
+"""audio_analysis の音声解析（無音検出・サンプリングレート決定・ラウドネス・キャッシュ）のテスト"""
+
+import numpy as np
+import pytest
+
+from python.audio_analysis import (
+    DEFAULT_SAMPLE_RATE, AudioAnalysisCache, AudioAnalyzer, detect_silence_bounds, measure_loudness,
+    negotiate_sample_rate, normalization_gain, probe_sample_rate, read_pcm, resample_pcm
+)
+
+RATE = 24000
+
+
+def voiced(silence_before, voice, silence_after, amplitude=0.5):
+    """前後に無音を置いた正弦波（ステレオ）"""
+    t = np.arange(int(voice * RATE)) / RATE
+    tone = amplitude * np.sin(2 * np.pi * 440 * t)
+    mono = np.concatenate([np.zeros(int(silence_before * RATE)), tone, np.zeros(int(silence_after * RATE))])
+    return np.stack([mono, mono], axis=1).astype(np.float32)
+
+
+def test_detect_silence_bounds_trims_leading_and_trailing_silence():
+    start, end = detect_silence_bounds(voiced(0.5, 1.0, 0.3), RATE, padding=0.0)
+
+    assert start == pytest.approx(0.5, abs=0.02)
+    assert end == pytest.approx(1.5, abs=0.02)
+
+
+def test_detect_silence_bounds_keeps_padding_within_clip():
+    samples = voiced(0.02, 1.0, 0.5)
+
+    start, end = detect_silence_bounds(samples, RATE, padding=0.1)
+
+    assert start == 0.0
+    assert end == pytest.approx(1.12, abs=0.02)
+
+
+def test_detect_silence_bounds_respects_threshold():
+    samples = voiced(0.5, 1.0, 0.5, amplitude=0.001)  # 約 -63 dBFS
+
+    assert detect_silence_bounds(samples, RATE, threshold_db=-45.0) == (0.0, 2.0)
+    assert detect_silence_bounds(samples, RATE, threshold_db=-80.0, padding=0.0)[0] == pytest.approx(0.5, abs=0.02)
+
+
+def test_detect_silence_bounds_keeps_all_silent_and_short_clips():
+    assert detect_silence_bounds(np.zeros((RATE, 2), dtype=np.float32), RATE) == (0.0, 1.0)
+    assert detect_silence_bounds(np.ones((10, 2), dtype=np.float32), RATE) == (0.0, 10 / RATE)
+
+
+def test_trim_bounds_reads_wav_and_caches_result(make_wav, tmp_path):
+    path = make_wav("voice.wav", sample_rate=RATE, samples=voiced(0.4, 0.6, 0.4))
+    analyzer = AudioAnalyzer(str(tmp_path / "cache.json"))
+
+    bounds = analyzer.trim_bounds(path, {"padding": 0.0})
+
+    samples, sample_rate = read_pcm(path)
+    assert (samples.shape, sample_rate) == ((int(1.4 * RATE), 2), RATE)
+    assert bounds == detect_silence_bounds(samples, sample_rate, padding=0.0)
+    # 別インスタンスでもキャッシュファイルから同じ結果を取得する
+    cached = AudioAnalyzer(str(tmp_path / "cache.json")).cache.get(analyzer.cache.digest(path), "trim:-45.0:0.02:0.0")
+    assert tuple(cached) == bounds
+
+
+def test_negotiate_sample_rate_prefers_request_then_highest_input():
+    assert negotiate_sample_rate([24000, 48000], requested=44100) == 44100
+    assert negotiate_sample_rate([24000, None, 48000]) == 48000
+    assert negotiate_sample_rate([24000, 24000]) == 24000
+
+
+def test_negotiate_sample_rate_falls_back_without_known_rates():
+    assert negotiate_sample_rate([]) == DEFAULT_SAMPLE_RATE
+    assert negotiate_sample_rate([None]) == DEFAULT_SAMPLE_RATE
+
+
+def test_probe_sample_rate_reads_wav_header(make_wav):
+    assert probe_sample_rate(make_wav("voice.wav", 0.1, sample_rate=22050)) == 22050
+
+
+def test_resample_pcm_keeps_duration_and_tone():
+    samples = voiced(0.0, 1.0, 0.0)
+
+    resampled = resample_pcm(samples, RATE, 48000)
+
+    assert resampled.shape == (48000, 2)
+    # 440Hz の正弦波は再サンプリング後も 440Hz
+    spectrum = np.abs(np.fft.rfft(resampled[:, 0]))
+    assert np.argmax(spectrum) == 440
+    assert resample_pcm(samples, RATE, RATE) is samples
+
+
+def sine(frequency, amplitude, duration, sample_rate=48000):
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    mono = amplitude * np.sin(2 * np.pi * frequency * t)
+    return np.stack([mono, mono], axis=1)
+
+
+def test_measure_loudness_matches_bs1770_reference():
+    # BS.1770: 997Hz の正弦波は Kウェイティングの影響をほぼ受けず、両チャンネル -6dBFS で約 -6 LUFS
+    loudness = measure_loudness(sine(997, 0.5, 3.0), 48000)
+
+    assert loudness["integrated_lufs"] == pytest.approx(-6.02, abs=0.05)
+    assert loudness["peak_dbfs"] == pytest.approx(-6.02, abs=0.01)
+    # 片チャンネルのみなら約 3dB 小さい
+    assert measure_loudness(sine(997, 0.5, 3.0)[:, :1], 48000)["integrated_lufs"] == pytest.approx(-9.03, abs=0.05)
+
+
+def test_measure_loudness_of_silence():
+    loudness = measure_loudness(np.zeros((48000, 2)), 48000)
+
+    assert loudness == {"integrated_lufs": float("-inf"), "peak_dbfs": float("-inf")}
+    assert normalization_gain(loudness, -16.0, -1.0) == 1.0
+
+
+def test_normalization_gain_is_limited_by_peak():
+    quiet = {"integrated_lufs": -26.0, "peak_dbfs": -12.0}
+    loud_peak = {"integrated_lufs": -26.0, "peak_dbfs": -3.0}
+
+    assert normalization_gain(quiet, -16.0, -1.0) == pytest.approx(10 ** (10 / 20.0))
+    assert normalization_gain(loud_peak, -16.0, -1.0) == pytest.approx(10 ** (2 / 20.0))
+
+
+def test_cache_put_merges_entries_from_other_instances(tmp_path):
+    cache_path = str(tmp_path / "cache" / "analysis.json")
+    first, second = AudioAnalysisCache(cache_path), AudioAnalysisCache(cache_path)
+    assert first.get("a", "trim") is None
+
+    first.put("a", "trim", [0.1, 0.9])
+    second.put("b", "loudness", {"integrated_lufs": "-20.0"})
+    first.put("a", "loudness", {"integrated_lufs": "-18.0"})
+
+    # 後から保存したインスタンスも他インスタンスの結果を消さない
+    merged = AudioAnalysisCache(cache_path)
+    assert merged.get("a", "trim") == [0.1, 0.9]
+    assert merged.get("a", "loudness") == {"integrated_lufs": "-18.0"}
+    assert merged.get("b", "loudness") == {"integrated_lufs": "-20.0"}
+
+
+def test_loudness_is_cached_with_infinite_values(make_wav, tmp_path):
+    path = make_wav("silent.wav", 0.5)
+    analyzer = AudioAnalyzer(str(tmp_path / "cache.json"))
+
+    assert analyzer.loudness(path)["integrated_lufs"] == float("-inf")
+    assert AudioAnalyzer(str(tmp_path / "cache.json")).loudness(path) == analyzer.loudness(path)
@@ -0,0 +1,88 @@
+"""audio_manifest の音声索引（ファイル名の解析・コメント順・タイトル音声・更新時刻によるキャッシュ）のテスト"""
+
+import os
+
+import pytest
+
+from python.audio_manifest import get_audio_manifest, parse_comment_filename
+
+DATE = "2025-09-12"
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    directory = tmp_path / f"nanj-{DATE}"
+    directory.mkdir()
+    for theme, comment, speaker in [(1, 10, "zundamon"), (1, 2, "metan"), (1, 1, "tsumugi"), (2, 1, "zundamon")]:
+        (directory / f"theme{theme}_comment{comment}_{speaker}-normal_{DATE}.wav").touch()
+    for name in ("title_shushin_fail.wav", "notes.txt", "theme1_comment3.wav"):
+        (directory / name).touch()
+    return directory
+
+
+def touch_dir(directory, offset_ns):
+    """ディレクトリの更新時刻を確実に変える（ファイルシステムの時刻精度に依存しない）"""
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset_ns))
+
+
+@pytest.mark.parametrize("filename, expected", [
+    (f"theme3_comment12_zundamon-sasayaki_{DATE}.wav",
+     {"theme": 3, "comment": 12, "speaker": "zundamon", "style": "sasayaki", "date": DATE}),
+    (f"topic1_comment2_metan-normal_{DATE}.wav",
+     {"theme": 1, "comment": 2, "speaker": "metan", "style": "normal", "date": DATE}),
+    ("theme1_comment1.wav", None),
+    (f"theme1_comment1_zundamon_{DATE}.wav", None),
+    (f"theme1_comment1_zundamon-normal_{DATE}.mp3", None),
+    ("title_gekiteki.wav", None),
+])
+def test_parse_comment_filename(filename, expected):
+    assert parse_comment_filename(filename) == expected
+
+
+def test_comments_are_ordered_by_number(audio_dir):
+    manifest = get_audio_manifest(str(audio_dir))
+
+    names = [os.path.basename(path) for path in manifest.comment_files(1)]
+    assert names == [f"theme1_comment1_tsumugi-normal_{DATE}.wav", f"theme1_comment2_metan-normal_{DATE}.wav",
+                     f"theme1_comment10_zundamon-normal_{DATE}.wav"]
+    assert manifest.comment_files(9) == []
+    entry = manifest.entry_for(os.path.join(str(audio_dir), names[1]))
+    assert (entry["theme"], entry["comment"], entry["speaker"], entry["style"]) == (1, 2, "metan", "normal")
+
+
+def test_title_prefers_theme_file_and_falls_back(audio_dir):
+    (audio_dir / "title_gekiteki.wav").touch()
+    manifest = get_audio_manifest(str(audio_dir))
+
+    assert os.path.basename(manifest.title_for(1)) == "title_gekiteki.wav"
+    assert os.path.basename(manifest.title_for(2)) == "title_shushin_fail.wav"
+    # 固有のタイトルがないテーマは最初の title_*.wav
+    assert os.path.basename(manifest.title_for(7)) == "title_gekiteki.wav"
+
+    for name in ("title_gekiteki.wav", "title_shushin_fail.wav"):
+        (audio_dir / name).unlink()
+    touch_dir(audio_dir, 10**9)
+    assert get_audio_manifest(str(audio_dir)).title_for(1) is None
+
+
+def test_theme_of_falls_back_to_filename(audio_dir, tmp_path):
+    manifest = get_audio_manifest(str(audio_dir))
+
+    assert manifest.theme_of(str(audio_dir / f"theme2_comment1_zundamon-normal_{DATE}.wav")) == 2
+    assert manifest.theme_of(str(tmp_path / f"theme5_comment1_zundamon-normal_{DATE}.wav")) == 5
+    assert manifest.theme_of(str(tmp_path / "other.wav")) is None
+
+
+def test_manifest_is_cached_until_directory_mtime_changes(audio_dir):
+    first = get_audio_manifest(str(audio_dir))
+    assert get_audio_manifest(str(audio_dir) + os.sep) is first
+
+    (audio_dir / f"theme2_comment2_metan-normal_{DATE}.wav").touch()
+    touch_dir(audio_dir, 10**9)
+    rebuilt = get_audio_manifest(str(audio_dir))
+
+    assert rebuilt is not first
+    assert len(rebuilt.comment_files(2)) == 2
+    assert len(first.comment_files(2)) == 1
+    assert get_audio_manifest(str(audio_dir)) is rebuilt
@@ -0,0 +1,79 @@
+"""bubble_layout の吹き出しレイアウト表のテスト"""
+
+import pytest
+from PIL import Image
+
+from python.bubble_layout import LAYOUT_TEMPLATES, _compute_layout, compute_bubble_layout, probe_image_size
+
+RESOLUTION = (1920, 1080)
+
+
+def make_image(tmp_path, name, size):
+    path = tmp_path / name
+    Image.new("RGBA", size).save(path)
+    return str(path)
+
+
+def boxes_overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def test_probe_image_size(tmp_path):
+    assert probe_image_size(make_image(tmp_path, "a.png", (300, 120))) == (300, 120)
+    assert probe_image_size(None) is None
+    assert probe_image_size(str(tmp_path / "missing.png")) is None
+
+
+def test_layout_follows_grid_without_overlap(tmp_path):
+    images = [make_image(tmp_path, f"{i}.png", (300, 120)) for i in range(8)]
+
+    positions = compute_bubble_layout(RESOLUTION, images)
+
+    spec = LAYOUT_TEMPLATES["comment_grid"]
+    cell_width, cell_height = RESOLUTION[0] / spec["cols"], RESOLUTION[1] / spec["rows"]
+    # 小さい吹き出しは各セルの基準点にそのまま置かれる
+    assert positions[0] == (round(0.25 * cell_width), round(0.25 * cell_height))
+    assert positions[5] == (round(1.25 * cell_width), round(1.25 * cell_height))
+    boxes = [(x, y, x + 300, y + 120) for x, y in positions]
+    for index, box in enumerate(boxes):
+        for previous in boxes[max(0, index - spec["window"]):index]:
+            assert not boxes_overlap(box, previous)
+
+
+def test_layout_keeps_bubbles_on_screen(tmp_path):
+    wide = make_image(tmp_path, "wide.png", (900, 200))
+    huge = make_image(tmp_path, "huge.png", (2000, 300))
+
+    positions = compute_bubble_layout(RESOLUTION, [wide] * 4 + [huge])
+
+    margin = round(RESOLUTION[0] * LAYOUT_TEMPLATES["comment_grid"]["margin"])
+    for x, _ in positions[:4]:
+        assert margin <= x <= RESOLUTION[0] - 900 - margin
+    # 画面より大きい吹き出しは中央寄せ
+    assert positions[4][0] == (RESOLUTION[0] - 2000) // 2
+
+
+def test_layout_uses_fallback_size_for_missing_images(tmp_path):
+    image = make_image(tmp_path, "a.png", (300, 120))
+
+    positions = compute_bubble_layout(RESOLUTION, [image, None, str(tmp_path / "missing.png")], count=5)
+
+    assert len(positions) == 5
+    assert len(set(positions)) == 5
+
+
+def test_layout_is_cached_per_sizes(tmp_path):
+    _compute_layout.cache_clear()
+    first = [make_image(tmp_path, f"a{i}.png", (300, 120)) for i in range(3)]
+    same_size = [make_image(tmp_path, f"b{i}.png", (300, 120)) for i in range(3)]
+
+    positions = compute_bubble_layout(RESOLUTION, first)
+    # 画像が違ってもサイズが同じなら計算し直さない
+    assert compute_bubble_layout(RESOLUTION, same_size) is positions
+    assert _compute_layout.cache_info().hits == 1
+    assert compute_bubble_layout((1280, 720), first) != positions
+
+
+def test_layout_rejects_unknown_template():
+    with pytest.raises(ValueError, match="テンプレート"):
+        compute_bubble_layout(RESOLUTION, [], template="spiral")
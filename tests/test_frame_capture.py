@@ -0,0 +1,118 @@
+"""frame_capture の静止画保存（対象フレームの決定・このレンダリングで保存した静止画だけの一覧・コンタクトシート）のテスト"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from python.frame_capture import (
+    SHEET_PADDING, FrameCapture, capture_settings, capture_targets
+)
+from python.theme_timeline import Timeline, TimelineSegment
+from python.yuv_compositing import YuvFrame, solid_color_yuv
+
+FPS = 10
+
+
+def frame(value, size=(40, 20)):
+    return np.full((size[1], size[0], 3), value, dtype=np.uint8)
+
+
+def test_capture_settings():
+    assert capture_settings({}) is None
+    assert capture_settings({"capture": True})["format"] == "jpeg"
+    assert capture_settings({"capture": {"format": "webp", "width": 320}})["width"] == 320
+    with pytest.raises(ValueError):
+        capture_settings({"capture": {"format": "png"}})
+
+
+def test_capture_targets():
+    timeline = Timeline([
+        TimelineSegment(0.0, 2.0),      # タイトル: フレーム 0-19
+        TimelineSegment(2.0, 4.0),      # フェード 0.3秒 → 3フレーム後
+        TimelineSegment(4.0, 4.4),      # 短い区間は中央を超えない
+    ], FPS)
+
+    assert capture_targets(timeline, FPS, 0.3) == {9: "title", 23: "comment_001", 41: "comment_002"}
+    assert capture_targets(timeline, FPS, 0.3, title=False) == {23: "comment_001", 41: "comment_002"}
+    assert capture_targets(timeline, FPS, 0.3, comments=False) == {9: "title"}
+    assert capture_targets(timeline, FPS, 0.3, has_title=False) == {3: "comment_001", 23: "comment_002",
+                                                                      41: "comment_003"}
+
+
+def test_capture_saves_only_targets_and_resizes(tmp_path):
+    capture = FrameCapture(str(tmp_path / "video.mp4"), {3: "title"}, capture_settings({"capture": {"width": 20}}))
+
+    capture.capture(2, frame(10))
+    capture.capture(3, frame(200))
+
+    assert capture.saved == {3: str(tmp_path / "video_title.jpg")}
+    with Image.open(capture.saved[3]) as image:
+        assert image.size == (20, 10)
+        assert abs(image.getpixel((5, 5))[0] - 200) <= 2
+    assert not list(tmp_path.glob("*.partial*"))
+
+
+def test_finish_ignores_stale_stills_from_earlier_renders(tmp_path):
+    settings = capture_settings({"capture": {"sheet_columns": 2, "sheet_tile_width": 10}})
+    capture = FrameCapture(str(tmp_path / "video.mp4"), {0: "title", 5: "comment_001", 9: "comment_002"}, settings)
+    # 前回のレンダリングの静止画（今回は comment_002 を保存しない）
+    Image.new("RGB", (40, 20)).save(tmp_path / "video_comment_002.jpg")
+
+    capture.capture(5, frame(100))
+    capture.capture(0, frame(50))
+    paths = capture.finish()
+
+    assert paths == [str(tmp_path / "video_title.jpg"), str(tmp_path / "video_comment_001.jpg"),
+                     str(tmp_path / "video_contact.jpg")]
+    with Image.open(paths[-1]) as sheet:
+        # 2枚 → 1行2列、縮小画像は幅10・高さ5
+        assert sheet.size == (2 * (10 + SHEET_PADDING) + SHEET_PADDING, 5 + 2 * SHEET_PADDING)
+
+
+def test_record_registers_stills_saved_by_other_processes(tmp_path):
+    settings = capture_settings({"capture": {"sheet_columns": 2, "sheet_tile_width": 10}})
+    worker = FrameCapture(str(tmp_path / "video.mp4"), {0: "title", 5: "comment_001", 9: "comment_002"}, settings)
+    worker.capture(0, frame(50))
+    worker.capture(9, frame(80))
+    worker.capture(5, frame(120))
+
+    capture = FrameCapture(str(tmp_path / "video.mp4"), worker.targets, settings)
+    (tmp_path / "video_comment_001.jpg").unlink()
+    # ジャーナル経由のため番号は文字列、消えた静止画は登録しない
+    capture.record({"9": worker.saved[9], "0": worker.saved[0], "5": worker.saved[5]})
+    paths = capture.finish()
+
+    assert paths[:-1] == [worker.saved[0], worker.saved[9]]
+    with Image.open(paths[-1]) as sheet:
+        assert sheet.size == (2 * (10 + SHEET_PADDING) + SHEET_PADDING, 5 + 2 * SHEET_PADDING)
+
+
+def test_contact_sheet_wraps_rows(tmp_path):
+    settings = capture_settings({"capture": {"sheet_columns": 2, "sheet_tile_width": 10, "format": "webp"}})
+    capture = FrameCapture(str(tmp_path / "video.mp4"), {0: "title", 1: "comment_001", 2: "comment_002"}, settings)
+    for n in range(3):
+        capture.capture(n, frame(60 * n))
+
+    sheet_path = capture.finish()[-1]
+
+    assert sheet_path.endswith("video_contact.webp")
+    with Image.open(sheet_path) as sheet:
+        assert sheet.size == (2 * (10 + SHEET_PADDING) + SHEET_PADDING, 2 * (5 + SHEET_PADDING) + SHEET_PADDING)
+
+
+def test_capture_yuv_converts_target_frames(tmp_path):
+    capture = FrameCapture(str(tmp_path / "video.mp4"), {1: "title"}, capture_settings({"capture": True}))
+    yuv = YuvFrame(40, 20)
+    yuv.fill(solid_color_yuv((255, 0, 0)))
+
+    capture.capture_yuv(0, yuv)
+    capture.capture_yuv(1, yuv)
+
+    assert list(capture.saved) == [1]
+    with Image.open(capture.saved[1]) as image:
+        red, green, blue = image.getpixel((20, 10))
+    assert red > 240 and green < 15 and blue < 15
+
+
+def test_finish_without_targets_returns_nothing(tmp_path):
+    assert FrameCapture(str(tmp_path / "video.mp4"), {}, capture_settings({"capture": True})).finish() == []
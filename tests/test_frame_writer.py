@@ -0,0 +1,95 @@
+"""frame_writer のバッファ上での合成（MoviePyとの一致）と書き出しの終了処理のテスト"""
+
+import numpy as np
+import pytest
+from moviepy.editor import ColorClip, CompositeVideoClip, ImageClip, VideoFileClip
+
+from python.frame_writer import BlendScratch, BufferedFrameWriter, blit_into, composite_into
+
+SIZE = (32, 24)
+
+
+def gradient_clip(width, height, duration=1.0):
+    """横方向にアルファが変化する字幕風クリップ"""
+    rng = np.random.default_rng(width * height)
+    image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    mask = ImageClip(np.tile(np.linspace(0.0, 1.0, width), (height, 1)), ismask=True, duration=duration)
+    return ImageClip(image, duration=duration).set_mask(mask)
+
+
+def composite_cases():
+    background = ColorClip(SIZE, color=(40, 90, 200), duration=1.0)
+    return {
+        "alpha": [gradient_clip(10, 8).set_position((3, 4))],
+        "offscreen": [gradient_clip(10, 8).set_position((-4, -3)), gradient_clip(10, 8).set_position((27, 20))],
+        "outside": [gradient_clip(10, 8).set_position((40, 30))],
+        "aliases": [gradient_clip(10, 8).set_position("center"), gradient_clip(6, 4).set_position(("right", "bottom"))],
+        "relative": [gradient_clip(10, 8).set_position((0.5, 0.25), relative=True)],
+        "opaque": [ImageClip(np.full((5, 5, 3), 255, dtype=np.uint8), duration=1.0).set_position((1, 1))],
+        "fade": [gradient_clip(10, 8).set_position((2, 2)).crossfadein(0.5)],
+        "timed": [gradient_clip(10, 8).set_start(0.5).set_position((2, 2))],
+    }, background
+
+
+@pytest.mark.parametrize("case", ["alpha", "offscreen", "outside", "aliases", "relative", "opaque", "fade", "timed"])
+def test_composite_into_matches_moviepy(case):
+    cases, background = composite_cases()
+    clip = CompositeVideoClip([background] + cases[case], size=SIZE)
+    buffer = np.zeros((SIZE[1], SIZE[0], 3), dtype=np.uint8)
+    scratch = BlendScratch()
+
+    for t in (0.0, 0.2, 0.6):
+        composite_into(buffer, scratch, clip, t)
+        np.testing.assert_array_equal(buffer, clip.get_frame(t).astype(np.uint8))
+
+
+def test_blit_into_reuses_scratch_for_smaller_regions():
+    scratch = BlendScratch()
+    buffer = np.zeros((8, 8, 3), dtype=np.uint8)
+    mask = np.full((6, 6), 0.5)
+
+    blit_into(buffer, scratch, np.full((6, 6, 3), 200, dtype=np.uint8), mask, (0, 0))
+    first = scratch.get(np.float64, np.float64, 6, 6)[0].base
+    blit_into(buffer, scratch, np.full((6, 6, 3), 200, dtype=np.uint8), mask, (5, 5))
+
+    assert scratch.get(np.float64, np.float64, 3, 3)[0].base is first
+    assert (buffer[0, 0, 0], buffer[5, 5, 0], buffer[7, 7, 0], buffer[7, 0, 0]) == (100, 150, 100, 0)
+
+
+class StopAfter:
+    """指定フレーム数を書き出したら例外を送出する進捗通知先"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.done = 0
+
+    def advance(self):
+        self.done += 1
+        if self.done == self.frames:
+            raise RuntimeError("中止")
+
+
+def test_buffered_writer_writes_all_frames(tmp_path):
+    output = str(tmp_path / "out.mp4")
+    clip = CompositeVideoClip([ColorClip(SIZE, color=(0, 0, 0), duration=0.5), gradient_clip(10, 8, 0.5)], size=SIZE)
+
+    with BufferedFrameWriter(output, SIZE, 10) as writer:
+        assert writer.write_clip(clip) == 5
+
+    with VideoFileClip(output) as result:
+        assert result.size == list(SIZE)
+        assert result.duration == pytest.approx(0.5)
+
+
+def test_buffered_writer_closes_encoder_on_error(tmp_path):
+    output = str(tmp_path / "out.mp4")
+    clip = ColorClip(SIZE, color=(255, 255, 255), duration=1.0)
+
+    with pytest.raises(RuntimeError, match="中止"):
+        with BufferedFrameWriter(output, SIZE, 10) as writer:
+            writer.write_clip(clip, progress=StopAfter(3))
+
+    # 例外でもffmpegを終了させ（MoviePyは終了後に proc を破棄する）、書き出し済みのフレームは読める動画として残る
+    assert writer.writer.proc is None
+    with VideoFileClip(output) as result:
+        assert result.duration == pytest.approx(0.3)
@@ -0,0 +1,50 @@
+"""isolated_executor のジョブ単位プロセス実行（制限時間・異常終了）のテスト"""
+
+import operator
+import os
+import time
+
+import pytest
+
+from python.isolated_executor import IsolatedProcessExecutor
+
+
+def test_returns_result():
+    executor = IsolatedProcessExecutor(timeout=30)
+
+    future = executor.submit(operator.add, 1, 2)
+
+    assert future.result(timeout=30) == 3
+    executor.shutdown()
+
+
+def test_reports_exception_message():
+    executor = IsolatedProcessExecutor(timeout=30)
+
+    future = executor.submit(operator.truediv, 1, 0)
+
+    with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+        future.result(timeout=30)
+    executor.shutdown()
+
+
+def test_kills_job_over_time_limit():
+    executor = IsolatedProcessExecutor(timeout=0.5)
+    started = time.monotonic()
+
+    future = executor.submit(time.sleep, 30)
+
+    with pytest.raises(TimeoutError):
+        future.result(timeout=30)
+    assert time.monotonic() - started < 20
+    executor.shutdown()
+
+
+def test_reports_worker_crash():
+    executor = IsolatedProcessExecutor(timeout=30)
+
+    future = executor.submit(os._exit, 3)
+
+    with pytest.raises(RuntimeError, match="終了コード 3"):
+        future.result(timeout=30)
+    executor.shutdown()
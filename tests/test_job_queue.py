@@ -0,0 +1,149 @@
+"""job_queue の永続ジョブキュー（取得・失敗・再試行・回収）のテスト"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from python.job_queue import (
+    STATE_FAILED, STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED, RenderJobQueue, pid_alive
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with RenderJobQueue(str(tmp_path / "queue.sqlite3"), poll_interval=0.01) as job_queue:
+        yield job_queue
+
+
+def configs(*names):
+    return [{"output_path": f"/out/{name}.mp4", "audio_file": f"{name}.wav"} for name in names]
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_enqueue_is_idempotent_per_batch(queue):
+    first = queue.enqueue(configs("a", "b"), batch="b1")
+    again = queue.enqueue(configs("b", "c"), batch="b1")
+    other_batch = queue.enqueue(configs("a"), batch="b2")
+
+    assert again[0] == first[1]
+    assert other_batch[0] not in first + again
+    assert queue.summary("b1") == {"queued": 3, "running": 0, "succeeded": 0, "failed": 0, "total": 3}
+
+
+def test_enqueue_rejects_unknown_kind(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue(configs("a"), kind="slideshow")
+
+
+def test_claim_in_order_and_complete(queue):
+    queue.enqueue(configs("a", "b"))
+
+    job = queue.claim()
+    assert job["config"]["output_path"] == "/out/a.mp4"
+    assert (job["state"], job["attempts"], job["worker_pid"]) == (STATE_RUNNING, 1, os.getpid())
+    assert queue.claim()["output_path"] == "/out/b.mp4"
+    assert queue.claim() is None
+
+    queue.complete(job["id"], ["/out/a.mp4", "/out/a_720p.mp4"], ["/out/a_title.jpg"], {"frames": 10})
+
+    stored = queue.jobs()[0]
+    assert stored["state"] == STATE_SUCCEEDED
+    assert stored["output_paths"] == ["/out/a.mp4", "/out/a_720p.mp4"]
+    assert stored["captures"] == ["/out/a_title.jpg"]
+    assert stored["report"] == {"frames": 10}
+    assert stored["duration"] >= 0
+
+
+def test_claim_filters_by_batch(queue):
+    queue.enqueue(configs("a"), batch="b1")
+    queue.enqueue(configs("b"), batch="b2")
+
+    assert queue.claim("b2")["output_path"] == "/out/b.mp4"
+    assert queue.claim("b2") is None
+
+
+def test_fail_retries_until_max_attempts(queue):
+    queue.enqueue(configs("a"), max_attempts=2)
+
+    job = queue.claim()
+    assert queue.fail(job["id"], "エラー1") == STATE_QUEUED
+    job = queue.claim()
+    assert job["attempts"] == 2
+    assert queue.fail(job["id"], "エラー2") == STATE_FAILED
+
+    stored = queue.jobs()[0]
+    assert (stored["state"], stored["error"]) == (STATE_FAILED, "エラー2")
+    assert stored["finished_at"] is not None
+    assert queue.claim() is None
+
+
+def test_retry_failed_resets_attempts(queue):
+    queue.enqueue(configs("a"), max_attempts=1)
+    queue.fail(queue.claim()["id"], "エラー")
+
+    assert queue.retry_failed() == 1
+
+    job = queue.claim()
+    assert job["attempts"] == 1
+    assert job["error"] is None
+
+
+def test_release_does_not_consume_an_attempt(queue):
+    queue.enqueue(configs("a"))
+    job = queue.claim()
+
+    queue.release(job["id"])
+
+    assert queue.jobs()[0]["state"] == STATE_QUEUED
+    assert queue.claim()["attempts"] == 1
+
+
+def test_recover_stale_requeues_jobs_of_dead_consumers(queue):
+    queue.enqueue(configs("a", "b"), max_attempts=1)
+    alive, dead = queue.claim(), queue.claim()
+    queue.enqueue(configs("c"))
+    retryable = queue.claim()
+    queue._conn.execute("UPDATE jobs SET worker_pid = ? WHERE id IN (?, ?)", (dead_pid(), dead["id"], retryable["id"]))
+
+    assert queue.recover_stale() == 2
+
+    jobs = {job["id"]: job for job in queue.jobs()}
+    assert jobs[alive["id"]]["state"] == STATE_RUNNING
+    assert jobs[dead["id"]]["state"] == STATE_FAILED
+    assert jobs[dead["id"]]["finished_at"] is not None
+    assert "異常終了" in jobs[dead["id"]]["error"]
+    assert jobs[retryable["id"]]["state"] == STATE_QUEUED
+
+
+def test_recover_stale_ignores_other_hosts(queue):
+    queue.enqueue(configs("a"))
+    job = queue.claim()
+    queue._conn.execute("UPDATE jobs SET worker_host = ?, worker_pid = ? WHERE id = ?",
+                        ("other-host", dead_pid(), job["id"]))
+
+    assert queue.recover_stale() == 0
+    assert queue.jobs()[0]["state"] == STATE_RUNNING
+
+
+def test_queue_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    with RenderJobQueue(path) as producer, RenderJobQueue(path) as consumer:
+        producer.enqueue(configs("a"))
+        job = consumer.claim()
+
+        assert producer.claim() is None
+        assert producer.summary()["running"] == 1
+        assert job["output_path"] == "/out/a.mp4"
+
+
+def test_pid_alive():
+    assert pid_alive(os.getpid())
+    assert not pid_alive(None)
+    assert not pid_alive(dead_pid())
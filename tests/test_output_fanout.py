@@ -0,0 +1,61 @@
+"""output_fanout の出力指定の正規化・出力フィルタのテスト"""
+
+import pytest
+
+from python.output_fanout import derived_output_path, output_filter, parse_outputs
+
+VIDEO_SETTINGS = {"codec": "libx264", "bitrate": "5000k", "preset": "fast"}
+
+
+def test_parse_outputs_fills_defaults_from_main_output():
+    outputs = parse_outputs([
+        {"output_path": "a_720p.mp4", "resolution": [1280, 720]},
+        {"output_path": "a_shorts.mp4", "resolution": (1080, 1920), "bitrate": "4000k"},
+        {"output_path": "a_copy.mp4"}
+    ], VIDEO_SETTINGS)
+
+    assert outputs == [
+        {"output_path": "a_720p.mp4", "resolution": (1280, 720), "codec": "libx264", "bitrate": "5000k", "preset": "fast"},
+        {"output_path": "a_shorts.mp4", "resolution": (1080, 1920), "codec": "libx264", "bitrate": "4000k", "preset": "fast"},
+        {"output_path": "a_copy.mp4", "resolution": None, "codec": "libx264", "bitrate": "5000k", "preset": "fast"}
+    ]
+
+
+def test_parse_outputs_accepts_none():
+    assert parse_outputs(None, VIDEO_SETTINGS) == []
+
+
+def test_parse_outputs_requires_output_path():
+    with pytest.raises(ValueError, match="outputs\\[1\\]"):
+        parse_outputs([{"output_path": "a.mp4"}, {"resolution": [640, 360]}], VIDEO_SETTINGS)
+
+
+def test_parse_outputs_rejects_odd_resolution():
+    with pytest.raises(ValueError, match="偶数"):
+        parse_outputs([{"output_path": "a.mp4", "resolution": [641, 360]}], VIDEO_SETTINGS)
+
+
+def test_output_filter_passthrough():
+    assert output_filter((1920, 1080), None) == "null"
+    assert output_filter((1920, 1080), (1920, 1080)) == "null"
+
+
+def test_output_filter_scales_same_aspect():
+    assert output_filter((1920, 1080), (1280, 720)) == "scale=1280:720"
+
+
+def test_output_filter_crops_center_for_portrait():
+    # 16:9 から 9:16 は中央の幅 608（偶数に丸め）を切り出して拡縮する
+    assert output_filter((1920, 1080), (1080, 1920)) == "crop=608:1080:656:0,scale=1080:1920"
+
+
+def test_output_filter_crops_without_scaling_when_size_matches():
+    assert output_filter((1920, 1080), (1080, 1080)) == "crop=1080:1080:420:0"
+
+
+def test_output_filter_crops_height_for_wider_target():
+    assert output_filter((1280, 720), (1280, 540)) == "crop=1280:540:0:90"
+
+
+def test_derived_output_path():
+    assert derived_output_path("/tmp/chunk_000.partial.mp4", 2) == "/tmp/chunk_000.partial.out2.mp4"
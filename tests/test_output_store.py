@@ -0,0 +1,129 @@
+"""atomic_output の途中ファイル経由の確定と output_store の指紋による重複排除のテスト"""
+
+import os
+import socket
+
+import pytest
+
+from python.atomic_output import atomic_outputs, partial_path, partial_writer, stale_partials
+from python.output_store import OutputStore, render_fingerprint
+
+VIDEO_SETTINGS = {"codec": "libx264", "bitrate": "5000k", "preset": "fast"}
+
+
+def test_partial_path_is_hidden_and_keeps_extension(tmp_path):
+    path = str(tmp_path / "video.mp4")
+
+    partial = partial_path(path)
+
+    assert os.path.dirname(partial) == str(tmp_path)
+    assert os.path.basename(partial).startswith(".video.")
+    assert partial.endswith(".partial.mp4")
+    assert partial_writer(path, partial) == (socket.gethostname(), os.getpid())
+
+
+def test_stale_partials_excludes_own_and_other_outputs(tmp_path):
+    path = str(tmp_path / "video.mp4")
+    other = tmp_path / ".video.other-host-123.partial.mp4"
+    for name in (partial_path(path), str(other), str(tmp_path / ".video_720p.other-host-123.partial.mp4")):
+        open(name, "wb").close()
+
+    assert stale_partials(path) == [str(other)]
+    assert partial_writer(path, str(other)) == ("other-host", 123)
+    assert partial_writer(path, str(tmp_path / ".video.broken.partial.mp4")) is None
+
+
+def test_atomic_outputs_commits_all_outputs_on_success(tmp_path):
+    path = str(tmp_path / "video.mp4")
+    extra = str(tmp_path / "video_720p.mp4")
+    settings = {**VIDEO_SETTINGS, "outputs": [{"output_path": extra, "resolution": [1280, 720]}]}
+
+    with atomic_outputs(path, settings) as (partial, partial_settings):
+        extra_partial = partial_settings["outputs"][0]["output_path"]
+        assert extra_partial == partial_path(extra)
+        assert partial_settings["outputs"][0]["resolution"] == (1280, 720)
+        for name in (partial, extra_partial):
+            with open(name, "wb") as output_file:
+                output_file.write(b"video")
+        assert not os.path.exists(path)
+
+    assert sorted(os.listdir(tmp_path)) == ["video.mp4", "video_720p.mp4"]
+    # 呼び出し側の設定は書き換えない
+    assert settings["outputs"][0]["output_path"] == extra
+
+
+def test_atomic_outputs_discards_partials_on_error(tmp_path):
+    path = str(tmp_path / "video.mp4")
+    (tmp_path / "video.mp4").write_bytes(b"previous")
+
+    with pytest.raises(RuntimeError):
+        with atomic_outputs(path, VIDEO_SETTINGS) as (partial, _):
+            with open(partial, "wb") as output_file:
+                output_file.write(b"half")
+            raise RuntimeError("中断")
+
+    # 以前の完成品は残り、途中ファイルは残らない
+    assert os.listdir(tmp_path) == ["video.mp4"]
+    assert (tmp_path / "video.mp4").read_bytes() == b"previous"
+
+
+def test_render_fingerprint_depends_on_contents_only():
+    assert render_fingerprint({"a": 1, "b": [1, 2]}) == render_fingerprint({"b": [1, 2], "a": 1})
+    assert render_fingerprint({"a": 1}) != render_fingerprint({"a": 2})
+
+
+def test_store_save_and_restore_share_one_inode(tmp_path):
+    store = OutputStore(str(tmp_path / "store"))
+    fingerprint = render_fingerprint({"text": "a"})
+    video = tmp_path / "day1" / "video.mp4"
+    video.parent.mkdir()
+    video.write_bytes(b"video")
+    assert store.lookup(fingerprint) is None
+
+    store.save(fingerprint, {"video.mp4": str(video)})
+    restored = tmp_path / "day2" / "video.mp4"
+
+    assert store.restore(fingerprint, {"video.mp4": str(restored)})
+    assert restored.read_bytes() == b"video"
+    assert os.path.samefile(video, restored)
+    assert os.path.samefile(store.lookup(fingerprint)["video.mp4"], video)
+
+
+def test_store_save_dedupes_identical_render(tmp_path):
+    store = OutputStore(str(tmp_path / "store"))
+    fingerprint = render_fingerprint({"text": "a"})
+    first, second = tmp_path / "first.mp4", tmp_path / "second.mp4"
+    first.write_bytes(b"video")
+    second.write_bytes(b"video")
+
+    store.save(fingerprint, {"video.mp4": str(first)})
+    store.save(fingerprint, {"video.mp4": str(second)})
+
+    # 2回目の出力はストアの実体へのハードリンクに置き換わる
+    assert os.path.samefile(first, second)
+    assert not any(name.endswith(".partial.mp4") for name in os.listdir(tmp_path))
+
+
+def test_store_restore_requires_matching_roles(tmp_path):
+    store = OutputStore(str(tmp_path / "store"))
+    fingerprint = render_fingerprint({"text": "a"})
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    store.save(fingerprint, {"video.mp4": str(video)})
+
+    destination = tmp_path / "out" / "video.mp4"
+    assert not store.restore(fingerprint, {"video.mp4": str(destination), "output_0.mp4": str(tmp_path / "b.mp4")})
+    assert not destination.exists()
+
+
+def test_store_ignores_incomplete_entry(tmp_path):
+    store = OutputStore(str(tmp_path / "store"))
+    fingerprint = render_fingerprint({"text": "a"})
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    store.save(fingerprint, {"video.mp4": str(video)})
+
+    os.remove(store.lookup(fingerprint)["video.mp4"])
+
+    assert store.lookup(fingerprint) is None
+    assert not store.restore(fingerprint, {"video.mp4": str(tmp_path / "restored.mp4")})
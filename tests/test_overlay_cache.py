@@ -0,0 +1,108 @@
+"""overlay_cache の合計バイト数上限付きLRUキャッシュ（破棄順・バイト数の計上・上限超えの字幕）のテスト"""
+
+import os
+
+import numpy as np
+from PIL import Image
+
+from python import overlay_cache
+from python.overlay_cache import OverlayCache, SubtitleOverlay
+
+
+def make_png(tmp_path, name, size=(4, 2), color=(255, 0, 0, 255)):
+    path = tmp_path / name
+    Image.new("RGBA", size, color).save(path)
+    return str(path)
+
+
+def overlay_bytes(size):
+    return SubtitleOverlay(np.zeros((size[1], size[0], 4), dtype=np.uint8)).nbytes
+
+
+def assert_accounted(cache):
+    assert cache.current_bytes == sum(entry.nbytes for entry in cache._entries.values())
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    paths = [make_png(tmp_path, f"{i}.png", color=(i * 60, 0, 0, 255)) for i in range(3)]
+    cache = OverlayCache(max_bytes=overlay_bytes((4, 2)) * 2)
+
+    a = cache.get(paths[0])
+    cache.get(paths[1])
+    assert cache.get(paths[0]) is a    # a を最近使ったものにする
+    c = cache.get(paths[2])            # 上限を超えるので b を破棄
+
+    assert list(cache._entries.values()) == [a, c]
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 2, "bytes": overlay_bytes((4, 2)) * 2}
+    cache.get(paths[1])                # 再デコードして、今度は最も古い a を破棄
+    assert cache.stats()["misses"] == 4
+    assert list(cache._entries.values())[0] is c
+    assert_accounted(cache)
+
+
+def test_same_content_is_counted_once(tmp_path):
+    first = make_png(tmp_path, "first.png")
+    copy = make_png(tmp_path, "copy.png")
+    cache = OverlayCache()
+
+    overlay = cache.get(first)
+    assert cache.get(copy) is overlay
+    # 内容が同じまま更新時刻だけ変わっても再登録しない
+    os.utime(first, ns=(0, 10**9))
+    assert cache.get(first) is overlay
+
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1, "bytes": overlay.nbytes}
+
+
+def test_concurrent_decode_of_same_key_does_not_double_count(tmp_path, monkeypatch):
+    path = make_png(tmp_path, "subtitle.png")
+    cache = OverlayCache()
+    decode = SubtitleOverlay.decode
+    calls = []
+
+    def racing_decode(image_path):
+        # 1回目のデコード中に別スレッドが同じ字幕を登録した状況を再現する
+        calls.append(image_path)
+        if len(calls) == 1:
+            cache.get(image_path)
+        return decode(image_path)
+
+    monkeypatch.setattr(overlay_cache.SubtitleOverlay, "decode", staticmethod(racing_decode))
+    cache.get(path)
+
+    assert cache.stats()["entries"] == 1
+    assert_accounted(cache)
+
+
+def test_entry_larger_than_budget_replaces_everything_else(tmp_path):
+    small = make_png(tmp_path, "small.png")
+    large = make_png(tmp_path, "large.png", size=(64, 32))
+    cache = OverlayCache(max_bytes=overlay_bytes((4, 2)) * 3)
+
+    cache.get(small)
+    big = cache.get(large)
+
+    # 直前に追加した1件は上限を超えていても残す（使用中の字幕を毎回デコードし直さない）
+    assert list(cache._entries.values()) == [big]
+    assert cache.current_bytes == big.nbytes > cache.max_bytes
+
+    cache.get(small)
+    assert cache.stats()["entries"] == 1
+    assert cache.current_bytes == overlay_bytes((4, 2))
+    assert_accounted(cache)
+
+
+def test_yuv_conversion_is_added_to_the_entry_bytes(tmp_path):
+    paths = [make_png(tmp_path, f"{i}.png", color=(i * 60, 0, 0, 255)) for i in range(3)]
+    rgb_bytes = overlay_bytes((4, 2))
+    cache = OverlayCache(max_bytes=rgb_bytes * 3)
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+    yuv = cache.get_yuv(paths[2])
+
+    assert cache.get_yuv(paths[2]) is yuv
+    assert cache.get(paths[2]).nbytes == rgb_bytes + yuv.nbytes
+    # YUV分が増えて上限を超えたので最も古いものを破棄
+    assert cache.stats()["entries"] == 2
+    assert_accounted(cache)
@@ -0,0 +1,198 @@
+"""parallel_encoder のチャンク分割・チェックポイント（RenderJournal）のテスト"""
+
+import json
+import os
+import multiprocessing
+import pickle
+
+from python.frame_capture import FrameCapture, capture_settings
+from python.parallel_encoder import ParallelSegmentEncoder, RenderJournal, _encode_chunk, plan_chunks
+from python.render_progress import RenderProgress
+from python.theme_timeline import Timeline, TimelineSegment
+
+FPS = 30
+
+
+def make_timeline(durations):
+    segments = []
+    start = 0.0
+    for duration in durations:
+        segments.append(TimelineSegment(start, start + duration))
+        start += duration
+    return Timeline(segments, FPS)
+
+
+def test_plan_chunks_keeps_segments_contiguous_and_complete():
+    timeline = make_timeline([1.0] * 10)
+
+    chunks = plan_chunks(timeline, 3)
+
+    assert len(chunks) == 3
+    assert [segment for chunk in chunks for segment in chunk] == list(timeline)
+
+
+def test_plan_chunks_balances_frames():
+    timeline = make_timeline([1.0] * 12)
+
+    chunks = plan_chunks(timeline, 4)
+
+    assert [sum(segment.frame_count for segment in chunk) for chunk in chunks] == [90, 90, 90, 90]
+
+
+def test_plan_chunks_never_exceeds_segment_count():
+    timeline = make_timeline([1.0, 2.0])
+
+    chunks = plan_chunks(timeline, 8)
+
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+
+
+def test_plan_chunks_leaves_a_segment_for_every_chunk():
+    # 先頭の長い区間で目標フレーム数を超えても、残りのチャンクに1区間ずつ残す
+    timeline = make_timeline([10.0, 0.5, 0.5])
+
+    chunks = plan_chunks(timeline, 3)
+
+    assert [len(chunk) for chunk in chunks] == [1, 1, 1]
+
+
+def test_plan_chunks_single_chunk():
+    timeline = make_timeline([1.0, 1.0, 1.0])
+
+    assert plan_chunks(timeline, 1) == [list(timeline)]
+
+
+def write_chunk(scratch_dir, name, size=16):
+    (scratch_dir / name).write_bytes(b"x" * size)
+
+
+def test_journal_resumes_same_job(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    journal = RenderJournal(str(scratch_dir), "job-a")
+    assert journal.load() is False
+    journal.meta["background_path"] = "bg.mp4"
+    write_chunk(scratch_dir, "chunk_000.mp4")
+    journal.mark_done("chunk_000", "chunk_000.mp4", frames=90)
+
+    resumed = RenderJournal(str(scratch_dir), "job-a")
+
+    assert resumed.load() is True
+    assert resumed.is_done("chunk_000")
+    assert not resumed.is_done("chunk_001")
+    assert resumed.entries["chunk_000"]["frames"] == 90
+    assert resumed.meta == {"background_path": "bg.mp4"}
+
+
+def test_journal_discards_checkpoints_of_another_job(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    journal = RenderJournal(str(scratch_dir), "job-a")
+    journal.load()
+    write_chunk(scratch_dir, "chunk_000.mp4")
+    journal.mark_done("chunk_000", "chunk_000.mp4")
+
+    changed = RenderJournal(str(scratch_dir), "job-b")
+
+    assert changed.load() is False
+    assert not changed.is_done("chunk_000")
+    assert not (scratch_dir / "chunk_000.mp4").exists()
+
+
+def test_journal_rejects_truncated_chunk(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    journal = RenderJournal(str(scratch_dir), "job-a")
+    journal.load()
+    write_chunk(scratch_dir, "chunk_000.mp4", size=16)
+    journal.mark_done("chunk_000", "chunk_000.mp4")
+
+    # 記録後に成果物が書き換わった（途中で切れた）場合は完了扱いしない
+    write_chunk(scratch_dir, "chunk_000.mp4", size=8)
+
+    assert not journal.is_done("chunk_000")
+
+
+def test_journal_recovers_from_corrupt_file(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    scratch_dir.mkdir()
+    (scratch_dir / RenderJournal.FILE_NAME).write_text("{broken", encoding="utf-8")
+
+    journal = RenderJournal(str(scratch_dir), "job-a")
+
+    assert journal.load() is False
+    with open(journal.path, encoding="utf-8") as journal_file:
+        assert json.load(journal_file) == {"job_key": "job-a", "meta": {}, "entries": {}}
+
+
+def test_journal_change_removes_only_recorded_files(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    journal = RenderJournal(str(scratch_dir), "job-a")
+    journal.load()
+    write_chunk(scratch_dir, "chunk_000.mp4")
+    write_chunk(scratch_dir, "chunk_000.out0.mp4")
+    journal.mark_done("chunk_000", "chunk_000.mp4", files=["chunk_000.out0.mp4"])
+    write_chunk(scratch_dir, "unrelated.mp4")
+
+    RenderJournal(str(scratch_dir), "job-b").load()
+
+    assert sorted(path.name for path in scratch_dir.iterdir()) == [RenderJournal.FILE_NAME, "unrelated.mp4"]
+
+
+def test_journal_discard_keeps_unrecorded_files(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    journal = RenderJournal(str(scratch_dir), "job-a")
+    journal.load()
+    write_chunk(scratch_dir, "chunk_000.mp4")
+    journal.mark_done("chunk_000", "chunk_000.mp4")
+
+    write_chunk(scratch_dir, "other_job.mp4")
+    journal.discard()
+    assert [path.name for path in scratch_dir.iterdir()] == ["other_job.mp4"]
+
+    (scratch_dir / "other_job.mp4").unlink()
+    journal.discard()
+    assert not scratch_dir.exists()
+
+
+def test_configured_scratch_dir_is_split_per_output(tmp_path):
+    shared = ParallelSegmentEncoder(str(tmp_path), scratch_dir=str(tmp_path / "shared"))
+
+    first = shared._job_scratch_dir(str(tmp_path / "a" / "video.mp4"))
+    second = shared._job_scratch_dir(str(tmp_path / "b" / "video.mp4"))
+
+    assert os.path.dirname(first) == os.path.dirname(second) == str(tmp_path / "shared")
+    assert first != second
+    assert first == shared._job_scratch_dir(str(tmp_path / "a" / "video.mp4"))
+    assert ParallelSegmentEncoder(str(tmp_path))._job_scratch_dir(str(tmp_path / "video.mp4")) == \
+        str(tmp_path / ".video.mp4.render")
+
+
+def test_chunk_worker_arguments_survive_spawn_pickling(tmp_path):
+    # spawn のワーカーへは関数を名前で、引数を pickle で渡す
+    timeline = make_timeline([1.0, 1.0])
+    capture = FrameCapture(str(tmp_path / "video.mp4"), {15: "title"}, capture_settings({"capture": True}))
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        progress = RenderProgress(manager.Queue(), "job-a", manager.dict())
+        progress.advance(3)
+
+        restored = pickle.loads(pickle.dumps((_encode_chunk, list(timeline), capture, progress)))
+        restored[3].advance(1)
+        restored[3].flush()
+        assert progress.sink.get(timeout=5)["frames"] == 1
+
+    assert restored[0] is _encode_chunk
+    assert [segment.to_dict() for segment in restored[1]] == [segment.to_dict() for segment in timeline]
+    assert restored[2].targets == {15: "title"}
+    assert restored[3]._pending == 0
+
+
+def test_chunk_worker_reports_the_stills_it_saved(tmp_path):
+    timeline = make_timeline([0.2, 0.2])
+    capture = FrameCapture(str(tmp_path / "video.mp4"), {3: "title", 9: "comment_001", 40: "comment_002"},
+                           capture_settings({"capture": True}))
+    video_settings = {"fps": FPS, "resolution": [32, 24]}
+
+    frames, saved = _encode_chunk(list(timeline)[1:], None, str(tmp_path / "chunk.mp4"), video_settings, {}, 1, capture)
+
+    # 担当範囲（フレーム6-11）の静止画だけを、ジャーナルに書ける形（番号は文字列）で返す
+    assert frames == 6
+    assert saved == {"9": str(tmp_path / "video_comment_001.jpg")}
+    assert os.path.exists(saved["9"])
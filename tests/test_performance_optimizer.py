@@ -0,0 +1,178 @@
+"""performance_optimizer のメモリ予測に基づくジョブ受け入れ判定とバックプレッシャー制御のテスト"""
+
+import pytest
+
+from python import performance_optimizer
+from python.performance_optimizer import BackpressureController, PerformanceOptimizer
+
+CONFIG = {"output_path": "out.mp4", "audio_file": "a.wav", "settings": {"video": {"resolution": [1280, 720]}}}
+
+
+class StubOptimizer(PerformanceOptimizer):
+    """ホストのメモリ状況と子プロセスの実測RSSを差し替えたオプティマイザー"""
+
+    def __init__(self, percent=50.0, available_gb=8.0, children_rss_gb=0.0):
+        super().__init__()
+        self.percent = percent
+        self.available_gb = available_gb
+        self.children_rss_gb = children_rss_gb
+
+    def monitor_memory_usage(self):
+        return {"percent": self.percent, "available_gb": self.available_gb, "used_gb": 0.0, "total_gb": 16.0}
+
+    def monitor_process_memory(self, include_uss=True):
+        return {"children_rss_gb": self.children_rss_gb}
+
+
+def projected(optimizer):
+    return optimizer.estimate_job_memory_gb(CONFIG) * optimizer.admission_safety_factor
+
+
+def test_can_admit_job_boundary():
+    optimizer = StubOptimizer()
+    need = projected(optimizer)
+
+    optimizer.available_gb = need
+    assert optimizer.can_admit_job(CONFIG)
+    optimizer.available_gb = need - 0.01
+    assert not optimizer.can_admit_job(CONFIG)
+
+
+def test_running_jobs_reserve_only_unmaterialized_memory():
+    optimizer = StubOptimizer()
+    need = projected(optimizer)
+    controller = BackpressureController(optimizer, max_workers=4, poll_interval=0.0)
+
+    # 実行中2件のうち1件分は既にワーカーのRSSとして使用中（利用可能メモリに反映済み）
+    optimizer.children_rss_gb = need
+    assert optimizer.pending_job_memory_gb([CONFIG, CONFIG]) == pytest.approx(need)
+
+    optimizer.available_gb = need * 2
+    assert controller.admit(CONFIG, [CONFIG, CONFIG])
+    optimizer.available_gb = need * 2 - 0.01
+    assert not controller.admit(CONFIG, [CONFIG, CONFIG])
+
+    # 予測を超えて使用中なら追加の予約は無い
+    optimizer.children_rss_gb = need * 3
+    optimizer.available_gb = need
+    assert optimizer.pending_job_memory_gb([CONFIG, CONFIG]) == 0.0
+    assert controller.admit(CONFIG, [CONFIG, CONFIG])
+
+
+class FakeClock:
+    """time.time / time.sleep の代わりに進む時計"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(performance_optimizer, "time", fake)
+    return fake
+
+
+def states(controller):
+    return [(event["previous"], event["state"]) for event in controller.events if event["event"] == "state_change"]
+
+
+def test_evaluate_transitions_with_hysteresis():
+    optimizer = StubOptimizer()
+    controller = BackpressureController(optimizer, max_workers=4)
+
+    observed = []
+    for percent in [50, 80, 92, 88, 86, 84, 76, 74]:
+        optimizer.percent = percent
+        observed.append((controller.evaluate(), controller.allowed_workers, controller.admission_paused,
+                         controller.render_mode))
+
+    assert observed == [
+        ("normal", 4, False, "default"),
+        ("elevated", 2, False, "streaming"),
+        ("critical", 2, True, "streaming"),
+        ("critical", 2, True, "streaming"),   # 90% - 5% を下回るまでは復帰しない
+        ("critical", 2, True, "streaming"),
+        ("elevated", 2, False, "streaming"),
+        ("elevated", 2, False, "streaming"),  # 80% - 5% を下回るまでは復帰しない
+        ("normal", 4, False, "default"),
+    ]
+    assert states(controller) == [("normal", "elevated"), ("elevated", "critical"),
+                                  ("critical", "elevated"), ("elevated", "normal")]
+
+
+def test_allowed_workers_never_drops_below_one():
+    optimizer = StubOptimizer(percent=85)
+    controller = BackpressureController(optimizer, max_workers=1)
+
+    assert controller.evaluate() == "elevated"
+    assert controller.allowed_workers == 1
+
+
+def test_admit_waits_for_running_jobs_while_critical(clock):
+    optimizer = StubOptimizer(percent=95)
+    controller = BackpressureController(optimizer, max_workers=4)
+
+    for _ in range(3):
+        clock.sleep(120)
+        assert not controller.admit(CONFIG, [CONFIG])
+
+    # 実行中ジョブがあるうちは時間が経っても強制受け入れしない
+    assert [event["event"] for event in controller.events] == ["state_change", "admission_paused"]
+
+    optimizer.percent = 50
+    assert controller.admit(CONFIG, [CONFIG])
+
+
+def test_admit_forces_admission_after_max_pause_without_running_jobs(clock):
+    optimizer = StubOptimizer(percent=95)
+    controller = BackpressureController(optimizer, max_workers=2, poll_interval=0.5, max_pause_seconds=60.0)
+
+    attempts = 0
+    while not controller.admit(CONFIG, []):
+        attempts += 1
+    assert attempts == 120
+    assert clock.now == pytest.approx(1060.0)
+
+    paused, forced = [event for event in controller.events if event["event"] != "state_change"]
+    assert (paused["event"], forced["event"]) == ("admission_paused", "forced_admission")
+    assert forced["timestamp"] - paused["timestamp"] == pytest.approx(60.0)
+    assert forced["state"] == "critical"
+
+
+def test_admit_respects_allowed_workers():
+    optimizer = StubOptimizer(percent=85)
+    controller = BackpressureController(optimizer, max_workers=4)
+
+    assert controller.admit(CONFIG, [CONFIG])
+    assert not controller.admit(CONFIG, [CONFIG, CONFIG])
+
+
+def test_apply_render_mode():
+    optimizer = StubOptimizer()
+    controller = BackpressureController(optimizer, max_workers=2)
+    explicit = {**CONFIG, "settings": {**CONFIG["settings"], "render_mode": "parallel"}}
+
+    # 通常時は変更しない
+    controller.evaluate()
+    assert controller.apply_render_mode(CONFIG) is CONFIG
+
+    optimizer.percent = 85
+    controller.evaluate()
+    switched = controller.apply_render_mode(CONFIG)
+    assert switched["settings"]["render_mode"] == "streaming"
+    assert switched["settings"]["video"] == CONFIG["settings"]["video"]
+    assert "render_mode" not in CONFIG["settings"]
+
+    assert controller.apply_render_mode(explicit) is explicit
+    assert controller.apply_render_mode(CONFIG, streaming_equivalent=False) is CONFIG
+
+    decisions = [(event["event"], event.get("reason")) for event in controller.events if event["event"] != "state_change"]
+    assert decisions == [("render_mode_switch", None), ("render_mode_kept", "explicit"),
+                         ("render_mode_kept", "output_differs")]
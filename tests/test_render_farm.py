@@ -0,0 +1,169 @@
+"""render_farm の共有ディレクトリキュー（リース・ハートビート・回収）のテスト"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from python.job_queue import STATE_FAILED, STATE_QUEUED, STATE_RUNNING, STATE_SUCCEEDED
+from python.render_farm import FarmQueue
+
+LEASE = 0.5
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    """同じキューディレクトリを使う2ノード（ハートビートはテストから明示的に呼ぶ）"""
+    root = str(tmp_path / "farm")
+    node_a = FarmQueue(root, lease_seconds=LEASE, heartbeat_seconds=3600, node="node-a")
+    node_b = FarmQueue(root, lease_seconds=LEASE, heartbeat_seconds=3600, node="node-b")
+    yield node_a, node_b
+    node_a.close()
+    node_b.close()
+
+
+def configs(tmp_path, *names):
+    return [{"output_path": str(tmp_path / f"{name}.mp4")} for name in names]
+
+
+def lease_files(queue):
+    return sorted(os.listdir(os.path.join(queue.root, "leases")))
+
+
+def test_enqueue_is_idempotent(nodes, tmp_path):
+    node_a, node_b = nodes
+
+    first = node_a.enqueue(configs(tmp_path, "a", "b"))
+    again = node_b.enqueue(configs(tmp_path, "b"))
+
+    assert again == first[1:]
+    assert node_b.summary() == {"queued": 2, "running": 0, "succeeded": 0, "failed": 0, "total": 2}
+
+
+def test_leased_job_is_not_claimed_twice(nodes, tmp_path):
+    node_a, node_b = nodes
+    node_a.enqueue(configs(tmp_path, "a"))
+
+    job = node_a.claim()
+
+    assert job["attempts"] == 1
+    assert node_b.claim() is None
+    assert node_b.summary()["running"] == 1
+
+    node_a.complete(job["id"], [job["output_path"]])
+
+    stored = node_b.jobs()[0]
+    assert (stored["state"], stored["worker_node"]) == (STATE_SUCCEEDED, "node-a")
+    assert lease_files(node_a) == []
+
+
+def test_expired_lease_is_reclaimed_by_another_node(nodes, tmp_path):
+    node_a, node_b = nodes
+    node_a.enqueue(configs(tmp_path, "a"))
+    job = node_a.claim()
+
+    time.sleep(LEASE + 0.1)
+    assert node_b.recover_stale() == 1
+    reclaimed = node_b.claim()
+
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    # 期限切れ後の元のノードの記録は反映しない
+    assert node_a.fail(job["id"], "遅れて届いた失敗") == STATE_RUNNING
+    node_a.complete(job["id"], [job["output_path"]])
+    assert node_b.jobs()[0]["state"] == STATE_RUNNING
+    assert "node-a" in node_b.jobs()[0]["error"]
+
+    node_b.complete(reclaimed["id"], [reclaimed["output_path"]])
+    assert node_a.jobs()[0]["worker_node"] == "node-b"
+    assert lease_files(node_a) == []
+
+
+def test_heartbeat_extends_lease_without_rewriting_it(nodes, tmp_path):
+    node_a, node_b = nodes
+    node_a.enqueue(configs(tmp_path, "a"))
+    job = node_a.claim()
+    lease_path = os.path.join(node_a.root, "leases", f"{job['id']}.json")
+    with open(lease_path, "rb") as lease_file:
+        original = lease_file.read()
+
+    for _ in range(3):
+        time.sleep(LEASE / 2)
+        node_a.heartbeat()
+
+    # 最初の期限は過ぎているがハートビートで延長されている
+    assert node_b.claim() is None
+    assert node_b.recover_stale() == 0
+    with open(lease_path, "rb") as lease_file:
+        assert lease_file.read() == original
+    assert len([name for name in lease_files(node_a) if name.endswith(".hb")]) == 1
+
+
+def test_heartbeat_after_reclaim_gives_up_the_lease(nodes, tmp_path):
+    node_a, node_b = nodes
+    node_a.enqueue(configs(tmp_path, "a"))
+    job = node_a.claim()
+    time.sleep(LEASE + 0.1)
+    node_b.claim()
+    lease_path = os.path.join(node_a.root, "leases", f"{job['id']}.json")
+    with open(lease_path, "rb") as lease_file:
+        reclaimed_lease = lease_file.read()
+
+    node_a.heartbeat()
+
+    assert job["id"] not in node_a._leases
+    with open(lease_path, "rb") as lease_file:
+        assert lease_file.read() == reclaimed_lease
+    # 回収したノードのリースは有効なまま
+    assert node_a.claim() is None
+
+
+def test_fail_retries_then_records_failure(nodes, tmp_path):
+    node_a, _ = nodes
+    node_a.enqueue(configs(tmp_path, "a"), max_attempts=2)
+
+    assert node_a.fail(node_a.claim()["id"], "エラー1") == STATE_QUEUED
+    job = node_a.claim()
+    assert job["attempts"] == 2
+    assert node_a.fail(job["id"], "エラー2") == STATE_FAILED
+    assert node_a.claim() is None
+    assert node_a.jobs()[0]["error"] == "エラー2"
+
+    assert node_a.retry_failed() == 1
+    assert node_a.claim()["attempts"] == 1
+
+
+def test_release_does_not_consume_an_attempt(nodes, tmp_path):
+    node_a, node_b = nodes
+    node_a.enqueue(configs(tmp_path, "a"))
+
+    node_a.release(node_a.claim()["id"])
+
+    assert node_b.jobs()[0]["state"] == STATE_QUEUED
+    assert node_b.claim()["attempts"] == 1
+
+
+def test_claim_removes_only_abandoned_partials(nodes, tmp_path):
+    node_a, _ = nodes
+    node_a.enqueue(configs(tmp_path, "a"))
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    host = socket.gethostname()
+    dead = tmp_path / f".a.{host}-{process.pid}.partial.mp4"
+    alive = tmp_path / f".a.{host}-{os.getpid()}.partial.mp4"
+    remote_recent = tmp_path / ".a.other-host-123.partial.mp4"
+    remote_old = tmp_path / ".a.old-host-456.partial.mp4"
+    for partial in (dead, alive, remote_recent, remote_old):
+        partial.write_bytes(b"partial")
+    old = time.time() - LEASE * 10
+    os.utime(remote_old, (old, old))
+
+    node_a.claim()
+
+    assert not dead.exists()
+    assert alive.exists()
+    assert remote_recent.exists()
+    assert not remote_old.exists()
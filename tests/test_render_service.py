@@ -0,0 +1,207 @@
+"""render_service のHTTPサービス（リクエスト解析・投入・進捗配信・中止・不正なリクエスト）のテスト"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from python.render_progress import RenderCancelled, RenderProgress
+from python.render_service import MAX_BODY_BYTES, HttpError, RenderService, _read_request
+
+
+def fake_job(job_id, kind, config, events, cancelled):
+    """合成の代わりにフレームを数えるだけのジョブ（spawn のワーカーで実行するためモジュール関数）"""
+    progress = RenderProgress(events, job_id, cancelled, interval=0.0)
+    events.put({"id": job_id, "event": "running", "time": time.time()})
+    error = None
+    try:
+        if config.get("fail"):
+            raise RuntimeError(config["fail"])
+        progress.start(config["frames"])
+        for _ in range(config["frames"]):
+            time.sleep(config.get("delay", 0.0))
+            progress.advance()
+        progress.flush()
+    except (RuntimeError, RenderCancelled) as e:
+        error = str(e)
+    return {
+        "output_path": config["output_path"] if error is None else None,
+        "output_paths": [config["output_path"]] if error is None else [],
+        "captures": [],
+        "performance": {},
+        "error": error,
+        "cancelled": error is not None and job_id in cancelled
+    }
+
+
+def parse(raw):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await _read_request(reader)
+    return asyncio.run(read())
+
+
+def test_read_request_parses_method_path_query_and_body():
+    body = json.dumps({"kind": "theme"}).encode("utf-8")
+    raw = (b"post /jobs/abc/events?format=ndjson&x=1 HTTP/1.1\r\nHost: localhost\r\n"
+           b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n\r\n" + body)
+
+    assert parse(raw) == ("POST", "/jobs/abc/events", {"format": ["ndjson"], "x": ["1"]}, body)
+    assert parse(b"GET /health HTTP/1.1\r\n\r\n") == ("GET", "/health", {}, b"")
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1e3", "+5", "１２"])
+def test_read_request_rejects_malformed_content_length(length):
+    with pytest.raises(HttpError) as error:
+        parse(f"POST /jobs HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("utf-8"))
+    assert error.value.status == 400
+
+
+def test_read_request_rejects_oversized_and_chunked_bodies():
+    with pytest.raises(HttpError) as error:
+        parse(f"POST /jobs HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}\r\n\r\n".encode("ascii"))
+    assert error.value.status == 413
+
+    with pytest.raises(HttpError) as error:
+        parse(b"POST /jobs HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n")
+    assert error.value.status == 400
+
+    with pytest.raises(HttpError) as error:
+        parse(b"BROKEN\r\n\r\n")
+    assert error.value.status == 400
+
+
+async def request(port, method, path, payload=None, raw_body=None, headers=""):
+    """1リクエストを送り (ステータス, ヘッダー文字列, 本文) を返す"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = raw_body if raw_body is not None else (json.dumps(payload).encode("utf-8") if payload is not None else b"")
+    if "content-length" not in headers.lower():
+        headers += f"Content-Length: {len(body)}\r\n"
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, head.decode("latin-1"), content
+
+
+def run_service(scenario, max_workers=1):
+    """fake_job で動くサービスを一時ポートで起動して scenario(service, port) を実行"""
+    async def main():
+        service = RenderService(max_workers, job_runner=fake_job)
+        await service.start()
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with server:
+                return await asyncio.wait_for(scenario(service, port), 60)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def sse_events(content):
+    events = []
+    for block in content.decode("utf-8").split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def ndjson_events(content):
+    # chunked の各チャンクは「長さ\r\n本文\r\n」
+    lines = []
+    rest = content
+    while rest:
+        size, _, rest = rest.partition(b"\r\n")
+        size = int(size, 16)
+        if size == 0:
+            break
+        lines.append(json.loads(rest[:size]))
+        rest = rest[size + 2:]
+    return lines
+
+
+def test_submit_then_stream_sse_until_success():
+    async def scenario(service, port):
+        status, head, content = await request(port, "POST", "/jobs",
+                                              {"kind": "theme", "config": {"output_path": "out.mp4", "frames": 5}})
+        job = json.loads(content)
+        assert status == 202
+        assert f"Location: /jobs/{job['id']}" in head
+        assert job["state"] in ("queued", "running")
+
+        status, head, content = await request(port, "GET", f"/jobs/{job['id']}/events")
+        assert status == 200
+        assert "text/event-stream" in head
+        return sse_events(content), json.loads((await request(port, "GET", f"/jobs/{job['id']}"))[2])
+
+    events, final = run_service(scenario)
+
+    names = [name for name, _ in events]
+    assert names[0] in ("snapshot", "succeeded")
+    assert names[-1] == "succeeded"
+    assert final["state"] == "succeeded"
+    assert (final["frames_done"], final["total_frames"], final["percent"]) == (5, 5, 100.0)
+    assert final["output_paths"] == ["out.mp4"]
+
+
+def test_ndjson_stream_reports_failure():
+    async def scenario(service, port):
+        job = json.loads((await request(port, "POST", "/jobs",
+                                        {"config": {"output_path": "out.mp4", "fail": "素材がありません"}}))[2])
+        status, head, content = await request(port, "GET", f"/jobs/{job['id']}/events?format=ndjson")
+        assert "application/x-ndjson" in head
+        return ndjson_events(content)
+
+    events = run_service(scenario)
+
+    assert events[-1]["event"] == "failed"
+    assert events[-1]["error"] == "素材がありません"
+
+
+def test_cancel_running_and_queued_jobs():
+    async def scenario(service, port):
+        running = json.loads((await request(port, "POST", "/jobs",
+                                            {"config": {"output_path": "a.mp4", "frames": 500, "delay": 0.02}}))[2])
+        queued = json.loads((await request(port, "POST", "/jobs",
+                                           {"config": {"output_path": "b.mp4", "frames": 1}}))[2])
+        while service.jobs[running["id"]].frames_done == 0:
+            await asyncio.sleep(0.05)
+        assert service.jobs[queued["id"]].state == "queued"
+
+        assert (await request(port, "DELETE", f"/jobs/{queued['id']}"))[0] == 202
+        assert (await request(port, "DELETE", f"/jobs/{running['id']}"))[0] == 202
+        await asyncio.gather(service.jobs[running["id"]].task, service.jobs[queued["id"]].task)
+        conflict = await request(port, "DELETE", f"/jobs/{running['id']}")
+        return service.jobs[running["id"]], service.jobs[queued["id"]], conflict[0]
+
+    running, queued, conflict_status = run_service(scenario)
+
+    assert running.state == "cancelled"
+    assert 0 < running.frames_done < 500
+    assert queued.state == "cancelled"
+    assert queued.started_at is None
+    assert conflict_status == 409
+
+
+def test_bad_requests():
+    async def scenario(service, port):
+        return [
+            (await request(port, "POST", "/jobs", raw_body=b"{not json"))[0],
+            (await request(port, "POST", "/jobs", [1, 2]))[0],
+            (await request(port, "POST", "/jobs", {"kind": "slideshow", "config": {"output_path": "a.mp4"}}))[0],
+            (await request(port, "POST", "/jobs", {"config": {}}))[0],
+            (await request(port, "POST", "/jobs", raw_body=b"{}", headers="Content-Length: -2\r\n"))[0],
+            (await request(port, "GET", "/jobs/missing"))[0],
+            (await request(port, "PUT", "/jobs/missing"))[0],
+            (await request(port, "GET", "/nowhere"))[0],
+            json.loads((await request(port, "GET", "/health"))[2])["jobs"]["queued"]
+        ]
+
+    assert run_service(scenario) == [400, 400, 400, 400, 400, 404, 404, 404, 0]
@@ -0,0 +1,105 @@
+"""resource_registry のクリップ追跡・解放と、レンダリング失敗時の解放のテスト"""
+
+import numpy as np
+import pytest
+from moviepy.editor import AudioFileClip, VideoFileClip
+
+from python import resource_registry
+from python.resource_registry import RenderResources
+from python.video_composer import VideoComposer
+
+
+class FakeClip:
+    def __init__(self, name, closed, error=None):
+        self.name = name
+        self.closed = closed
+        self.error = error
+
+    def close(self):
+        self.closed.append(self.name)
+        if self.error:
+            raise self.error
+
+
+def test_track_ignores_none_and_duplicates():
+    resources = RenderResources()
+    clip = FakeClip("a", [])
+
+    assert resources.track(None) is None
+    assert resources.track(clip, "a") is clip
+    assert resources.track(clip, "again") is clip
+    assert (resources.open_count, resources.opened_count) == (1, 1)
+
+
+def test_close_all_closes_in_reverse_order_and_continues_after_errors():
+    closed = []
+    resources = RenderResources("job")
+    for name in ("first", "broken", "last"):
+        resources.track(FakeClip(name, closed, OSError("busy") if name == "broken" else None), name)
+
+    resources.close_all()
+
+    assert closed == ["last", "broken", "first"]
+    telemetry = resources.telemetry()
+    assert (telemetry["tracked_clips"], telemetry["closed_clips"], telemetry["open_clips"]) == (3, 2, 0)
+    assert telemetry["close_errors"] == ["broken: busy"]
+
+
+def test_context_manager_closes_on_error_and_records_counts(monkeypatch):
+    counts = iter([{"ffmpeg_processes": 0, "open_fds": 10}, {"ffmpeg_processes": 0, "open_fds": 10}])
+    monkeypatch.setattr(resource_registry, "open_resource_counts", lambda process=None: next(counts))
+    closed = []
+
+    with pytest.raises(RuntimeError):
+        with RenderResources() as resources:
+            resources.track(FakeClip("clip", closed))
+            raise RuntimeError("失敗")
+
+    assert closed == ["clip"]
+    assert resources.telemetry()["before"] == resources.telemetry()["after"] == {"ffmpeg_processes": 0, "open_fds": 10}
+
+
+def test_open_resource_counts_reports_current_process():
+    counts = resource_registry.open_resource_counts()
+    assert counts["ffmpeg_processes"] >= 0
+    assert counts["open_fds"] > 0
+
+
+def test_render_failure_closes_every_tracked_clip(make_wav, make_video, tmp_path, monkeypatch):
+    samples = np.zeros((24000, 2), dtype=np.float32)
+    samples[4000:20000] = 0.3 * np.sin(np.linspace(0, 2 * np.pi * 300, 16000))[:, np.newaxis]
+    audio = make_wav("voice.wav", samples=samples)
+    tracked = []
+    original_track = RenderResources.track
+
+    def spy(resources, clip, label=None):
+        tracked.append((label, clip))
+        return original_track(resources, clip, label)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("合成失敗")
+
+    monkeypatch.setattr(RenderResources, "track", spy)
+    composer = VideoComposer(str(tmp_path))
+    monkeypatch.setattr(composer, "_compose_final_video", fail)
+
+    with pytest.raises(Exception, match="合成失敗"):
+        composer.compose_single_video({
+            "audio_file": audio,
+            # 音声より短い背景なのでループ連結される
+            "background_video": make_video("background.mp4", audio_rate=44100),
+            "output_path": str(tmp_path / "out" / "video.mp4"),
+            "settings": {"audio": {"trim_silence": True, "normalize": True}}
+        })
+
+    labels = [label for label, _ in tracked]
+    for label in ("audio", "audio_subclip", "audio_gain", "background", "background_loop", "background_subclip",
+                  "background_audio"):
+        assert label in labels
+    resources = composer.last_performance_report["resources"]
+    assert resources["open_clips"] == 0
+    assert resources["closed_clips"] == resources["tracked_clips"]
+    # 元のリーダー（ffmpegプロセス）はすべて終了している
+    for _, clip in tracked:
+        if isinstance(clip, (VideoFileClip, AudioFileClip)):
+            assert clip.reader is None or clip.reader.proc is None
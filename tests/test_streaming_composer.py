@@ -0,0 +1,272 @@
+"""streaming_composer のストリーミング合成（音声ミックス・フレーム生成）のテスト"""
+
+import os
+import time
+import wave
+
+import numpy as np
+import pytest
+from moviepy.audio.AudioClip import AudioArrayClip
+from moviepy.editor import VideoFileClip
+from PIL import Image
+
+from python import streaming_composer
+from python.overlay_cache import SubtitleOverlay
+from python.streaming_composer import REORDER_DEPTH, StreamingRenderer
+from python.theme_timeline import Timeline, TimelineSegment
+
+FPS = 30
+RATE = 24000
+
+
+def read_wav(path):
+    with wave.open(str(path), "rb") as wav_file:
+        raw = wav_file.readframes(wav_file.getnframes())
+        return np.frombuffer(raw, dtype="<i2").reshape(-1, wav_file.getnchannels()), wav_file.getframerate()
+
+
+def test_mix_audio_keeps_gaps_between_segments(make_wav, tmp_path):
+    voice = make_wav("voice.wav", samples=np.full((RATE // 2, 2), 0.5, dtype=np.float32), sample_rate=RATE)
+    timeline = Timeline([TimelineSegment(0.0, 0.5, voice), TimelineSegment(1.0, 1.5, voice)], FPS)
+
+    StreamingRenderer(str(tmp_path)).mix_audio(timeline, None, {}, str(tmp_path / "mix.wav"), RATE)
+
+    samples, rate = read_wav(tmp_path / "mix.wav")
+    assert rate == RATE
+    # 映像と同じく空きの0.5秒も書き出し、2つ目の音声は1.0秒から始まる
+    assert len(samples) == int(1.5 * RATE)
+    loud = np.flatnonzero(np.abs(samples[:, 0]) > 1000)
+    assert loud.min() == 0
+    assert np.all(samples[RATE // 2:RATE] == 0)
+    assert loud[loud >= RATE // 2].min() == RATE
+
+
+class FakeWriter:
+    """ffmpegの代わりに書き出されたフレームを保持するライター（fail_at 枚目の書き込みで失敗）"""
+
+    def __init__(self, size, fail_at=None):
+        self.size = size
+        self.fail_at = fail_at
+        self.frames = []
+        self.closed = False
+        self.proc = self
+        self.stdin = self
+
+    def write(self, data):
+        if len(self.frames) == self.fail_at:
+            raise IOError("Broken pipe")
+        self.frames.append(np.frombuffer(bytes(data), dtype=np.uint8).reshape(self.size[1], self.size[0], 3))
+
+    def write_frame(self, frame):
+        self.write(np.ascontiguousarray(frame))
+
+    def close(self):
+        self.closed = True
+
+
+def make_subtitle(tmp_path, size=(4, 2), color=(255, 0, 0, 255)):
+    path = tmp_path / "subtitle.png"
+    Image.new("RGBA", size, color).save(path)
+    return str(path)
+
+
+def shm_segments():
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+
+def ring_jobs(subtitle, count, size=(8, 6), bad_frame=None):
+    """フレームnの背景は値nで塗り、奇数フレームだけ左上に字幕を重ねる"""
+    segment = TimelineSegment(0.0, 1.0, subtitle_image=subtitle)
+    overlay = SubtitleOverlay.decode(subtitle)
+    for n in range(count):
+        base = np.full((size[1], size[0], 3), n, dtype=np.uint8)
+        position = None if n == bad_frame else (0, 0)
+        yield n, base, segment, overlay if n % 2 else None, position, 1.0
+
+
+def test_write_frames_shared_reuses_slots_in_order(tmp_path):
+    subtitle = make_subtitle(tmp_path)
+    workers = 2
+    count = workers * REORDER_DEPTH * 3 + 1    # スロットを3周以上使う
+    writer = FakeWriter((8, 6))
+    before = shm_segments()
+
+    written = StreamingRenderer(str(tmp_path))._write_frames_shared(writer, ring_jobs(subtitle, count), (8, 6), workers)
+
+    assert written == count == len(writer.frames)
+    for n, frame in enumerate(writer.frames):
+        expected = np.full((6, 8, 3), n, dtype=np.uint8)
+        if n % 2:
+            expected[:2, :4] = (255, 0, 0)
+        np.testing.assert_array_equal(frame, expected)
+    assert shm_segments() <= before
+
+
+def test_write_frames_shared_reports_worker_failure_and_unlinks_memory(tmp_path):
+    subtitle = make_subtitle(tmp_path)
+    before = shm_segments()
+
+    # 位置が不正なフレームでワーカーが異常終了する
+    with pytest.raises(RuntimeError, match="合成ワーカープロセス"):
+        StreamingRenderer(str(tmp_path))._write_frames_shared(
+            FakeWriter((8, 6)), ring_jobs(subtitle, 40, bad_frame=3), (8, 6), workers=2
+        )
+
+    assert shm_segments() <= before
+
+
+def test_write_frames_shared_unlinks_memory_when_writer_fails(tmp_path):
+    subtitle = make_subtitle(tmp_path)
+    writer = FakeWriter((8, 6), fail_at=5)
+    before = shm_segments()
+
+    with pytest.raises(IOError):
+        StreamingRenderer(str(tmp_path))._write_frames_shared(writer, ring_jobs(subtitle, 40), (8, 6), workers=2)
+
+    assert len(writer.frames) == 5
+    assert shm_segments() <= before
+
+
+class FrameNumberBackground:
+    """フレームnの画素値がnになる背景クリップの代わり"""
+
+    size = (8, 6)
+    duration = 100.0
+
+    def get_frame(self, t):
+        return np.full((6, 8, 3), int(round(t * FPS)), dtype=np.uint8)
+
+
+def write_threaded(monkeypatch, tmp_path, composite, frames=24):
+    writer = FakeWriter((8, 6))
+    monkeypatch.setattr(streaming_composer, "open_frame_writer", lambda *args, **kwargs: writer)
+    monkeypatch.setattr(streaming_composer, "composite_frame", composite)
+    timeline = Timeline([TimelineSegment(0.0, frames / FPS)], FPS)
+    try:
+        count = StreamingRenderer(str(tmp_path)).write_frames(
+            timeline, FrameNumberBackground(), None, "out.mp4", {}, {}, FPS, composite_workers=3
+        )
+    finally:
+        assert writer.closed
+    return count, writer
+
+
+def test_threaded_composite_writes_in_order_when_frames_finish_out_of_order(monkeypatch, tmp_path):
+    finished = []
+
+    def composite(base, overlay, position, fade):
+        n = int(base[0, 0, 0])
+        # 先に投入したフレームほど遅く終わる
+        time.sleep(0.002 * (3 - n % 3))
+        finished.append(n)
+        return base.copy()
+
+    count, writer = write_threaded(monkeypatch, tmp_path, composite)
+
+    assert count == 24
+    assert [int(frame[0, 0, 0]) for frame in writer.frames] == list(range(24))
+    assert finished != sorted(finished)
+
+
+def test_threaded_composite_propagates_worker_exception(monkeypatch, tmp_path):
+    def composite(base, overlay, position, fade):
+        if base[0, 0, 0] == 7:
+            raise ValueError("合成失敗")
+        return base.copy()
+
+    with pytest.raises(ValueError, match="合成失敗"):
+        write_threaded(monkeypatch, tmp_path, composite)
+
+
+def test_mix_audio_resamples_trims_and_applies_gain(make_wav, tmp_path):
+    # 48kHz の音声（前半0.2・後半0.6）の 0.25〜0.75秒だけをゲイン0.5で使う
+    samples = np.zeros((48000, 2), dtype=np.float32)
+    samples[:24000], samples[24000:] = 0.2, 0.6
+    voice = make_wav("voice48k.wav", samples=samples, sample_rate=48000)
+    segment = TimelineSegment(0.0, 0.5, voice, audio_start=0.25, audio_end=0.75, gain=0.5)
+
+    StreamingRenderer(str(tmp_path)).mix_audio(Timeline([segment], FPS), None, {}, str(tmp_path / "mix.wav"), RATE)
+
+    mixed, rate = read_wav(tmp_path / "mix.wav")
+    assert (rate, len(mixed)) == (RATE, RATE // 2)
+    level = mixed[:, 0] / 32767
+    assert abs(level[int(0.1 * RATE)] - 0.1) < 0.005
+    assert abs(level[int(0.4 * RATE)] - 0.3) < 0.005
+
+
+class VideoFileClipStub:
+    """音声だけを持つ背景動画の代わり"""
+
+    def __init__(self, audio):
+        self.audio = audio
+
+
+def test_mix_audio_loops_background_audio(tmp_path):
+    # 0.3秒の背景音（サンプル番号に比例するランプ）を1秒分ループさせて音量0.5で重ねる
+    loop = int(0.3 * RATE)
+    ramp = np.linspace(0.0, 0.9, loop, endpoint=False)
+    background = VideoFileClipStub(AudioArrayClip(np.stack([ramp, -ramp], axis=1), fps=RATE))
+    timeline = Timeline([TimelineSegment(0.0, 0.5), TimelineSegment(0.5, 1.0)], FPS)
+
+    StreamingRenderer(str(tmp_path)).mix_audio(timeline, background, {"volume": 0.5}, str(tmp_path / "mix.wav"), RATE)
+
+    mixed, _ = read_wav(tmp_path / "mix.wav")
+    expected = np.resize(ramp, RATE) * 0.5
+    assert len(mixed) == RATE
+    np.testing.assert_allclose(mixed[:, 0] / 32767, expected, atol=0.001)
+    np.testing.assert_allclose(mixed[:, 1] / 32767, -expected, atol=0.001)
+
+
+def test_write_frames_switches_subtitles_per_segment(monkeypatch, tmp_path):
+    red = make_subtitle(tmp_path, color=(255, 0, 0, 255))
+    blue = tmp_path / "blue.png"
+    Image.new("RGBA", (4, 2), (0, 0, 255, 255)).save(blue)
+    # 1秒=3フレーム。2つ目の区間の前に1フレームの空きがある
+    timeline = Timeline([
+        TimelineSegment(0.0, 2 / 3, subtitle_image=red, position=("left", "top")),
+        TimelineSegment(1.0, 5 / 3, subtitle_image=str(blue), position=("right", "bottom")),
+    ], 3)
+    writer = FakeWriter((8, 6))
+    monkeypatch.setattr(streaming_composer, "open_frame_writer", lambda *args, **kwargs: writer)
+
+    count = StreamingRenderer(str(tmp_path)).write_frames(
+        timeline, None, None, "out.mp4", {"resolution": [8, 6]}, {"fade_duration": 0}, 3, composite_workers=1
+    )
+
+    green = np.array(streaming_composer.DEFAULT_BACKGROUND_COLOR, dtype=np.uint8)
+    corners = [(tuple(frame[0, 0]), tuple(frame[5, 7])) for frame in writer.frames]
+    assert count == 5
+    assert corners == [
+        ((255, 0, 0), tuple(green)),
+        ((255, 0, 0), tuple(green)),
+        (tuple(green), tuple(green)),
+        (tuple(green), (0, 0, 255)),
+        (tuple(green), (0, 0, 255)),
+    ]
+
+
+def test_render_end_to_end(make_wav, tmp_path):
+    voice = make_wav("voice.wav", samples=np.full((RATE, 2), 0.3, dtype=np.float32), sample_rate=RATE)
+    subtitle = make_subtitle(tmp_path, size=(16, 8))
+    timeline = Timeline([
+        TimelineSegment(0.0, 0.5, voice, subtitle_image=subtitle),
+        TimelineSegment(0.5, 1.0, voice, audio_start=0.5),
+    ], 10)
+    temp_dir = tmp_path / "work"
+    temp_dir.mkdir()
+    output = str(tmp_path / "out.mp4")
+
+    StreamingRenderer(str(temp_dir)).render(
+        timeline, None, output, {"fps": 10, "resolution": [32, 24], "audio_fps": RATE},
+        {}, {"fade_duration": 0}
+    )
+
+    with VideoFileClip(output) as result:
+        assert result.size == [32, 24]
+        assert result.duration == pytest.approx(1.0, abs=0.1)
+        assert result.audio is not None
+        first, last = result.get_frame(0.05), result.get_frame(0.95)
+    # 1つ目の区間だけ下端中央に字幕（赤）が重なる
+    assert first[20, 16, 0] > 200 and first[20, 16, 1] < 60
+    assert last[20, 16, 0] < 60
+    assert os.listdir(temp_dir) == []
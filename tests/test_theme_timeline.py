@@ -0,0 +1,144 @@
+"""theme_timeline のタイムライン（区間レコード・フレーム範囲・区間検索・固定/可変長レイアウト）のテスト"""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from python.theme_timeline import (
+    Timeline, TimelineSegment, build_fixed_timeline, build_packed_timeline, snap_to_frame
+)
+
+FPS = 30
+
+
+def test_packed_timeline_uses_audio_length_plus_gap(make_wav):
+    title = make_wav("title.wav", 1.5)
+    comments = [make_wav("c1.wav", 2.0), make_wav("c2.wav", 0.2)]
+
+    timeline = build_packed_timeline(title, comments, ["s1.png", None], [(10, 20), (30, 40)], FPS,
+                                     gap=0.3, min_duration=1.0)
+
+    assert [(segment.start, segment.end) for segment in timeline] == [
+        (0.0, 1.8),
+        (1.8, 4.1),
+        (4.1, 5.1),  # 0.2 + 0.3 < min_duration
+    ]
+    assert timeline[1].subtitle_image == "s1.png"
+    assert timeline[1].position == (10, 20)
+    assert timeline[0].subtitle_image is None
+
+
+def test_packed_timeline_boundaries_snap_to_frames(make_wav):
+    comments = [make_wav("c1.wav", 1.01), make_wav("c2.wav", 1.02)]
+
+    timeline = build_packed_timeline(None, comments, [], [None, None], FPS, gap=0.0, min_duration=0.5)
+
+    for segment in timeline:
+        assert segment.end == snap_to_frame(segment.end, FPS)
+        assert segment.first_frame == round(segment.start * FPS)
+    # 区間は隙間なく連続する
+    for previous, current in zip(timeline[:-1], timeline[1:]):
+        assert previous.end == current.start
+
+
+def test_packed_timeline_truncates_at_max_duration(make_wav):
+    comments = [make_wav(f"c{i}.wav", 2.0) for i in range(5)]
+
+    timeline = build_packed_timeline(None, comments, [], [None] * 5, FPS,
+                                     gap=0.0, min_duration=1.0, max_duration=5.0)
+
+    assert timeline.duration == 5.0
+    # タイトル（1秒）+ 2秒 + 2秒で上限に達し、残りのコメントは配置しない
+    assert len(timeline) == 3
+    assert [segment.audio_file for segment in timeline[1:]] == comments[:2]
+
+
+def test_packed_timeline_uses_audio_bounds_without_probing():
+    bounds = {"missing.wav": (0.5, 1.5)}
+
+    timeline = build_packed_timeline(None, ["missing.wav"], [], [None], FPS,
+                                     gap=0.0, min_duration=0.1, audio_bounds=bounds)
+
+    comment = timeline[1]
+    assert (comment.audio_start, comment.audio_end) == (0.5, 1.5)
+    assert comment.duration == pytest.approx(1.0)
+
+
+def test_fixed_timeline_pads_to_target_duration():
+    timeline = build_fixed_timeline("title.wav", ["a.wav", "b.wav"], ["a.png"], ["bottom", "top"],
+                                    target_duration=10.0, segment_count=5, fps=FPS)
+
+    assert [(segment.start, segment.end) for segment in timeline] == [
+        (0.0, 2.0), (2.0, 4.0), (4.0, 6.0), (6.0, 10.0)
+    ]
+    assert timeline[1].subtitle_image == "a.png"
+    assert timeline[2].subtitle_image is None
+    # 末尾は音声のない無音区間
+    assert timeline[-1].audio_file is None
+    assert timeline.frame_count == 300
+
+
+def test_timeline_fixes_frame_ranges_once():
+    timeline = Timeline([TimelineSegment(0.0, 1.0), TimelineSegment(1.0, 2.51), TimelineSegment(2.51, 3.0)], FPS)
+
+    assert [(segment.first_frame, segment.last_frame) for segment in timeline] == [(0, 30), (30, 75), (75, 90)]
+    assert timeline.first_frames.tolist() == [0, 30, 75]
+    assert timeline.last_frames.tolist() == [30, 75, 90]
+    assert timeline[1].frame_count == 45
+    assert timeline.frame_count == 90
+    assert timeline.duration == 3.0
+
+
+def test_empty_timeline():
+    timeline = Timeline([], FPS)
+
+    assert len(timeline) == 0
+    assert timeline.duration == 0.0
+    assert timeline.frame_count == 0
+
+
+def test_timeline_segment_pickles_with_slots():
+    segment = TimelineSegment(1.0, 2.0, "a.wav", 0.1, 0.9, 0.5, "a.png", (10, 20))
+    Timeline([segment], FPS)
+
+    restored = pickle.loads(pickle.dumps(segment))
+
+    assert restored.to_dict() == segment.to_dict()
+    assert (restored.first_frame, restored.last_frame) == (30, 60)
+    assert not hasattr(restored, "__dict__")
+
+
+def test_timeline_segment_to_dict_omits_unset_fields():
+    assert TimelineSegment(0.0, 1.0).to_dict() == {"start": 0.0, "end": 1.0, "first_frame": 0, "last_frame": 0}
+
+
+def test_segment_lookup_by_frame_and_time():
+    timeline = Timeline([TimelineSegment(0.0, 1.0), TimelineSegment(1.0, 2.5), TimelineSegment(2.5, 3.0)], FPS)
+
+    assert [timeline.segment_index_at_frame(frame) for frame in (0, 29, 30, 74, 75, 89)] == [0, 0, 1, 1, 2, 2]
+    assert timeline.segment_index_at_frame(-1) == -1
+    assert timeline.segment_index_at_frame(90) == -1
+    assert timeline.segment_at_frame(45) is timeline[1]
+    assert timeline.segment_at_time(2.6) is timeline[2]
+    assert timeline.segment_at_time(3.5) is None
+
+
+def test_segment_indices_maps_frames_in_bulk_with_gaps():
+    # 区間の間の空き（1.0-1.5秒）と長さ0の区間は範囲外
+    timeline = Timeline([TimelineSegment(0.0, 1.0), TimelineSegment(1.5, 1.5), TimelineSegment(1.5, 2.0)], FPS)
+
+    indices = timeline.segment_indices(np.array([0, 29, 30, 44, 45, 59, 60]))
+
+    assert indices.tolist() == [0, 0, -1, -1, 2, 2, -1]
+
+
+def test_iter_frames_covers_every_frame_in_order():
+    timeline = Timeline([TimelineSegment(1.0, 1.2), TimelineSegment(1.3, 1.4)], FPS)
+
+    frames = list(timeline.iter_frames())
+
+    assert [frame for frame, _ in frames] == list(range(30, 42))
+    assert [frame for frame, segment in frames if segment is timeline[0]] == list(range(30, 36))
+    assert [frame for frame, segment in frames if segment is None] == [36, 37, 38]
+    assert list(Timeline([], FPS).iter_frames()) == []
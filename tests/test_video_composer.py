@@ -0,0 +1,72 @@
+"""video_composer の合成設定の決定（音声サンプリングレート・背景動画の選択）とステージ計測のテスト"""
+
+import pytest
+
+from python.video_composer import VideoComposer
+
+
+@pytest.fixture
+def composer(tmp_path):
+    return VideoComposer(str(tmp_path))
+
+
+def audio_fps(composer, config, settings=None):
+    settings = settings or {}
+    background = composer._choose_background(config, settings)
+    return composer._with_audio_fps(settings, [config.get("audio_file")], background)["video"]["audio_fps"]
+
+
+@pytest.mark.parametrize("background_rate, expected", [(48000, 48000), (None, 24000)])
+def test_random_background_uses_the_chosen_clip_rate(composer, make_wav, make_video, monkeypatch,
+                                                     background_rate, expected):
+    background = make_video("background.mp4", audio_rate=background_rate)
+    monkeypatch.setattr(composer, "_select_random_background_video", lambda: background)
+    voice = make_wav("voice.wav", sample_rate=24000)
+
+    assert composer._choose_background({"background_video": "random"}, {}) == background
+    assert audio_fps(composer, {"audio_file": voice, "background_video": "random"}) == expected
+
+
+def test_sample_rate_falls_back_to_default_only_without_known_rates(composer, make_wav, monkeypatch):
+    monkeypatch.setattr(composer, "_select_random_background_video", lambda: None)
+
+    assert audio_fps(composer, {"audio_file": make_wav("voice.wav", sample_rate=24000)}) == 24000
+    assert audio_fps(composer, {"audio_file": None}) == 44100
+    assert audio_fps(composer, {"audio_file": None}, {"audio": {"audio_fps": 32000}}) == 32000
+
+
+def test_parallel_theme_resumes_with_checkpointed_background(composer, monkeypatch):
+    monkeypatch.setattr(composer, "_select_random_background_video", lambda: "/videos/new.mp4")
+    monkeypatch.setattr(type(composer._parallel_encoder({})), "checkpointed_background",
+                        lambda encoder, output_path: "/videos/previous.mp4")
+    theme = {"audio_files": [], "output_path": "/out/theme.mp4"}
+
+    assert composer._choose_background(theme, {"render_mode": "parallel"}) == "/videos/previous.mp4"
+    assert composer._choose_background(theme, {}) == "/videos/new.mp4"
+    assert composer._choose_background({**theme, "background_video": "/videos/fixed.mp4"},
+                                       {"render_mode": "parallel"}) == "/videos/fixed.mp4"
+
+
+@pytest.mark.parametrize("render_mode, stages", [
+    ("streaming", ["prepare_job", "build_timeline", "load_audio", "export_video"]),
+    (None, ["prepare_job", "load_audio", "prepare_background", "prepare_subtitle", "compose_final_video",
+            "export_video"]),
+])
+def test_single_video_stages_are_measured_on_every_path(composer, make_wav, make_video, tmp_path,
+                                                        render_mode, stages):
+    settings = {"video": {"fps": 10, "resolution": [32, 24]}}
+    if render_mode:
+        settings["render_mode"] = render_mode
+    output = str(tmp_path / "out" / "video.mp4")
+
+    composer.compose_single_video({
+        "audio_file": make_wav("voice.wav", duration=0.5),
+        "background_video": make_video("background.mp4"),
+        "output_path": output,
+        "settings": settings
+    })
+
+    operations = composer.last_performance_report["operations"]
+    assert list(operations) == stages
+    assert not any(stage["failed"] for stage in operations.values())
+    assert operations["export_video"]["frames"] == 5
@@ -0,0 +1,81 @@
+"""yuv_compositing の色変換（RGB ↔ BT.601）とYUV平面上の合成のテスト"""
+
+import numpy as np
+
+from python.yuv_compositing import (
+    YuvFrame, YuvOverlay, blend_yuv_overlay, rgb_to_yuv, solid_color_yuv, yuv_frame_to_rgb
+)
+
+
+def frame_from_rgb(rgb):
+    """RGBフレームを yuv420p（色差は2x2平均）へ変換"""
+    height, width = rgb.shape[:2]
+    frame = YuvFrame(width, height)
+    yuv = rgb_to_yuv(rgb)
+    frame.y[...] = np.clip(np.round(yuv[:, :, 0]), 0, 255)
+    chroma = yuv[:, :, 1:].reshape(height // 2, 2, width // 2, 2, 2).mean(axis=(1, 3))
+    frame.uv[...] = np.clip(np.round(np.moveaxis(chroma, 2, 0)), 0, 255)
+    return frame
+
+
+def opaque_overlay(rgb, alpha=1.0):
+    rgb = np.asarray(rgb, dtype=np.float32)
+    alpha_plane = np.full(rgb.shape[:2] + (1,), alpha, dtype=np.float32)
+    return YuvOverlay(rgb * alpha_plane, alpha_plane)
+
+
+def test_rgb_yuv_round_trip_within_tolerance():
+    rng = np.random.default_rng(0)
+    # 色差の間引きで失われないよう 2x2 ブロック単位で同じ色にする
+    rgb = rng.integers(0, 256, size=(8, 12, 3), dtype=np.uint8).repeat(2, axis=0).repeat(2, axis=1)
+
+    restored = yuv_frame_to_rgb(frame_from_rgb(rgb))
+
+    assert restored.dtype == np.uint8
+    assert np.abs(restored.astype(int) - rgb.astype(int)).max() <= 2
+
+
+def test_solid_colors_use_limited_range():
+    assert solid_color_yuv((0, 0, 0)) == (16, 128, 128)
+    assert solid_color_yuv((255, 255, 255)) == (235, 128, 128)
+    red = solid_color_yuv((255, 0, 0))
+    assert abs(red[0] - 81) <= 1 and abs(red[1] - 90) <= 1 and abs(red[2] - 240) <= 1
+
+
+def test_opaque_overlay_replaces_pixels_and_clips_offscreen_part():
+    frame = YuvFrame(8, 8)
+    frame.fill(solid_color_yuv((0, 0, 0)))
+    overlay = opaque_overlay(np.full((4, 4, 3), 255))
+
+    # 奇数座標は偶数へ丸め、右下へはみ出した分は切り捨てる
+    blend_yuv_overlay(frame, overlay, (5, 5), fade=1.0)
+
+    assert np.all(frame.y[4:, 4:] == 235)
+    assert np.all(frame.y[:4, :] == 16) and np.all(frame.y[:, :4] == 16)
+    assert np.all(frame.uv == 128)
+
+
+def test_fade_blends_linearly():
+    frame = YuvFrame(4, 4)
+    frame.fill((16, 128, 128))
+
+    blend_yuv_overlay(frame, opaque_overlay(np.full((4, 4, 3), 255)), (0, 0), fade=0.5)
+
+    assert np.all(frame.y == round(16 * 0.5 + 235 * 0.5))
+    blend_yuv_overlay(frame, opaque_overlay(np.full((4, 4, 3), 255)), (0, 0), fade=0.0)
+    assert np.all(frame.y == 126)
+
+
+def test_blend_saturates_instead_of_wrapping():
+    frame = YuvFrame(4, 4)
+    frame.fill((235, 16, 128))
+    # 乗算されていない（アルファに対して明るすぎる）字幕でも 0-255 を超えて折り返さない
+    alpha = np.full((4, 4, 1), 0.5, dtype=np.float32)
+    yellow = np.tile(np.array([255, 255, 0], dtype=np.float32), (4, 4, 1))
+    overlay = YuvOverlay(yellow * 2, alpha)
+
+    blend_yuv_overlay(frame, overlay, (0, 0), fade=1.0)
+
+    assert np.all(frame.y == 255)       # 上限を超えた輝度は 255 に飽和
+    assert np.all(frame.uv[0] == 0)     # 負になった色差は 0 に飽和
+    assert np.all(frame.uv[1] > 128)